@@ -1,5 +1,12 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from .db import apply_sqlite_pragmas
+        connection_created.connect(
+            apply_sqlite_pragmas, dispatch_uid='core.apply_sqlite_pragmas'
+        )
@@ -0,0 +1,273 @@
+"""Общий кэш: Redis-совместимый бэкенд и его локальная замена.
+
+``RedisCache`` работает с любым клиентом, повторяющим нужную часть API
+``redis.Redis``. В проде это ``redis.Redis`` (пакет ``redis``
+устанавливается отдельно), для тестов и локального запуска —
+``FakeRedis``, хранящий данные в памяти процесса. ``FakeRedis`` не
+общий для процессов, поэтому вне тестов по умолчанию выбирается Redis.
+
+``make_key`` добавляет к ключам префикс проекта и идентификатор
+релиза, поэтому после деплоя не читаются записи прошлой версии кода.
+"""
+import fnmatch
+import pickle
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.utils.module_loading import import_string
+
+
+# Увеличивает только существующий ключ: проверка и INCRBY — одна
+# атомарная операция на сервере.
+INCR_EXISTING = """
+if redis.call('exists', KEYS[1]) == 1 then
+    return redis.call('incrby', KEYS[1], ARGV[1])
+end
+return false
+"""
+
+
+def make_key(key, key_prefix, version):
+    return f'{key_prefix}:{settings.CACHE_RELEASE}:{version}:{key}'
+
+
+class FakePipeline:
+    """Очередь команд FakeRedis, выполняемая в ``execute``."""
+
+    def __init__(self, client):
+        self._client = client
+        self._commands = []
+
+    def __getattr__(self, name):
+        method = getattr(self._client, name)
+
+        def queue(*args, **kwargs):
+            self._commands.append((method, args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        commands, self._commands = self._commands, []
+        return [method(*args, **kwargs) for method, args, kwargs in commands]
+
+
+class FakeRedis:
+    """Redis в памяти процесса: только то, что нужно RedisCache.
+
+    Экземпляры с одинаковым адресом делят данные, как клиенты одного
+    сервера.
+    """
+    _servers = {}
+    _servers_lock = threading.Lock()
+
+    def __init__(self, url=''):
+        with self._servers_lock:
+            self._data, self._lock = self._servers.setdefault(
+                url, ({}, threading.Lock())
+            )
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        return cls(url)
+
+    def _alive(self, name):
+        item = self._data.get(name)
+        if item is None:
+            return None
+        value, expires = item
+        if expires is not None and expires <= time.monotonic():
+            del self._data[name]
+            return None
+        return value
+
+    def get(self, name):
+        with self._lock:
+            return self._alive(name)
+
+    def mget(self, names):
+        with self._lock:
+            return [self._alive(name) for name in names]
+
+    def set(self, name, value, ex=None, nx=False):
+        with self._lock:
+            if nx and self._alive(name) is not None:
+                return None
+            expires = None if ex is None else time.monotonic() + ex
+            self._data[name] = (value, expires)
+            return True
+
+    def expire(self, name, seconds):
+        with self._lock:
+            value = self._alive(name)
+            if value is None:
+                return False
+            self._data[name] = (value, time.monotonic() + seconds)
+            return True
+
+    def persist(self, name):
+        with self._lock:
+            value = self._alive(name)
+            if value is None:
+                return False
+            self._data[name] = (value, None)
+            return True
+
+    def exists(self, *names):
+        with self._lock:
+            return sum(self._alive(name) is not None for name in names)
+
+    def delete(self, *names):
+        with self._lock:
+            return sum(
+                self._data.pop(name, None) is not None for name in names
+            )
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def eval(self, script, numkeys, *keys_and_args):
+        """Выполняет только скрипты, которые использует RedisCache."""
+        if script != INCR_EXISTING:
+            raise NotImplementedError('FakeRedis не исполняет Lua')
+        name, amount = keys_and_args
+        with self._lock:
+            value = self._alive(name)
+            if value is None:
+                return None
+            value = int(value) + int(amount)
+            self._data[name] = (str(value).encode(), self._data[name][1])
+            return value
+
+    def scan_iter(self, match='*'):
+        with self._lock:
+            names = list(self._data)
+        return (name for name in names if fnmatch.fnmatchcase(name, match))
+
+
+class RedisCache(BaseCache):
+    """Кэш Django поверх Redis-совместимого клиента."""
+
+    def __init__(self, server, params):
+        super().__init__(params)
+        self._server = server
+        options = params.get('OPTIONS', {})
+        self._client_class = options.get('CLIENT_CLASS', 'redis.Redis')
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            client_class = import_string(self._client_class)
+            self._client = client_class.from_url(self._server)
+        return self._client
+
+    @staticmethod
+    def _dumps(value):
+        # Целые числа храним как есть, чтобы incr был атомарным.
+        if type(value) is int:
+            return str(value).encode()
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _loads(value):
+        try:
+            return int(value)
+        except ValueError:
+            return pickle.loads(value)
+
+    def _ttl(self, timeout):
+        if timeout == DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        if timeout is None:
+            return None
+        return max(int(timeout), 0)
+
+    def _set(self, key, value, timeout, nx=False):
+        ttl = self._ttl(timeout)
+        if ttl == 0:
+            self.client.delete(key)
+            return False
+        return bool(self.client.set(key, self._dumps(value), ex=ttl, nx=nx))
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return self._set(key, value, timeout, nx=True)
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        value = self.client.get(key)
+        return default if value is None else self._loads(value)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._set(key, value, timeout)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        ttl = self._ttl(timeout)
+        if ttl is None:
+            return bool(self.client.persist(key))
+        return bool(self.client.expire(key, ttl))
+
+    def delete(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self.client.delete(key)
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        if not keys:
+            return {}
+        made = {self.make_key(key, version=version): key for key in keys}
+        values = self.client.mget(list(made))
+        return {
+            made[made_key]: self._loads(value)
+            for made_key, value in zip(made, values)
+            if value is not None
+        }
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        keys = {self.make_key(key, version=version): value
+                for key, value in data.items()}
+        for key in keys:
+            self.validate_key(key)
+        ttl = self._ttl(timeout)
+        if ttl == 0:
+            if keys:
+                self.client.delete(*keys)
+            return []
+        pipe = self.client.pipeline(transaction=False)
+        for key, value in keys.items():
+            pipe.set(key, self._dumps(value), ex=ttl)
+        pipe.execute()
+        return []
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_key(key, version=version) for key in keys]
+        if keys:
+            self.client.delete(*keys)
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return bool(self.client.exists(key))
+
+    def incr(self, key, delta=1, version=None):
+        made_key = self.make_key(key, version=version)
+        self.validate_key(made_key)
+        value = self.client.eval(INCR_EXISTING, 1, made_key, delta)
+        if value is None:
+            raise ValueError(f"Key '{key}' not found")
+        return value
+
+    def clear(self):
+        """Удаляет только ключи этого проекта, а не всю базу Redis."""
+        pattern = f'{self.key_prefix}:*' if self.key_prefix else '*'
+        keys = list(self.client.scan_iter(match=pattern))
+        if keys:
+            self.client.delete(*keys)
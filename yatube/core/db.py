@@ -0,0 +1,20 @@
+"""Настройка подключений SQLite при открытии.
+
+Прагмы из ``SQLITE_PRAGMAS`` выполняются на каждом новом подключении.
+Профиль ``production`` (``YATUBE_DB_PROFILE``) включает журнал WAL:
+читатели не ждут писателя, а писатель не ждёт читателей. С
+``synchronous=NORMAL`` в режиме WAL база не портится при сбое, теряются
+лишь последние транзакции при отключении питания. ``mmap_size`` и
+``cache_size`` держат горячие страницы в памяти процесса, а
+``CONN_MAX_AGE`` не даёт открывать подключение и заново выполнять
+прагмы на каждый запрос.
+"""
+from django.conf import settings
+
+
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    # Прямо через sqlite3: прагмы не попадают в замеры запросов.
+    for name, value in settings.SQLITE_PRAGMAS.items():
+        connection.connection.execute(f'PRAGMA {name} = {value}')
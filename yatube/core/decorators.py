@@ -0,0 +1,148 @@
+"""Кэширование ответов с отдачей устаревшей копии (stale-while-revalidate).
+
+В отличие от ``cache_page``, истёкшая запись не пропадает сразу: пока
+один процесс под блокировкой пересчитывает страницу, остальные отдают
+устаревшую копию. Пересчёт начинается немного раньше срока с
+вероятностью, растущей к его концу (алгоритм XFetch), поэтому записи
+разных страниц не истекают одновременно. Если копии нет совсем,
+страницу считает тоже только один процесс, а остальные недолго ждут
+его результата.
+"""
+import hashlib
+import math
+import random
+import time
+from functools import wraps
+
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response
+
+METRICS = ('hit', 'miss', 'stale', 'refresh', 'wait')
+# Как часто проверять, не посчитал ли страницу другой процесс.
+WAIT_INTERVAL = 0.05
+
+_views = set()
+
+
+def _metric_key(name, kind):
+    return f'swr:metrics:{name}:{kind}'
+
+
+def _count(name, kind):
+    key = _metric_key(name, kind)
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        pass
+
+
+def cache_metrics(name):
+    """Счётчики попаданий, промахов и устаревших ответов представления."""
+    keys = {_metric_key(name, kind): kind for kind in METRICS}
+    found = cache.get_many(keys)
+    return {kind: found.get(key, 0) for key, kind in keys.items()}
+
+
+def all_cache_metrics():
+    """Счётчики всех представлений с ``cache_response``."""
+    return {name: cache_metrics(name) for name in sorted(_views)}
+
+
+def response_key(name, request):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f'swr:{name}:{path}'
+
+
+def _expired(entry, now, beta):
+    # XFetch: чем дольше считалась страница, тем раньше её пересчитываем.
+    jitter = entry['delta'] * beta * math.log(1 - random.random())
+    return now - jitter >= entry['expires']
+
+
+def _render(view, request, args, kwargs, key, timeout, stale_timeout):
+    started = time.time()
+    response = view(request, *args, **kwargs)
+    if hasattr(response, 'render') and callable(response.render):
+        response.render()
+    finished = time.time()
+    if response.status_code == 200 and not response.cookies:
+        cache.set(key, {
+            'response': response,
+            'expires': finished + timeout,
+            'delta': finished - started,
+        }, timeout + stale_timeout)
+    return response
+
+
+def _wait(key, wait_timeout):
+    """Ждёт копию, которую считает другой процесс."""
+    deadline = time.monotonic() + wait_timeout
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+    return None
+
+
+def _busy(key, entry, wait_timeout):
+    """Страницу считает другой процесс: устаревшая копия или ожидание."""
+    if entry is not None:
+        return 'stale', entry
+    return 'wait', _wait(key, wait_timeout)
+
+
+def cache_response(timeout, stale_timeout, beta=1.0, lock_timeout=30,
+                   wait_timeout=5):
+    """Кэширует GET-ответы анонимным пользователям.
+
+    ``timeout`` — сколько секунд копия свежая, ``stale_timeout`` — сколько
+    ещё её можно отдавать, пока идёт пересчёт. Без копии запрос до
+    ``wait_timeout`` секунд ждёт процесс, который её считает, и только
+    потом считает сам. Ответ помечается заголовком ``X-Cache``: HIT,
+    MISS, STALE, REFRESH или WAIT. Если у копии есть ETag и клиент
+    прислал его же, отвечает ``304``.
+    """
+    def decorator(view):
+        name = f'{view.__module__}.{view.__qualname__}'
+        _views.add(name)
+
+        def lookup(request, args, kwargs):
+            key = response_key(name, request)
+            entry = cache.get(key)
+            if entry is not None and not _expired(entry, time.time(), beta):
+                return 'hit', entry['response']
+            if not cache.add(f'{key}:lock', 1, lock_timeout):
+                status, entry = _busy(key, entry, wait_timeout)
+                if entry is not None:
+                    return status, entry['response']
+                # Не дождались: считаем сами, чужую блокировку не трогаем.
+                return 'miss', _render(
+                    view, request, args, kwargs, key, timeout, stale_timeout
+                )
+            try:
+                return (
+                    'miss' if entry is None else 'refresh',
+                    _render(view, request, args, kwargs, key,
+                            timeout, stale_timeout)
+                )
+            finally:
+                cache.delete(f'{key}:lock')
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (request.method not in ('GET', 'HEAD')
+                    or request.user.is_authenticated):
+                return view(request, *args, **kwargs)
+            status, response = lookup(request, args, kwargs)
+            _count(name, status)
+            response['X-Cache'] = status.upper()
+            if response.status_code != 200 or 'ETag' not in response:
+                return response
+            # ETag сохранён вместе с копией и описывает именно её.
+            return get_conditional_response(
+                request, etag=response['ETag'], response=response
+            )
+        return wrapper
+    return decorator
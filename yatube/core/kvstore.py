@@ -0,0 +1,35 @@
+"""Хранилище метаданных миниатюр sorl-thumbnail в общем кэше.
+
+Стандартное хранилище sorl пишет каждую миниатюру в базу. Миниатюры
+создаются в фоновых потоках (``posts.thumbnails``), и с этим
+хранилищем они вообще не обращаются к базе, а значит не спорят за
+блокировки SQLite с обработкой запросов. Если запись вытеснена из
+кэша, sorl найдёт готовый файл миниатюры в хранилище и запишет её
+метаданные заново.
+"""
+from django.core.cache import InvalidCacheBackendError, cache, caches
+from sorl.thumbnail.conf import settings
+from sorl.thumbnail.kvstores.base import KVStoreBase
+
+
+class KVStore(KVStoreBase):
+    @property
+    def cache(self):
+        try:
+            return caches[settings.THUMBNAIL_CACHE]
+        except InvalidCacheBackendError:
+            return cache
+
+    def _get_raw(self, key):
+        return self.cache.get(key)
+
+    def _set_raw(self, key, value):
+        self.cache.set(key, value, settings.THUMBNAIL_CACHE_TIMEOUT)
+
+    def _delete_raw(self, *keys):
+        self.cache.delete_many(keys)
+
+    def _find_keys_raw(self, prefix):
+        # Кэш Django не умеет перечислять ключи, поэтому команды sorl
+        # ``thumbnail cleanup`` и ``thumbnail clear`` здесь ничего не делают.
+        return []
@@ -0,0 +1,183 @@
+"""Замер запросов к базе и времени шаблонов для каждого представления.
+
+``RequestMetricsMiddleware`` считает запросы к базе и их время (через
+``execute_wrapper`` всех подключений), время рендеринга шаблонов и
+размер ответа. Итог отдаётся в заголовке ``Server-Timing`` и копится в
+скользящем окне последних ``REQUEST_METRICS_WINDOW`` запросов каждого
+представления; окно показывает ``core.views.request_metrics``. Окно
+своё у каждого процесса. Если запросов больше
+``REQUEST_QUERY_BUDGET``, в лог пишется предупреждение.
+
+Время шаблонов включает запросы, которые выполнились во время
+рендеринга (ленивые QuerySet в шаблоне).
+"""
+import contextvars
+import logging
+import math
+import os
+import statistics
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import Template
+
+from . import routers
+
+logger = logging.getLogger(__name__)
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+_samples = defaultdict(lambda: deque(maxlen=settings.REQUEST_METRICS_WINDOW))
+_samples_lock = threading.Lock()
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.rendering = False
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += time.perf_counter() - started
+
+
+def _timed_render(render):
+    def wrapper(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None or metrics.rendering:
+            return render(self, context, request)
+        metrics.rendering = True
+        started = time.perf_counter()
+        try:
+            return render(self, context, request)
+        finally:
+            metrics.template_time += time.perf_counter() - started
+            metrics.rendering = False
+    wrapper.timed = True
+    return wrapper
+
+
+def instrument_templates():
+    if not getattr(Template.render, 'timed', False):
+        Template.render = _timed_render(Template.render)
+
+
+def _milliseconds(seconds):
+    return round(seconds * 1000, 3)
+
+
+def _summary(samples):
+    summary = {'requests': len(samples)}
+    for field in ('queries', 'db_ms', 'template_ms', 'total_ms', 'bytes'):
+        values = sorted(sample[field] for sample in samples)
+        summary[field] = {
+            'mean': round(statistics.fmean(values), 3),
+            'p95': values[math.ceil(0.95 * len(values)) - 1],
+            'max': values[-1],
+        }
+    return summary
+
+
+def request_stats():
+    """Сводка скользящего окна по представлениям этого процесса."""
+    with _samples_lock:
+        samples = {name: list(window) for name, window in _samples.items()}
+    return {
+        'pid': os.getpid(),
+        'window': settings.REQUEST_METRICS_WINDOW,
+        'views': {
+            name: _summary(window)
+            for name, window in sorted(samples.items()) if window
+        },
+    }
+
+
+def reset_request_stats():
+    with _samples_lock:
+        _samples.clear()
+
+
+class RequestMetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        instrument_templates()
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total = time.perf_counter() - started
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unresolved'
+        self.record(request, response, view, metrics, total)
+        return response
+
+    def record(self, request, response, view, metrics, total):
+        size = 0 if response.streaming else len(response.content)
+        if settings.SERVER_TIMING_HEADER:
+            response['Server-Timing'] = ', '.join((
+                f'db;dur={_milliseconds(metrics.db_time)};'
+                f'desc="{metrics.queries} queries"',
+                f'tpl;dur={_milliseconds(metrics.template_time)}',
+                f'total;dur={_milliseconds(total)}',
+            ))
+        with _samples_lock:
+            _samples[view].append({
+                'queries': metrics.queries,
+                'db_ms': _milliseconds(metrics.db_time),
+                'template_ms': _milliseconds(metrics.template_time),
+                'total_ms': _milliseconds(total),
+                'bytes': size,
+            })
+        budget = settings.REQUEST_QUERY_BUDGET
+        if budget is not None and metrics.queries > budget:
+            logger.warning(
+                'Превышен бюджет запросов: %s выполнил %d запросов '
+                '(бюджет %d) на %s',
+                view, metrics.queries, budget, request.get_full_path()
+            )
+
+
+class ReplicaRoutingMiddleware:
+    """Разрешает чтение с реплик в безопасных запросах без свежей записи.
+
+    После запроса, который писал в базу, ставит куку: пока она жива,
+    этот клиент читает с основной базы (см. ``core.routers``).
+    """
+    SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sticky = settings.REPLICA_STICKY_COOKIE in request.COOKIES
+        token = routers.start(
+            request.method in self.SAFE_METHODS and not sticky
+        )
+        try:
+            response = self.get_response(request)
+        finally:
+            state = routers.finish(token)
+        if request.method not in self.SAFE_METHODS or state.wrote:
+            response.set_cookie(
+                settings.REPLICA_STICKY_COOKIE, '1',
+                max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True, samesite='Lax'
+            )
+        return response
@@ -0,0 +1,57 @@
+"""Чтение с реплик базы данных.
+
+``ReplicaRouter`` отправляет чтение моделей из ``REPLICA_ROUTED_APPS``
+на случайную реплику из ``DATABASE_REPLICAS``, но только внутри
+GET-запросов, которые разрешил ``ReplicaRoutingMiddleware``. Запись
+всегда идёт в ``default``; после записи и до конца запроса чтение
+тоже идёт туда. Пользователь, который только что что-то записал,
+получает куку и ``REPLICA_STICKY_SECONDS`` секунд читает с основной
+базы, чтобы видеть свои изменения, пока реплики догоняют.
+"""
+import contextvars
+import random
+
+from django.conf import settings
+
+PRIMARY = 'default'
+
+_state = contextvars.ContextVar('replica_routing', default=None)
+
+
+class RoutingState:
+    def __init__(self, use_replicas):
+        self.use_replicas = use_replicas
+        self.wrote = False
+
+
+def start(use_replicas):
+    return _state.set(RoutingState(use_replicas))
+
+
+def finish(token):
+    state = _state.get()
+    _state.reset(token)
+    return state
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        replicas = settings.DATABASE_REPLICAS
+        if (not replicas or state is None or not state.use_replicas
+                or state.wrote
+                or model._meta.app_label not in settings.REPLICA_ROUTED_APPS):
+            return PRIMARY
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {PRIMARY, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
@@ -6,3 +6,15 @@ register = template.Library()
 @register.filter
 def addclass(field, css):
     return field.as_widget(attrs={'class': css})
+
+
+@register.simple_tag(takes_context=True)
+def param_replace(context, **kwargs):
+    """GET-параметры текущей страницы с заменёнными значениями."""
+    params = context['request'].GET.copy()
+    for key, value in kwargs.items():
+        if value in (None, ''):
+            params.pop(key, None)
+        else:
+            params[key] = value
+    return params.urlencode()
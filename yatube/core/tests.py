@@ -1,5 +1,24 @@
+import os
+import shutil
+import tempfile
+import time
 from http import HTTPStatus
-from django.test import TestCase
+from unittest import mock
+
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.db import connection, connections
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from core.cache import FakeRedis, RedisCache, make_key
+from core.db import apply_sqlite_pragmas
+from core.decorators import cache_metrics, cache_response, response_key
+from core.middleware import (ReplicaRoutingMiddleware, request_stats,
+                             reset_request_stats)
+from core.routers import PRIMARY, ReplicaRouter, finish, start
+from posts.models import Group, Post
 
 
 class CoreTestClass(TestCase):
@@ -7,3 +26,391 @@ class CoreTestClass(TestCase):
         response = self.client.get('/nonexist-page/')
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class RedisCacheTests(TestCase):
+    def make_cache(self, location='fake://tests', prefix='yatube'):
+        return RedisCache(location, {
+            'OPTIONS': {'CLIENT_CLASS': 'core.cache.FakeRedis'},
+            'KEY_PREFIX': prefix,
+            'KEY_FUNCTION': make_key,
+        })
+
+    def setUp(self):
+        self.cache = self.make_cache()
+        self.cache.clear()
+
+    def test_get_set_and_many(self):
+        self.cache.set('post', {'text': 'Пост'})
+        self.cache.set_many({'a': 1, 'b': [2]})
+        self.assertEqual(self.cache.get('post'), {'text': 'Пост'})
+        self.assertEqual(self.cache.get_many(['a', 'b', 'c']),
+                         {'a': 1, 'b': [2]})
+        self.cache.delete_many(['a', 'b'])
+        self.assertIsNone(self.cache.get('a'))
+
+    def test_add_and_incr(self):
+        self.assertTrue(self.cache.add('counter', 1))
+        self.assertFalse(self.cache.add('counter', 5))
+        self.assertEqual(self.cache.incr('counter', 2), 3)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_incr_is_one_server_call(self):
+        self.cache.set('counter', 1)
+        with mock.patch.object(
+            FakeRedis, 'exists', side_effect=AssertionError
+        ):
+            self.assertEqual(self.cache.incr('counter'), 2)
+        self.assertIsNone(self.cache.client.get(self.cache.make_key('nope')))
+        with self.assertRaises(ValueError):
+            self.cache.incr('nope')
+        self.assertFalse(self.cache.has_key('nope'))
+
+    def test_set_many_is_pipelined(self):
+        with mock.patch.object(
+            FakeRedis, 'pipeline', wraps=self.cache.client.pipeline
+        ) as pipeline:
+            self.cache.set_many({'a': 1, 'b': 2}, timeout=60)
+        pipeline.assert_called_once()
+        self.assertEqual(self.cache.get_many(['a', 'b']), {'a': 1, 'b': 2})
+        self.cache.set_many({'a': 3}, timeout=0)
+        self.assertIsNone(self.cache.get('a'))
+
+    def test_timeout(self):
+        self.cache.set('gone', 'value', timeout=0)
+        self.assertIsNone(self.cache.get('gone'))
+        self.cache.set('short', 'value')
+        self.cache.client.expire(self.cache.make_key('short'), 0.01)
+        time.sleep(0.02)
+        self.assertIsNone(self.cache.get('short'))
+
+    def test_instances_share_server(self):
+        self.cache.set('shared', 'value')
+        self.assertEqual(self.make_cache().get('shared'), 'value')
+
+    @override_settings(CACHE_RELEASE='next')
+    def test_release_in_key(self):
+        self.assertEqual(
+            self.cache.make_key('post', version=2), 'yatube:next:2:post'
+        )
+
+    def test_clear_keeps_other_namespaces(self):
+        other = self.make_cache(prefix='other')
+        other.set('key', 'value')
+        self.cache.set('key', 'value')
+        self.cache.clear()
+        self.assertIsNone(self.cache.get('key'))
+        self.assertEqual(other.get('key'), 'value')
+        other.clear()
+        self.assertFalse(
+            FakeRedis('fake://tests').exists(other.make_key('key'))
+        )
+
+
+class CacheResponseTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+        @cache_response(timeout=10, stale_timeout=100, beta=0)
+        def view(request):
+            self.calls += 1
+            return HttpResponse(f'render {self.calls}')
+        self.view = view
+        self.name = f'{view.__module__}.{view.__qualname__}'
+
+    def get(self, user=None):
+        request = RequestFactory().get('/')
+        request.user = user or AnonymousUser()
+        return self.view(request)
+
+    def test_hit_after_miss(self):
+        self.assertEqual(self.get()['X-Cache'], 'MISS')
+        response = self.get()
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(response.content, b'render 1')
+        self.assertEqual(self.calls, 1)
+
+    def get_later(self):
+        later = time.time() + 20
+        with mock.patch('core.decorators.time.time', return_value=later):
+            return self.get()
+
+    def test_expired_entry_served_stale_while_locked(self):
+        self.get()
+        request = RequestFactory().get('/')
+        cache.add(f'{response_key(self.name, request)}:lock', 1)
+        response = self.get_later()
+        self.assertEqual(response['X-Cache'], 'STALE')
+        self.assertEqual(response.content, b'render 1')
+
+    def test_expired_entry_refreshed(self):
+        self.get()
+        response = self.get_later()
+        self.assertEqual(response['X-Cache'], 'REFRESH')
+        self.assertEqual(response.content, b'render 2')
+        self.assertEqual(self.get()['X-Cache'], 'HIT')
+
+    def test_cold_miss_waits_for_locked_render(self):
+        key = response_key(self.name, RequestFactory().get('/'))
+        cache.add(f'{key}:lock', 1)
+
+        def other_process_renders(seconds):
+            cache.set(key, {
+                'response': HttpResponse('other'),
+                'expires': time.time() + 10,
+                'delta': 0,
+            })
+        with mock.patch(
+            'core.decorators.time.sleep', side_effect=other_process_renders
+        ):
+            response = self.get()
+        self.assertEqual(response['X-Cache'], 'WAIT')
+        self.assertEqual(response.content, b'other')
+        self.assertEqual(self.calls, 0)
+
+    def test_cold_miss_renders_after_wait_timeout(self):
+        key = response_key(self.name, RequestFactory().get('/'))
+        cache.add(f'{key}:lock', 1)
+        view = cache_response(
+            timeout=10, stale_timeout=100, wait_timeout=0.01
+        )(self.view.__wrapped__)
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        with mock.patch('core.decorators.WAIT_INTERVAL', 0.001):
+            response = view(request)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(self.calls, 1)
+        self.assertTrue(cache.get(f'{key}:lock'))
+
+    def test_authenticated_bypass(self):
+        user = User.objects.create_user(username='user')
+        self.get(user)
+        self.get(user)
+        self.assertEqual(self.calls, 2)
+
+    def test_metrics(self):
+        self.get()
+        self.get()
+        metrics = cache_metrics(self.name)
+        self.assertEqual(metrics['miss'], 1)
+        self.assertEqual(metrics['hit'], 1)
+
+
+class RequestMetricsMiddlewareTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_request_stats()
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse('posts:index'))
+        timing = response['Server-Timing']
+        self.assertIn('db;dur=', timing)
+        self.assertIn('queries"', timing)
+        self.assertIn('tpl;dur=', timing)
+        self.assertIn('total;dur=', timing)
+
+    def test_stats_are_grouped_by_view_name(self):
+        self.client.get(reverse('posts:index') + '?page=1')
+        self.client.get(reverse('posts:index') + '?page=2')
+        self.client.get('/nonexist-page/')
+        views = request_stats()['views']
+        self.assertEqual(views['posts:index']['requests'], 2)
+        self.assertEqual(views['unresolved']['requests'], 1)
+        self.assertGreater(views['posts:index']['bytes']['max'], 0)
+        self.assertGreater(views['posts:index']['template_ms']['max'], 0)
+
+    def test_stats_endpoint_is_for_staff_only(self):
+        url = reverse('request_metrics')
+        self.client.get(reverse('posts:index'))
+        self.assertEqual(self.client.get(url).status_code, HTTPStatus.FOUND)
+        self.client.force_login(User.objects.create_user('visitor'))
+        self.assertEqual(self.client.get(url).status_code, HTTPStatus.FOUND)
+        self.client.force_login(
+            User.objects.create_user('admin', is_staff=True)
+        )
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertIn('posts:index', response.json()['views'])
+        self.assertEqual(
+            response.json()['response_cache']['posts.views.index']['miss'], 1
+        )
+
+    @override_settings(REQUEST_QUERY_BUDGET=0)
+    def test_query_budget_warning(self):
+        with self.assertLogs('core.middleware', 'WARNING') as logs:
+            self.client.get(reverse('posts:index'))
+        self.assertIn('posts:index', logs.output[0])
+
+
+@override_settings(DATABASE_REPLICAS=['replica_1'])
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def route(self, use_replicas, write=False):
+        token = start(use_replicas)
+        try:
+            if write:
+                self.router.db_for_write(Post)
+            return self.router.db_for_read(Post)
+        finally:
+            finish(token)
+
+    def test_reads_outside_requests_go_to_primary(self):
+        self.assertEqual(self.router.db_for_read(Post), PRIMARY)
+
+    def test_safe_request_reads_from_replica(self):
+        self.assertEqual(self.route(True), 'replica_1')
+
+    def test_reads_after_write_go_to_primary(self):
+        self.assertEqual(self.route(True, write=True), PRIMARY)
+
+    def test_sessions_stay_on_primary(self):
+        from django.contrib.sessions.models import Session
+        token = start(True)
+        try:
+            self.assertEqual(self.router.db_for_read(Session), PRIMARY)
+        finally:
+            finish(token)
+
+    def test_no_replicas_configured(self):
+        with override_settings(DATABASE_REPLICAS=[]):
+            self.assertEqual(self.route(True), PRIMARY)
+
+    def run_middleware(self, request, write=False):
+        seen = []
+
+        def view(request):
+            if write:
+                self.router.db_for_write(Post)
+            seen.append(self.router.db_for_read(Post))
+            return HttpResponse()
+
+        response = ReplicaRoutingMiddleware(view)(request)
+        return response, seen[0]
+
+    def test_get_uses_replica_without_cookie(self):
+        response, database = self.run_middleware(self.factory.get('/'))
+        self.assertEqual(database, 'replica_1')
+        self.assertNotIn('primary_db', response.cookies)
+
+    def test_post_sets_sticky_cookie(self):
+        response, database = self.run_middleware(
+            self.factory.post('/'), write=True
+        )
+        self.assertEqual(database, PRIMARY)
+        cookie = response.cookies['primary_db']
+        self.assertEqual(cookie['max-age'], 10)
+        self.assertTrue(cookie['httponly'])
+
+    def test_sticky_cookie_keeps_reads_on_primary(self):
+        request = self.factory.get('/')
+        request.COOKIES['primary_db'] = '1'
+        _, database = self.run_middleware(request)
+        self.assertEqual(database, PRIMARY)
+
+    def test_get_that_writes_sets_sticky_cookie(self):
+        response, _ = self.run_middleware(self.factory.get('/'), write=True)
+        self.assertIn('primary_db', response.cookies)
+
+
+REPLICA = 'replica_integration'
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA])
+class SqliteReplicaIntegrationTests(TestCase):
+    """Две настоящие базы SQLite: основная и отдельный файл реплики.
+
+    Репликации нет, поэтому по содержимому видно, из какой базы прочитан
+    ответ.
+    """
+    databases = {'default', REPLICA}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        connections.databases[REPLICA] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(cls.directory, 'replica.sqlite3'),
+        }
+        with connections[REPLICA].schema_editor() as editor:
+            for model in (User, Group, Post):
+                editor.create_model(model)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.databases[REPLICA]
+        shutil.rmtree(cls.directory, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(username='primary_author')
+        Post.objects.create(author=author, text='С основной базы')
+        User.objects.using(REPLICA).bulk_create([
+            User(pk=author.pk, username='primary_author')
+        ])
+        Post.objects.using(REPLICA).bulk_create([
+            Post(author_id=author.pk, text='С реплики')
+        ])
+
+    def request(self, request, write=False):
+        def view(request):
+            if write:
+                Post.objects.create(
+                    author=User.objects.get(username='primary_author'),
+                    text='Новый пост'
+                )
+            return HttpResponse(' '.join(
+                Post.objects.order_by('pk').values_list('text', flat=True)
+            ))
+        return ReplicaRoutingMiddleware(view)(request)
+
+    def test_get_reads_from_replica_file(self):
+        response = self.request(RequestFactory().get('/'))
+        self.assertEqual(response.content.decode(), 'С реплики')
+
+    def test_post_writes_and_reads_primary(self):
+        response = self.request(RequestFactory().post('/'), write=True)
+        self.assertEqual(
+            response.content.decode(), 'С основной базы Новый пост'
+        )
+        self.assertIn('primary_db', response.cookies)
+        self.assertFalse(
+            Post.objects.using(REPLICA).filter(text='Новый пост').exists()
+        )
+
+    def test_sticky_cookie_reads_primary(self):
+        request = RequestFactory().get('/')
+        request.COOKIES['primary_db'] = '1'
+        response = self.request(request)
+        self.assertEqual(response.content.decode(), 'С основной базы')
+
+
+class SqlitePragmasTests(TestCase):
+    def cache_size(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA cache_size')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_applied_on_connect(self):
+        connection.ensure_connection()
+        saved = self.cache_size()
+        with override_settings(SQLITE_PRAGMAS={'cache_size': -4096}):
+            apply_sqlite_pragmas(sender=None, connection=connection)
+        try:
+            self.assertEqual(self.cache_size(), -4096)
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute(f'PRAGMA cache_size = {saved}')
+
+    def test_no_pragmas_by_default(self):
+        with mock.patch.object(connection, 'connection') as raw:
+            apply_sqlite_pragmas(sender=None, connection=connection)
+        raw.execute.assert_not_called()
@@ -1,6 +1,11 @@
 from http import HTTPStatus
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
 from django.shortcuts import render
 
+from .decorators import all_cache_metrics
+from .middleware import request_stats
+
 
 def page_not_found(request, exception):
     return render(request, 'core/404.html',
@@ -18,3 +23,12 @@ def permission_denied(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+@staff_member_required
+def request_metrics(request):
+    """Запросы к базе, время ответа и попадания в кэш страниц."""
+    return JsonResponse(
+        {**request_stats(), 'response_cache': all_cache_metrics()},
+        json_dumps_params={'ensure_ascii': False}
+    )
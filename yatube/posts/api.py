@@ -0,0 +1,176 @@
+"""JSON API лент и постов для мобильных клиентов.
+
+Посты читаются через ``.values()`` только с нужными полями и отдаются
+курсорными страницами (``yatube.utils.CursorPaginator``). Ответы
+помечаются сильным ETag по самому новому ``pub_date`` ленты, поэтому
+повторный запрос неизменной ленты получает ``304`` без выборки и
+сериализации страницы. В ETag входит и версия лент из
+``posts.caching``: её меняет правка или удаление любого поста и
+комментария, в ленте подписок ещё подписка и отписка, а во всех
+ответах переименование автора или группы. Комментарии
+к посту отдаются страницами от старых к новым.
+
+``Last-Modified`` не отдаётся, как и в ``posts.conditional``: правка
+поста не меняет ``pub_date``, и по одной дате клиент получил бы
+``304`` на устаревшую копию.
+"""
+import hashlib
+
+from django.contrib.auth.decorators import login_required
+from django.db.models import Max
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import condition, require_safe
+
+from yatube.utils import CursorPaginator, comments_page
+
+from . import caching, feed
+from .models import Comment, Group, Post, User
+
+API_PAGE_SIZE = 20
+POST_FIELDS = (
+    'id', 'text', 'pub_date', 'author__username', 'group__slug',
+    'image', 'image_width', 'image_height',
+)
+COMMENT_FIELDS = ('id', 'text', 'pub_date', 'author__username')
+
+
+def _image_url(name):
+    if not name:
+        return None
+    return Post._meta.get_field('image').storage.url(name)
+
+
+def serialize_post(row):
+    return {
+        'id': row['id'],
+        'text': row['text'],
+        'pub_date': row['pub_date'].isoformat(),
+        'author': row['author__username'],
+        'group': row['group__slug'],
+        'image': _image_url(row['image']),
+        'image_width': row['image_width'],
+        'image_height': row['image_height'],
+    }
+
+
+def serialize_comment(row):
+    return {
+        'id': row['id'],
+        'text': row['text'],
+        'pub_date': row['pub_date'].isoformat(),
+        'author': row['author__username'],
+    }
+
+
+def _etag(*parts):
+    raw = ':'.join(str(part) for part in parts)
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def index_feed(request):
+    return Post.objects.all(), []
+
+
+def group_feed(request, slug):
+    return get_object_or_404(Group, slug=slug).posts.all(), []
+
+
+def profile_feed(request, username):
+    return get_object_or_404(User, username=username).posts.all(), []
+
+
+def follow_feed(request):
+    # Имя версии содержит id пользователя, так что ETag у каждого свой.
+    return feed.follow_feed(request.user), [
+        caching.follows_version_name(request.user.pk)
+    ]
+
+
+def feed_view(get_feed):
+    """JSON-представление ленты с условным GET.
+
+    ``get_feed(request, ...)`` возвращает queryset постов и имена
+    версий из ``posts.caching``, от которых лента зависит сверх общей.
+    """
+    def state(request, *args, **kwargs):
+        # Queryset нужен и для ETag, и для самой страницы.
+        if not hasattr(request, 'feed_state'):
+            posts, names = get_feed(request, *args, **kwargs)
+            latest = posts.aggregate(latest=Max('pub_date'))['latest']
+            names = [
+                caching.FEEDS_VERSION_NAME, caching.NAMES_VERSION_NAME,
+                *names
+            ]
+            versions = caching.get_versions(names)
+            request.feed_state = (posts, _etag(
+                latest.isoformat() if latest else '',
+                *(f'{name}={versions[name]}' for name in names),
+                request.GET.get('cursor', ''), API_PAGE_SIZE,
+            ))
+        return request.feed_state
+
+    def etag(request, *args, **kwargs):
+        return state(request, *args, **kwargs)[1]
+
+    @require_safe
+    @condition(etag_func=etag)
+    def view(request, *args, **kwargs):
+        posts = state(request, *args, **kwargs)[0]
+        paginator = CursorPaginator(posts.values(*POST_FIELDS), API_PAGE_SIZE)
+        page = paginator.get_page(request.GET.get('cursor'))
+        return JsonResponse({
+            'results': [serialize_post(row) for row in page],
+            'next': page.next_cursor,
+            'previous': page.previous_cursor,
+        })
+    view.__name__ = view.__qualname__ = get_feed.__name__
+    return view
+
+
+index = feed_view(index_feed)
+group_posts = feed_view(group_feed)
+profile = feed_view(profile_feed)
+follow_index = login_required(feed_view(follow_feed))
+
+
+def _post_etag(request, post_id):
+    # Версию поста меняют его правка и каждый комментарий, а общую
+    # версию имён — переименование автора.
+    get_object_or_404(Post.objects.values('pk'), pk=post_id)
+    names = [caching.post_version_name(post_id), caching.NAMES_VERSION_NAME]
+    versions = caching.get_versions(names)
+    return _etag(
+        post_id, *(versions[name] for name in names),
+        request.GET.get('cursor', '')
+    )
+
+
+post_condition = condition(etag_func=_post_etag)
+
+
+def _comments(post_id, cursor=None):
+    page = comments_page(
+        Comment.objects.filter(post_id=post_id).values(*COMMENT_FIELDS),
+        cursor
+    )
+    return [serialize_comment(row) for row in page], page.next_cursor
+
+
+@require_safe
+@post_condition
+def post_detail(request, post_id):
+    post = Post.objects.values(*POST_FIELDS).get(pk=post_id)
+    comments, next_cursor = _comments(post_id)
+    return JsonResponse({
+        **serialize_post(post),
+        'comments': comments,
+        'comments_next': next_cursor,
+    })
+
+
+@require_safe
+@post_condition
+def post_comments(request, post_id):
+    comments, next_cursor = _comments(post_id, request.GET.get('cursor'))
+    return JsonResponse({'results': comments, 'next': next_cursor})
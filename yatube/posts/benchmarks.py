@@ -0,0 +1,409 @@
+"""Наполнение базы для нагрузочных замеров, запросы лент и замер страниц.
+
+Посты вставляются пачками через ``executemany`` в обход ORM: так миллион
+записей с разнесёнными по времени ``pub_date`` создаётся за минуты.
+Сигналы при этом не срабатывают, поэтому после наполнения стоит
+запустить ``manage.py reconcile_counters`` (``seed_demo`` делает это
+сам).
+
+``bench_views`` прогоняет страницы через тестовый клиент Django и
+считает перцентили времени ответа, число запросов к базе и пик
+выделенной памяти. ``bench_concurrency`` нагружает базу потоками
+читателей и писателей с настройками подключений обычного и
+производственного профиля (``core.db``).
+"""
+import random
+import statistics
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import (DEFAULT_DB_ALIAS, OperationalError,
+                       close_old_connections, connection, connections,
+                       transaction)
+from django.db.models import Max, Min
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from faker import Faker
+
+from . import counters, feed, search, summaries
+from .models import Comment, Follow, Group, Post, User
+
+BENCH_PREFIX = 'bench_'
+
+
+def _bulk_ids(model, objects, lookup):
+    # Размер пачки для bulk_create подбирает сам бэкенд базы.
+    model.objects.bulk_create(objects)
+    return list(
+        model.objects.filter(**lookup).order_by('pk').values_list(
+            'pk', flat=True
+        )
+    )
+
+
+def _insert(table, columns, rows):
+    sql = (
+        f'INSERT INTO {table} ({", ".join(columns)}) '
+        f'VALUES ({", ".join(["%s"] * len(columns))})'
+    )
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+
+
+def _random_date(rng, now):
+    return connection.ops.adapt_datetimefield_value(
+        now - timedelta(seconds=rng.randrange(365 * 24 * 3600))
+    )
+
+
+def seed(posts, users=1000, groups=50, follows=20, batch_size=5000,
+         random_seed=0, text=None):
+    """Создаёт пользователей, группы, подписки и посты для замеров.
+
+    ``text`` — функция, возвращающая текст поста по его номеру.
+    """
+    rng = random.Random(random_seed)
+    if text is None:
+        def text(num):
+            return f'Пост для замеров {num}'
+
+    with transaction.atomic():
+        user_ids = _bulk_ids(User, [
+            User(username=f'{BENCH_PREFIX}{num}') for num in range(users)
+        ], {'username__startswith': BENCH_PREFIX})
+        group_ids = _bulk_ids(Group, [
+            Group(
+                title=f'Группа {num}',
+                slug=f'{BENCH_PREFIX}{num}',
+                description='Группа для замеров'
+            )
+            for num in range(groups)
+        ], {'slug__startswith': BENCH_PREFIX})
+        pairs = {
+            (user_id, author_id)
+            for user_id in user_ids
+            for author_id in rng.sample(user_ids, min(follows, users))
+            if user_id != author_id
+        }
+        Follow.objects.bulk_create(
+            [Follow(user_id=user, author_id=author) for user, author in pairs],
+            ignore_conflicts=True
+        )
+
+    columns = (
+        'text', 'pub_date', 'author_id', 'group_id', 'image', 'image_hash'
+    )
+    now = timezone.now()
+    created = 0
+    while created < posts:
+        size = min(batch_size, posts - created)
+        _insert(Post._meta.db_table, columns, [
+            (
+                text(created + num),
+                _random_date(rng, now),
+                rng.choice(user_ids),
+                rng.choice(group_ids) if rng.random() < 0.7 else None,
+                '',
+                '',
+            )
+            for num in range(size)
+        ])
+        created += size
+    return user_ids, group_ids
+
+
+def seed_comments(comments, user_ids, batch_size=5000, random_seed=0,
+                  text=None):
+    """Добавляет комментарии к случайным постам."""
+    rng = random.Random(random_seed)
+    if text is None:
+        def text(num):
+            return f'Комментарий для замеров {num}'
+    bounds = Post.objects.aggregate(first=Min('pk'), last=Max('pk'))
+    if bounds['first'] is None:
+        return
+    columns = ('text', 'pub_date', 'author_id', 'post_id')
+    now = timezone.now()
+    created = 0
+    while created < comments:
+        size = min(batch_size, comments - created)
+        candidates = [
+            rng.randint(bounds['first'], bounds['last']) for _ in range(size)
+        ]
+        existing = set(Post.objects.filter(
+            pk__in=candidates
+        ).values_list('pk', flat=True))
+        rows = [
+            (
+                text(created + num),
+                _random_date(rng, now),
+                rng.choice(user_ids),
+                post_id,
+            )
+            for num, post_id in enumerate(
+                pk for pk in candidates if pk in existing
+            )
+        ]
+        _insert(Comment._meta.db_table, columns, rows)
+        created += len(rows)
+
+
+def seed_demo(posts, users, groups, follows, comments, random_seed=0,
+              locale='ru_RU'):
+    """Наполняет базу правдоподобными данными Faker и чинит счётчики."""
+    fake = Faker(locale)
+    fake.seed_instance(random_seed)
+    user_ids, _ = seed(
+        posts, users, groups, follows, random_seed=random_seed,
+        text=lambda num: fake.paragraph(nb_sentences=5)
+    )
+    seed_comments(
+        comments, user_ids, random_seed=random_seed,
+        text=lambda num: fake.sentence()
+    )
+    counters.reconcile()
+    summaries.reconcile()
+    search.rebuild()
+
+
+def listing_querysets():
+    """Запросы, которые выполняют представления-ленты."""
+    reader = User.objects.filter(
+        follower__isnull=False
+    ).order_by('pk').first()
+    author = Post.objects.values_list(
+        'author', flat=True
+    ).order_by('author').first()
+    group = Group.objects.filter(
+        posts__isnull=False
+    ).order_by('pk').first()
+    listings = {
+        'index': Post.objects.all(),
+        'profile': Post.objects.filter(author_id=author),
+        'group_list': Post.objects.filter(group=group),
+    }
+    if reader is not None:
+        listings['follow_index'] = feed.follow_feed(reader)
+    return {
+        name: queryset.for_feed()
+        for name, queryset in listings.items()
+    }
+
+
+def _percentile(timings, percent):
+    if len(timings) == 1:
+        return timings[0]
+    return statistics.quantiles(
+        timings, n=100, method='inclusive'
+    )[percent - 1]
+
+
+def view_urls():
+    """Адреса страниц для замера и пользователь, от чьего имени смотреть."""
+    reader = User.objects.filter(
+        follower__isnull=False
+    ).order_by('pk').first()
+    post = Post.objects.select_related('author', 'group').filter(
+        group__isnull=False
+    ).first() or Post.objects.select_related('author').first()
+    urls = {'index': (reverse('posts:index'), None)}
+    if post is not None:
+        urls['profile'] = (
+            reverse('posts:profile', args=[post.author.username]), None
+        )
+        urls['post_detail'] = (
+            reverse('posts:post_detail', args=[post.pk]), None
+        )
+    if post is not None and post.group is not None:
+        urls['group_list'] = (
+            reverse('posts:group_list', args=[post.group.slug]), None
+        )
+    if reader is not None:
+        urls['follow_index'] = (reverse('posts:follow_index'), reader)
+    return urls
+
+
+def bench_view(url, user=None, requests=50, warmup=5, cold=False):
+    """Замеряет одну страницу: перцентили в мс, запросы и память в КБ."""
+    client = Client()
+    if user is not None:
+        client.force_login(user)
+
+    def get():
+        if cold:
+            cache.clear()
+        return client.get(url)
+
+    for _ in range(warmup):
+        get()
+    timings, queries = [], []
+    for _ in range(requests):
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = get()
+            timings.append((time.perf_counter() - started) * 1000)
+        queries.append(len(captured))
+    # Память меряем отдельным запросом: tracemalloc замедляет выполнение.
+    tracemalloc.start()
+    try:
+        get()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        'url': url,
+        'status': response.status_code,
+        'requests': requests,
+        'p50_ms': round(_percentile(timings, 50), 3),
+        'p95_ms': round(_percentile(timings, 95), 3),
+        'p99_ms': round(_percentile(timings, 99), 3),
+        'mean_ms': round(statistics.fmean(timings), 3),
+        'queries': max(queries),
+        'peak_memory_kb': round(peak / 1024, 1),
+        'response_bytes': len(response.content),
+    }
+
+
+def bench_views(requests=50, warmup=5, cold=False, views=None):
+    return {
+        name: bench_view(url, user, requests, warmup, cold)
+        for name, (url, user) in view_urls().items()
+        if not views or name in views
+    }
+
+
+# Значения SQLite по умолчанию. Задаются явно: режим WAL сохраняется в
+# файле базы, и без этого замер «до» шёл бы уже с WAL.
+SQLITE_DEFAULT_PRAGMAS = {
+    'journal_mode': 'DELETE',
+    'synchronous': 'FULL',
+    'mmap_size': 0,
+    'cache_size': -2000,
+}
+
+
+def database_profiles():
+    """Профили подключений: CONN_MAX_AGE и прагмы SQLite."""
+    return {
+        'default': (0, SQLITE_DEFAULT_PRAGMAS),
+        'production': (600, settings.SQLITE_PRODUCTION_PRAGMAS),
+    }
+
+
+@contextmanager
+def database_profile(conn_max_age, pragmas):
+    """Переключает подключения к основной базе на другой профиль."""
+    database = connections.databases[DEFAULT_DB_ALIAS]
+    saved = database.get('CONN_MAX_AGE', 0)
+    connections.close_all()
+    database['CONN_MAX_AGE'] = conn_max_age
+    try:
+        with override_settings(SQLITE_PRAGMAS=pragmas):
+            yield
+    finally:
+        connections.close_all()
+        database['CONN_MAX_AGE'] = saved
+
+
+class _Load:
+    """Потоки читателей и писателей до общего срока."""
+
+    def __init__(self, post_ids, user_ids, duration, random_seed):
+        self.post_ids = post_ids
+        self.user_ids = user_ids
+        self.deadline = time.perf_counter() + duration
+        self.random_seed = random_seed
+        self.timings = {'read': [], 'write': []}
+        self.errors = {'read': 0, 'write': 0}
+        self.created = []
+        self.lock = threading.Lock()
+
+    def read(self, rng):
+        list(Post.objects.select_related(
+            'author', 'group'
+        ).order_by('-pub_date')[:settings.PAGINATOR_LIST])
+        list(Comment.objects.filter(
+            post_id=rng.choice(self.post_ids)
+        ).select_related('author'))
+
+    def write(self, rng):
+        with transaction.atomic():
+            comment = Comment.objects.create(
+                post_id=rng.choice(self.post_ids),
+                author_id=rng.choice(self.user_ids),
+                text='Комментарий нагрузочного замера',
+            )
+        with self.lock:
+            self.created.append(comment.pk)
+
+    def work(self, kind, number):
+        rng = random.Random(self.random_seed + number)
+        operation = getattr(self, kind)
+        timings, errors = [], 0
+        try:
+            while time.perf_counter() < self.deadline:
+                # Каждая операция — как отдельный запрос к сайту.
+                close_old_connections()
+                started = time.perf_counter()
+                try:
+                    operation(rng)
+                except OperationalError:
+                    errors += 1
+                else:
+                    timings.append((time.perf_counter() - started) * 1000)
+                close_old_connections()
+        finally:
+            connection.close()
+        with self.lock:
+            self.timings[kind].extend(timings)
+            self.errors[kind] += errors
+
+    def run(self, readers, writers):
+        threads = [
+            threading.Thread(target=self.work, args=(kind, number))
+            for number, kind in enumerate(
+                ['read'] * readers + ['write'] * writers
+            )
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+
+def bench_concurrency(readers=4, writers=2, duration=5.0,
+                      conn_max_age=0, pragmas=None, random_seed=0):
+    """Смешанная нагрузка на базу: операций в секунду, p95 и блокировки.
+
+    Написанные комментарии после замера удаляются.
+    """
+    post_ids = list(Post.objects.values_list('pk', flat=True)[:1000])
+    user_ids = list(User.objects.values_list('pk', flat=True)[:1000])
+    load = _Load(post_ids, user_ids, duration, random_seed)
+    with database_profile(conn_max_age, pragmas or {}):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            journal_mode = cursor.fetchone()[0]
+        load.run(readers, writers)
+        Comment.objects.filter(pk__in=load.created).delete()
+    result = {
+        'journal_mode': journal_mode,
+        'conn_max_age': conn_max_age,
+        'readers': readers,
+        'writers': writers,
+        'seconds': duration,
+    }
+    for kind, timings in load.timings.items():
+        result[f'{kind}s_per_second'] = round(len(timings) / duration, 1)
+        result[f'{kind}_p95_ms'] = (
+            round(_percentile(timings, 95), 3) if timings else None
+        )
+        result[f'{kind}_errors'] = load.errors[kind]
+    return result
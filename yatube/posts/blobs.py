@@ -0,0 +1,127 @@
+"""Счётчики ссылок на файлы картинок и сборка мусора.
+
+Сигналы поста увеличивают счётчик ``MediaBlob`` при сохранении новой
+картинки и уменьшают при замене или удалении. Файл, на который больше
+никто не ссылается, удаляется вместе с миниатюрами после фиксации
+транзакции. Полную сверку с диском делает ``manage.py gc_media``.
+"""
+import logging
+import os
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import transaction
+from django.db.models import Count, F
+from sorl.thumbnail import delete as delete_thumbnails
+from sorl.thumbnail.images import ImageFile
+
+from .models import MediaBlob, Post
+
+logger = logging.getLogger(__name__)
+
+
+def acquire(name):
+    if not name:
+        return
+    updated = MediaBlob.objects.filter(name=name).update(
+        refcount=F('refcount') + 1
+    )
+    if not updated:
+        blob, created = MediaBlob.objects.get_or_create(
+            name=name, defaults={'refcount': 1}
+        )
+        if not created:
+            MediaBlob.objects.filter(pk=blob.pk).update(
+                refcount=F('refcount') + 1
+            )
+
+
+def release(name):
+    if not name:
+        return
+    MediaBlob.objects.filter(name=name, refcount__gt=0).update(
+        refcount=F('refcount') - 1
+    )
+    deleted, _ = MediaBlob.objects.filter(name=name, refcount=0).delete()
+    if deleted:
+        transaction.on_commit(lambda: collect(name))
+
+
+def collect(name):
+    """Удаляет файл и его миниатюры, если на него не ссылается ни один пост.
+
+    Повторная проверка по постам защищает от гонки с одновременной
+    загрузкой той же картинки.
+    """
+    if Post.objects.filter(image=name).exists():
+        return False
+    storage = Post._meta.get_field('image').storage
+    try:
+        delete_thumbnails(ImageFile(name, storage), delete_file=False)
+        storage.delete(name)
+    except (OSError, SuspiciousFileOperation):
+        logger.warning('Не удалось удалить файл %s', name, exc_info=True)
+        return False
+    return True
+
+
+def _stored_files(storage, directory):
+    try:
+        directories, files = storage.listdir(directory)
+    except FileNotFoundError:
+        return
+    for filename in files:
+        yield os.path.join(directory, filename).replace('\\', '/')
+    for subdirectory in directories:
+        yield from _stored_files(
+            storage, os.path.join(directory, subdirectory)
+        )
+
+
+def _references():
+    return dict(
+        Post.objects.exclude(image='').values('image').annotate(
+            total=Count('pk')
+        ).order_by().values_list('image', 'total')
+    )
+
+
+def recount(dry_run=False, references=None):
+    """Сверяет счётчики ссылок с постами, возвращает число исправлений."""
+    if references is None:
+        references = _references()
+    with transaction.atomic():
+        blobs = {blob.name: blob for blob in MediaBlob.objects.all()}
+        stale = [name for name in blobs if name not in references]
+        changed = []
+        for name, total in references.items():
+            blob = blobs.get(name) or MediaBlob(name=name)
+            if blob.refcount != total:
+                blob.refcount = total
+                changed.append(blob)
+        if not dry_run:
+            MediaBlob.objects.filter(name__in=stale).delete()
+            MediaBlob.objects.bulk_create(
+                [blob for blob in changed if blob.pk is None]
+            )
+            MediaBlob.objects.bulk_update(
+                [blob for blob in changed if blob.pk is not None],
+                ['refcount']
+            )
+    return len(stale) + len(changed)
+
+
+def reconcile(dry_run=False):
+    """Сверяет счётчики с постами и удаляет файлы без ссылок.
+
+    Возвращает число исправленных счётчиков и список удалённых файлов.
+    """
+    references = _references()
+    fixed = recount(dry_run, references)
+    field = Post._meta.get_field('image')
+    orphans = [
+        name for name in _stored_files(field.storage, field.upload_to)
+        if name not in references
+    ]
+    if not dry_run:
+        orphans = [name for name in orphans if collect(name)]
+    return fixed, orphans
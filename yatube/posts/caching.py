@@ -0,0 +1,139 @@
+"""Кэширование отрисованных карточек постов.
+
+Карточка поста не зависит от пользователя и кэшируется под ключом
+с id поста и версиями поста, его автора и группы. Версию поста
+увеличивают сигналы сохранения и удаления постов и комментариев,
+версии автора и группы — их сохранение (имя, название). Устаревшая
+карточка больше не читается, а страница собирается из актуальных
+фрагментов.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from . import summaries
+
+CARD_TEMPLATE = 'posts/includes/post_card.html'
+
+
+def version_key(name):
+    return f'posts:version:{name}'
+
+
+def _initial_version():
+    # Версия после вытеснения ключа не должна совпасть со старой.
+    return int(time.time() * 1000)
+
+
+def get_versions(names):
+    """Текущие версии для набора имён одним обращением к кэшу."""
+    keys = {version_key(name): name for name in names}
+    found = cache.get_many(keys)
+    missing = {key: _initial_version() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    return {keys[key]: version for key, version in found.items()}
+
+
+def bump_version(name):
+    key = version_key(name)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = _initial_version()
+        cache.set(key, version, None)
+        return version
+
+
+def post_version_name(post_id):
+    return f'post:{post_id}'
+
+
+# Версии областей страниц для условного GET (posts.api,
+# posts.conditional). Общая версия лент меняется при сохранении и
+# удалении любого поста и комментария: так видно, что лента могла
+# измениться без новых постов.
+FEEDS_VERSION_NAME = 'feeds'
+# Меняется после пересчёта рекомендаций (posts.recommendations): они
+# показаны в профиле.
+RECOMMENDATIONS_VERSION_NAME = 'recommendations'
+
+
+def follows_version_name(user_id):
+    return f'follows:{user_id}'
+
+
+def followers_version_name(user_id):
+    return f'followers:{user_id}'
+
+
+def group_version_name(group_id):
+    return f'group:{group_id}'
+
+
+def author_version_name(user_id):
+    return f'author:{user_id}'
+
+
+# Имя автора и название группы в карточке: версии меняют сигналы
+# сохранения пользователя и группы.
+def user_version_name(user_id):
+    return f'user:{user_id}'
+
+
+def group_info_version_name(group_id):
+    return f'group-info:{group_id}'
+
+
+# Меняется вместе с ними при переименовании. Страница ленты показывает
+# карточки многих авторов и групп, и перечислять их версии в ETag
+# дороже, чем сбросить ETag всех страниц на редкое переименование.
+NAMES_VERSION_NAME = 'names'
+
+
+def card_versions(post):
+    names = [
+        post_version_name(post.pk), user_version_name(post.author_id)
+    ]
+    if post.group_id is not None:
+        names.append(group_info_version_name(post.group_id))
+    return names
+
+
+def card_key(post_id, *versions):
+    return f'posts:card:{post_id}:' + '.'.join(map(str, versions))
+
+
+def attach_cards(posts):
+    """Проставляет постам атрибут ``card`` с готовым HTML карточки.
+
+    Карточки берутся из кэша, недостающие отрисовываются; сводки
+    комментариев читаются только для постов, чьих карточек в кэше нет.
+    """
+    posts = list(posts)
+    versions = get_versions({
+        name for post in posts for name in card_versions(post)
+    })
+    keys = {
+        post.pk: card_key(post.pk, *(
+            versions[name] for name in card_versions(post)
+        ))
+        for post in posts
+    }
+    cards = cache.get_many(keys.values())
+    missing = [post for post in posts if keys[post.pk] not in cards]
+    if missing:
+        summaries.attach(missing)
+        rendered = {
+            keys[post.pk]: render_to_string(CARD_TEMPLATE, {'post': post})
+            for post in missing
+        }
+        cache.set_many(rendered, settings.POST_CARD_TIMEOUT)
+        cards.update(rendered)
+    for post in posts:
+        post.card = mark_safe(cards[keys[post.pk]])
+    return posts
@@ -0,0 +1,78 @@
+"""Условный GET для HTML-страниц лент.
+
+ETag страницы складывается из самого нового ``pub_date`` её постов,
+версий её областей из ``posts.caching`` (группа, автор, общая лента,
+рекомендации; их же меняет готовая миниатюра поста), версии имён
+авторов и названий групп в карточках, id пользователя
+(шапка и кнопки у каждого свои) и ``CACHE_RELEASE`` (новый релиз меняет
+шаблоны). Новый ``pub_date`` и id группы или автора выбираются одним
+запросом по индексу, версии — одним обращением к кэшу, поэтому
+неизменная страница отвечает ``304`` без выборки постов и рендеринга.
+
+``Last-Modified`` не отдаётся: страница меняется и без новых постов
+(правка, подписка, готовая миниатюра), а по одной дате клиент получил
+бы ``304`` на устаревшую копию.
+"""
+import hashlib
+
+from django.conf import settings
+from django.db.models import Max
+from django.views.decorators.http import condition
+
+from . import caching
+from .models import Group, Post, User
+
+
+def index_state(request):
+    latest = Post.objects.aggregate(latest=Max('pub_date'))['latest']
+    return latest, [caching.FEEDS_VERSION_NAME, caching.NAMES_VERSION_NAME]
+
+
+def group_state(request, slug):
+    group = Group.objects.filter(slug=slug).annotate(
+        latest=Max('posts__pub_date')
+    ).values('pk', 'latest').first()
+    if group is None:
+        return None
+    return group['latest'], [
+        caching.group_version_name(group['pk']),
+        caching.NAMES_VERSION_NAME,
+    ]
+
+
+def profile_state(request, username):
+    author = User.objects.filter(username=username).annotate(
+        latest=Max('posts__pub_date')
+    ).values('pk', 'latest').first()
+    if author is None:
+        return None
+    return author['latest'], [
+        caching.author_version_name(author['pk']),
+        caching.RECOMMENDATIONS_VERSION_NAME,
+        caching.NAMES_VERSION_NAME,
+    ]
+
+
+def page_etag(request, latest, names):
+    versions = caching.get_versions(names)
+    raw = ':'.join((
+        settings.CACHE_RELEASE,
+        str(request.user.pk or 0),
+        latest.isoformat() if latest else '',
+        *(f'{name}={versions[name]}' for name in names),
+    ))
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def conditional_page(get_state):
+    """``condition`` с ETag из ``get_state(request, ...)``.
+
+    ``get_state`` возвращает новейший ``pub_date`` и имена версий или
+    None, если страницы нет: тогда представление отвечает само.
+    """
+    def etag(request, *args, **kwargs):
+        state = get_state(request, *args, **kwargs)
+        if state is None:
+            return None
+        return page_etag(request, *state)
+    return condition(etag_func=etag)
@@ -0,0 +1,117 @@
+"""Денормализованные счётчики постов, подписок и комментариев.
+
+Счётчики меняются атомарно через F-выражения в обработчиках сигналов
+(``posts.signals``). Строка ``UserStats`` создаётся лениво: при первом
+обращении или первом увеличении счётчика она пересчитывается по базе.
+Расхождения исправляет команда ``manage.py reconcile_counters``.
+"""
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+USER_COUNTERS = {
+    'posts_count': (Post, 'author'),
+    'followers_count': (Follow, 'author'),
+    'following_count': (Follow, 'user'),
+    'comments_count': (Comment, 'author'),
+}
+
+
+def recount_user(user_id):
+    """Пересчитывает счётчики пользователя по базе."""
+    counts = {
+        name: model.objects.filter(**{f'{field}_id': user_id}).count()
+        for name, (model, field) in USER_COUNTERS.items()
+    }
+    stats, _ = UserStats.objects.update_or_create(
+        user_id=user_id, defaults=counts
+    )
+    return stats
+
+
+def user_stats(user):
+    """Счётчики пользователя без COUNT-запросов в обычном случае."""
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        return recount_user(user.pk)
+
+
+def change_user_counter(user_id, name, delta):
+    queryset = UserStats.objects.filter(user_id=user_id)
+    if delta < 0:
+        queryset.filter(**{f'{name}__gte': -delta}).update(
+            **{name: F(name) + delta}
+        )
+    elif not queryset.update(**{name: F(name) + delta}):
+        recount_user(user_id)
+
+
+def change_group_counter(group_id, delta):
+    if group_id is None:
+        return
+    queryset = Group.objects.filter(pk=group_id)
+    if delta < 0:
+        queryset = queryset.filter(posts_count__gte=-delta)
+    queryset.update(posts_count=F('posts_count') + delta)
+
+
+def count_subquery(model, field):
+    counted = model.objects.filter(
+        **{field: OuterRef('pk')}
+    ).order_by().values(field).annotate(total=Count('pk')).values('total')
+    return Coalesce(
+        Subquery(counted, output_field=IntegerField()), 0
+    )
+
+
+def _reconcile_groups(group_ids):
+    fixed = 0
+    groups = Group.objects.annotate(
+        actual=count_subquery(Post, 'group')
+    ).exclude(posts_count=F('actual'))
+    if group_ids is not None:
+        groups = groups.filter(pk__in=group_ids)
+    for group in groups.iterator():
+        Group.objects.filter(pk=group.pk).update(posts_count=group.actual)
+        fixed += 1
+    return fixed
+
+
+def reconcile(batch_size=1000, user_ids=None, group_ids=None):
+    """Исправляет расхождения счётчиков, возвращает число исправлений.
+
+    С ``user_ids`` и ``group_ids`` сверяются только эти пользователи и
+    группы, а не вся таблица.
+    """
+    fixed = _reconcile_groups(group_ids)
+    users = User.objects.annotate(**{
+        f'actual_{name}': count_subquery(model, field)
+        for name, (model, field) in USER_COUNTERS.items()
+    }).select_related('stats').order_by('pk')
+    if user_ids is not None:
+        users = users.filter(pk__in=user_ids)
+    changed = []
+    for user in users.iterator(chunk_size=batch_size):
+        actual = {
+            name: getattr(user, f'actual_{name}') for name in USER_COUNTERS
+        }
+        try:
+            stats = user.stats
+        except UserStats.DoesNotExist:
+            UserStats.objects.create(user=user, **actual)
+            fixed += 1
+            continue
+        if all(getattr(stats, name) == actual[name] for name in actual):
+            continue
+        for name, value in actual.items():
+            setattr(stats, name, value)
+        changed.append(stats)
+        fixed += 1
+        if len(changed) >= batch_size:
+            UserStats.objects.bulk_update(changed, list(USER_COUNTERS))
+            changed = []
+    if changed:
+        UserStats.objects.bulk_update(changed, list(USER_COUNTERS))
+    return fixed
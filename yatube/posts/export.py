@@ -0,0 +1,101 @@
+"""Потоковая выгрузка постов и комментариев пользователя.
+
+Записи читаются из базы через ``iterator(chunk_size)`` и сразу
+отдаются наружу, поэтому память не растёт с числом постов. Формат
+записей тот же, что понимает ``manage.py import_posts``. Архив zip
+собирается на лету: в нём ``posts.ndjson`` и файлы картинок постов.
+"""
+import json
+import zipfile
+
+from django.core.exceptions import SuspiciousFileOperation
+
+from .models import Comment, Post
+
+EXPORT_CHUNK_SIZE = 500
+FORMATS = ('ndjson', 'zip')
+
+
+def export_records(user, chunk_size=EXPORT_CHUNK_SIZE):
+    posts = Post.objects.filter(author=user).select_related(
+        'group'
+    ).order_by('pk')
+    for post in posts.iterator(chunk_size):
+        yield {
+            'type': 'post',
+            'id': post.pk,
+            'author': user.username,
+            'group': post.group.slug if post.group else None,
+            'text': post.text,
+            'pub_date': post.pub_date.isoformat(),
+            'image': post.image.name or None,
+            'image_hash': post.image_hash or None,
+        }
+    comments = Comment.objects.filter(author=user).order_by('pk')
+    for comment in comments.iterator(chunk_size):
+        yield {
+            'type': 'comment',
+            'id': comment.pk,
+            'post': comment.post_id,
+            'author': user.username,
+            'text': comment.text,
+            'pub_date': comment.pub_date.isoformat(),
+        }
+
+
+def export_ndjson(user, chunk_size=EXPORT_CHUNK_SIZE):
+    """Строки NDJSON в байтах, по одной на запись."""
+    for record in export_records(user, chunk_size):
+        yield (json.dumps(record, ensure_ascii=False) + '\n').encode()
+
+
+class _Pipe:
+    """Несжимаемый поток записи для ZipFile: копит байты до выдачи."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data, self.chunks = b''.join(self.chunks), []
+        if data:
+            yield data
+
+
+def export_zip(user, chunk_size=EXPORT_CHUNK_SIZE):
+    """Архив zip кусками байтов: posts.ndjson и картинки постов."""
+    pipe = _Pipe()
+    with zipfile.ZipFile(pipe, 'w', zipfile.ZIP_DEFLATED) as archive:
+        with archive.open('posts.ndjson', 'w', force_zip64=True) as entry:
+            for line in export_ndjson(user, chunk_size):
+                entry.write(line)
+                yield from pipe.drain()
+        storage = Post._meta.get_field('image').storage
+        names = Post.objects.filter(author=user).exclude(
+            image=''
+        ).values_list('image', flat=True).distinct().order_by('image')
+        for name in names.iterator(chunk_size):
+            try:
+                source = storage.open(name)
+            except (OSError, SuspiciousFileOperation):
+                continue
+            # Картинки уже сжаты, повторно их не сжимаем.
+            info = zipfile.ZipInfo(f'images/{name}')
+            info.compress_type = zipfile.ZIP_STORED
+            with source, archive.open(info, 'w', force_zip64=True) as entry:
+                for chunk in source.chunks():
+                    entry.write(chunk)
+                    yield from pipe.drain()
+    yield from pipe.drain()
+
+
+def export_stream(user, export_format, chunk_size=EXPORT_CHUNK_SIZE):
+    if export_format == 'zip':
+        return export_zip(user, chunk_size)
+    return export_ndjson(user, chunk_size)
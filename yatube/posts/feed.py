@@ -0,0 +1,172 @@
+"""Лента подписок с раздачей постов при записи (fan-out-on-write).
+
+Новый пост автора сразу раскладывается по «почтовым ящикам» подписчиков
+(таблица ``FeedEntry``), поэтому страница ``follow_index`` читает ленту
+одним диапазоном по индексу ``(user, pub_date)``. Посты популярных
+авторов, у которых подписчиков не меньше ``FEED_FANOUT_MAX_FOLLOWERS``,
+не раздаются: они подмешиваются в ленту при чтении. Когда автор
+опускается ниже порога, его последние ``FEED_BACKFILL_POSTS`` постов
+раскладываются по лентам всех подписчиков, иначе они пропали бы из
+лент.
+
+Ящики заполняют сигналы сохранения постов и подписок и удаления
+подписок (``posts.signals``), поэтому пост из админки или ORM попадает
+в ленты так же, как из формы. Режим включается настройкой
+``FEED_FANOUT_ENABLED``; ящики для подписок и постов, созданных при
+выключенном режиме, строит ``manage.py build_feed_inbox``.
+"""
+from django.conf import settings
+from django.db.models import Q
+
+from . import graph
+from .counters import recount_user
+from .models import FeedEntry, Follow, Post, UserStats
+
+
+def fanout_enabled():
+    return settings.FEED_FANOUT_ENABLED
+
+
+def is_popular(author_id):
+    """Автор слишком популярен, чтобы раздавать его посты при записи."""
+    try:
+        stats = UserStats.objects.get(user_id=author_id)
+    except UserStats.DoesNotExist:
+        stats = recount_user(author_id)
+    return stats.followers_count >= settings.FEED_FANOUT_MAX_FOLLOWERS
+
+
+def _bulk_insert(entries):
+    FeedEntry.objects.bulk_create(
+        entries,
+        batch_size=settings.FEED_BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def fan_out_post(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    if not fanout_enabled() or is_popular(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    _bulk_insert(
+        FeedEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+        for user_id in followers.iterator()
+    )
+
+
+def fan_out_posts(posts):
+    """Раскладывает пачку постов (импорт) по лентам подписчиков авторов."""
+    if not fanout_enabled():
+        return
+    by_author = {}
+    for post in posts:
+        by_author.setdefault(post.author_id, []).append(post)
+    for author_id, author_posts in by_author.items():
+        if is_popular(author_id):
+            continue
+        followers = Follow.objects.filter(
+            author_id=author_id
+        ).values_list('user_id', flat=True)
+        _bulk_insert(
+            FeedEntry(user_id=user_id, post_id=post.pk, pub_date=post.pub_date)
+            for user_id in followers.iterator()
+            for post in author_posts
+        )
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту пользователя посты нового автора из подписок."""
+    if not fanout_enabled() or is_popular(author_id):
+        return
+    posts = Post.objects.filter(
+        author_id=author_id
+    ).values_list('id', 'pub_date')
+    _bulk_insert(
+        FeedEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+        for post_id, pub_date in posts.iterator()
+    )
+
+
+def backfill_followers(author_id, limit=None):
+    """Раскладывает последние ``limit`` постов автора по лентам подписчиков.
+
+    Без ``limit`` раскладываются все посты.
+    """
+    posts = Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date'
+    ).values_list('id', 'pub_date')
+    posts = list(posts if limit is None else posts[:limit])
+    followers = Follow.objects.filter(
+        author_id=author_id
+    ).values_list('user_id', flat=True)
+    _bulk_insert(
+        FeedEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+        for user_id in followers.iterator()
+        for post_id, pub_date in posts
+    )
+
+
+def follower_removed(author_id):
+    """После отписки автор мог перестать быть популярным."""
+    if fanout_enabled() and UserStats.objects.filter(
+        user_id=author_id,
+        followers_count=settings.FEED_FANOUT_MAX_FOLLOWERS - 1
+    ).exists():
+        # Запрос отписки не должен раскладывать всю историю автора.
+        backfill_followers(author_id, settings.FEED_BACKFILL_POSTS)
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты пользователя посты автора после отписки."""
+    FeedEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def rebuild():
+    """Строит ящики по существующим подпискам, возвращает число авторов.
+
+    Уже разложенные записи не дублируются, поэтому команду можно
+    запускать повторно.
+    """
+    built = 0
+    authors = Follow.objects.order_by('author_id').values_list(
+        'author_id', flat=True
+    ).distinct()
+    for author_id in authors.iterator():
+        if not is_popular(author_id):
+            backfill_followers(author_id)
+            built += 1
+    return built
+
+
+def popular_authors(user):
+    """Популярные авторы из подписок: их посты читаются напрямую."""
+    return Follow.objects.filter(
+        user=user,
+        author__stats__followers_count__gte=(
+            settings.FEED_FANOUT_MAX_FOLLOWERS
+        )
+    ).values_list('author', flat=True)
+
+
+def follow_feed(user):
+    """Queryset постов авторов, на которых подписан пользователь."""
+    if not fanout_enabled():
+        authors = graph.followees(user.pk)
+        if len(authors) > settings.FOLLOW_GRAPH_MAX_IN:
+            # Длинный список параметров дороже соединения с подписками.
+            return Post.objects.filter(author__following__user=user)
+        return Post.objects.filter(author_id__in=list(authors))
+    popular = list(popular_authors(user))
+    if not popular:
+        return Post.objects.filter(
+            feed_entries__user=user
+        ).order_by('-feed_entries__pub_date')
+    inbox = FeedEntry.objects.filter(user=user).values('post_id')
+    return Post.objects.filter(
+        Q(pk__in=inbox) | Q(author_id__in=popular)
+    )
@@ -1,8 +1,18 @@
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
 from django.forms import ModelForm
 
+from . import images, uploads
 from .models import Post, Comment, Follow
 
 
+UPLOAD_ERRORS = {
+    uploads.TOO_LARGE: 'Файл картинки слишком большой.',
+    uploads.TOO_MANY_PIXELS: 'У картинки слишком большое разрешение.',
+    uploads.NOT_AN_IMAGE: 'Загрузите картинку.',
+}
+
+
 class PostForm(ModelForm):
     class Meta:
         model = Post
@@ -13,6 +23,38 @@ class PostForm(ModelForm):
             'image': 'Картинка',
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        upload = self.files.get(self.add_prefix('image'))
+        error = getattr(upload, 'upload_error', None)
+        if error:
+            # Приёмник загрузки уже отбросил файл, поле получит его пустым.
+            # Словарь копируется: deepcopy поля формы его не копирует.
+            field = self.fields['image']
+            field.error_messages = {
+                **field.error_messages, 'empty': UPLOAD_ERRORS[error]
+            }
+
+    def clean_image(self):
+        """Заменяет загруженный оригинал перекодированной копией."""
+        image = self.cleaned_data['image']
+        if image is False:
+            self.instance.image_width = self.instance.image_height = None
+            self.instance.image_hash = ''
+        if not isinstance(image, UploadedFile):
+            return image
+        try:
+            processed = images.reencode(image)
+        except (OSError, ValueError):
+            raise ValidationError(
+                UPLOAD_ERRORS[uploads.NOT_AN_IMAGE],
+                code=uploads.NOT_AN_IMAGE
+            )
+        self.instance.image_width = processed.width
+        self.instance.image_height = processed.height
+        self.instance.image_hash = processed.hash
+        return processed.content
+
 
 class CommentForm(ModelForm):
     class Meta:
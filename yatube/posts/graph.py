@@ -0,0 +1,131 @@
+"""Граф подписок в памяти процесса.
+
+Для пользователя хранится отсортированный массив id авторов, на
+которых он подписан, а для автора — массив id подписчиков. Массивы
+загружаются из базы при первом обращении одним запросом по индексу и
+живут, пока не изменится версия ``follows:<id>`` или
+``followers:<id>`` в кэше (``posts.caching``). Версии меняют сигналы
+подписки и отписки, а свой процесс сбрасывает массивы сразу. С общим
+кэшем (Redis) изменения сразу видят и другие процессы. Кэш в памяти
+процесса версию другому процессу не передаёт, поэтому массив в любом
+случае перечитывается не реже раза в ``FOLLOW_GRAPH_TTL`` секунд.
+Ответы на вопросы «подписан ли», «сколько подписчиков» и «взаимна ли
+подписка» после загрузки требуют только обращения к кэшу за версией,
+без SQL.
+
+Число пользователей в памяти ограничено ``FOLLOW_GRAPH_MAX_USERS``:
+давно не использованные массивы вытесняются.
+"""
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+
+from django.conf import settings
+
+from . import caching
+from .models import Follow
+
+_FOLLOWEES = 'followees'
+_FOLLOWERS = 'followers'
+_LOOKUPS = {
+    _FOLLOWEES: ('user_id', 'author_id', caching.follows_version_name),
+    _FOLLOWERS: ('author_id', 'user_id', caching.followers_version_name),
+}
+
+_entries = OrderedDict()
+_lock = threading.Lock()
+
+
+def _load(kind, user_id):
+    field, value, _ = _LOOKUPS[kind]
+    ids = Follow.objects.filter(**{field: user_id}).order_by(
+        value
+    ).values_list(value, flat=True)
+    return array('q', ids)
+
+
+def _ids(kind, user_id):
+    version_name = _LOOKUPS[kind][2](user_id)
+    version = caching.get_versions([version_name])[version_name]
+    key = (kind, user_id)
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None and entry[0] == version and (
+                time.monotonic() < entry[1]):
+            _entries.move_to_end(key)
+            return entry[2]
+    ids = _load(kind, user_id)
+    expires = time.monotonic() + settings.FOLLOW_GRAPH_TTL
+    with _lock:
+        _entries[key] = (version, expires, ids)
+        _entries.move_to_end(key)
+        while len(_entries) > settings.FOLLOW_GRAPH_MAX_USERS:
+            _entries.popitem(last=False)
+    return ids
+
+
+def _contains(ids, value):
+    index = bisect_left(ids, value)
+    return index < len(ids) and ids[index] == value
+
+
+def followees(user_id):
+    """Отсортированные id авторов, на которых подписан пользователь."""
+    return _ids(_FOLLOWEES, user_id)
+
+
+def followers(author_id):
+    """Отсортированные id подписчиков автора."""
+    return _ids(_FOLLOWERS, author_id)
+
+
+def is_following(user_id, author_id):
+    if user_id is None:
+        return False
+    return _contains(followees(user_id), author_id)
+
+
+def followers_count(author_id):
+    return len(followers(author_id))
+
+
+def following_count(user_id):
+    return len(followees(user_id))
+
+
+def is_mutual(user_id, other_id):
+    """Пользователи подписаны друг на друга."""
+    return (
+        is_following(user_id, other_id) and is_following(other_id, user_id)
+    )
+
+
+def common_followees(user_id, other_id):
+    """Авторы, на которых подписаны оба: слияние двух массивов."""
+    first, second = followees(user_id), followees(other_id)
+    common = array('q')
+    i = j = 0
+    while i < len(first) and j < len(second):
+        if first[i] == second[j]:
+            common.append(first[i])
+            i += 1
+            j += 1
+        elif first[i] < second[j]:
+            i += 1
+        else:
+            j += 1
+    return common
+
+
+def forget(user_id=None, author_id=None):
+    """Сбрасывает массивы в своём процессе после подписки или отписки."""
+    with _lock:
+        _entries.pop((_FOLLOWEES, user_id), None)
+        _entries.pop((_FOLLOWERS, author_id), None)
+
+
+def clear():
+    with _lock:
+        _entries.clear()
@@ -0,0 +1,70 @@
+"""Перекодирование загруженных картинок постов.
+
+Оригинал не сохраняется: картинка поворачивается по EXIF, теряет
+метаданные, уменьшается до ``POST_IMAGE_MAX_SIDE`` по большей стороне и
+пересохраняется в WEBP (или JPEG, если Pillow собран без WEBP). Размеры
+и SHA-256 результата записываются в пост, чтобы шаблонам и генератору
+миниатюр не приходилось открывать файл ради этих данных.
+"""
+import hashlib
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, features
+
+FORMATS = {'WEBP': 'webp', 'JPEG': 'jpg'}
+
+
+class ProcessedImage:
+    def __init__(self, content, width, height, digest):
+        self.content = content
+        self.width = width
+        self.height = height
+        self.hash = digest
+
+
+def output_format():
+    if settings.POST_IMAGE_FORMAT == 'WEBP' and features.check('webp'):
+        return 'WEBP'
+    return 'JPEG'
+
+
+def _flatten(image, image_format):
+    # У JPEG нет прозрачности: подкладываем белый фон.
+    if image_format == 'WEBP' and image.mode in ('RGBA', 'LA', 'P'):
+        return image.convert('RGBA')
+    if image.mode in ('RGBA', 'LA') or 'transparency' in image.info:
+        rgba = image.convert('RGBA')
+        background = Image.new('RGB', rgba.size, 'white')
+        background.paste(rgba, mask=rgba.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def reencode(file_):
+    """Пересохраняет картинку без метаданных в ограниченном размере."""
+    file_.seek(0)
+    with Image.open(file_) as source:
+        source.seek(0)
+        image = ImageOps.exif_transpose(source)
+        max_side = settings.POST_IMAGE_MAX_SIDE
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+        image_format = output_format()
+        image = _flatten(image, image_format)
+    buffer = BytesIO()
+    image.save(
+        buffer,
+        image_format,
+        quality=settings.POST_IMAGE_QUALITY,
+        optimize=image_format == 'JPEG'
+    )
+    data = buffer.getvalue()
+    stem = os.path.splitext(os.path.basename(file_.name))[0] or 'image'
+    return ProcessedImage(
+        ContentFile(data, name=f'{stem}.{FORMATS[image_format]}'),
+        image.width,
+        image.height,
+        hashlib.sha256(data).hexdigest()
+    )
@@ -0,0 +1,324 @@
+"""Массовый импорт постов и комментариев из JSONL или CSV.
+
+Записи читаются потоком и копятся пачками. Для каждой пачки авторы и
+группы находятся одним запросом (найденные запоминаются), а посты и
+комментарии вставляются пачкой в одной транзакции как есть, без
+``auto_now_add``, чтобы сохранить даты из файла. Сигналы при этом не
+срабатывают, поэтому после импорта то же, что делают сигналы,
+выполняется пачками и только для затронутых записей: новые посты
+раскладываются по лентам подписчиков и попадают в поисковый индекс,
+пересчитываются счётчики авторов и групп и сводки комментариев,
+меняются версии карточек и страниц в кэше. Если пачка упала с ошибкой
+базы, это выполняется для уже записанных пачек, и ошибка передаётся
+дальше. Пост с уже занятым ``id`` пропускается как неверная запись.
+
+Формат записи: ``type`` (``post`` или ``comment``, по умолчанию пост),
+``author`` (имя пользователя), ``text``, ``pub_date`` (ISO 8601,
+необязательно). У поста ещё ``id`` (сохранить номер), ``group`` (slug)
+и ``image``; у комментария ``post`` — номер поста.
+"""
+import csv
+import json
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.db import DatabaseError, transaction
+from django.db.models import AutoField, Max, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import blobs, caching, counters, feed, search, summaries
+from .models import Comment, Group, Post, User
+
+MAX_REPORTED_ERRORS = 20
+
+
+def read_records(stream, data_format):
+    """Записи из файла по одной, номер строки и словарь."""
+    if data_format == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError:
+            yield number, None
+
+
+def insert_raw(model, objs, batch_size):
+    """Вставляет объекты как есть: pre_save и auto_now_add не вызываются.
+
+    Опирается на закрытый API Django ``Manager._insert(raw=True)``: им
+    пользуется ``bulk_create``, но без ``pre_save``. ``bulk_create`` не
+    подходит, потому что перезаписывает дату из файла, а на SQLite не
+    возвращает pk, и исправить дату потом через ``bulk_update`` нельзя.
+    В отличие от подмены ``auto_now_add`` у поля, вставка не меняет
+    модель для других потоков. При обновлении Django проверить.
+    """
+    meta = model._meta
+    for with_pk in (True, False):
+        batch = [obj for obj in objs if (obj.pk is not None) == with_pk]
+        fields = [
+            field for field in meta.concrete_fields
+            if with_pk or not isinstance(field, AutoField)
+        ]
+        for start in range(0, len(batch), batch_size):
+            model._base_manager._insert(
+                batch[start:start + batch_size], fields=fields, raw=True
+            )
+
+
+def _date(value):
+    if not value:
+        return timezone.now()
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError(f'неверная дата {value!r}')
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def _required(record, name):
+    value = record.get(name)
+    if value in (None, ''):
+        raise ValueError(f'нет поля {name!r}')
+    return value
+
+
+class Importer:
+    def __init__(self, batch_size=1000, create_users=False):
+        self.batch_size = batch_size
+        self.create_users = create_users
+        self.users = {}
+        self.groups = {}
+        self.pending = []
+        self.posts = self.comments = self.skipped = 0
+        # Что затронул импорт: по этим id обновляются производные данные.
+        self.authors = set()
+        self.touched_groups = set()
+        self.commented = set()
+        # Явные id постов, уже занятые в базе или раньше в файле.
+        self.taken_ids = set()
+        self.errors = []
+        self.last_post_id = Post.objects.aggregate(
+            last=Max('pk')
+        )['last'] or 0
+        # Посты с явным номером ниже прежнего максимума индексируются
+        # отдельно: выборка pk > last_post_id их не найдёт.
+        self.old_ids = []
+        self.started = time.perf_counter()
+
+    def skip(self, line, error):
+        self.skipped += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f'строка {line}: {error}')
+
+    def add(self, line, record):
+        if not isinstance(record, dict):
+            self.skip(line, 'запись не разобрана')
+            return
+        kind = record.get('type') or 'post'
+        if kind not in ('post', 'comment'):
+            self.skip(line, f'неизвестный тип {kind!r}')
+            return
+        self.pending.append((line, record))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def _resolve_users(self, usernames):
+        missing = set(usernames) - set(self.users)
+        if not missing:
+            return
+        found = User.objects.filter(username__in=missing)
+        self.users.update(found.values_list('username', 'pk'))
+        missing -= set(self.users)
+        if missing and self.create_users:
+            User.objects.bulk_create([
+                User(username=username, password=make_password(None))
+                for username in missing
+            ])
+            self.users.update(User.objects.filter(
+                username__in=missing
+            ).values_list('username', 'pk'))
+
+    def _resolve_groups(self, slugs):
+        missing = set(slugs) - set(self.groups)
+        if missing:
+            self.groups.update(Group.objects.filter(
+                slug__in=missing
+            ).values_list('slug', 'pk'))
+
+    def _build_post(self, record):
+        author = _required(record, 'author')
+        if author not in self.users:
+            raise ValueError(f'нет пользователя {author!r}')
+        group = record.get('group') or None
+        if group is not None and group not in self.groups:
+            raise ValueError(f'нет группы {group!r}')
+        pk = record.get('id') or None
+        if pk is not None:
+            pk = int(pk)
+            if pk in self.taken_ids:
+                raise ValueError(f'пост {pk} уже есть')
+            self.taken_ids.add(pk)
+        return Post(
+            pk=pk,
+            text=_required(record, 'text'),
+            author_id=self.users[author],
+            group_id=self.groups.get(group),
+            image=record.get('image') or '',
+            pub_date=_date(record.get('pub_date')),
+        )
+
+    def _build_comment(self, record, post_ids):
+        author = _required(record, 'author')
+        if author not in self.users:
+            raise ValueError(f'нет пользователя {author!r}')
+        post = int(_required(record, 'post'))
+        if post not in post_ids:
+            raise ValueError(f'нет поста {post}')
+        return Comment(
+            post_id=post,
+            text=_required(record, 'text'),
+            author_id=self.users[author],
+            pub_date=_date(record.get('pub_date')),
+        )
+
+    def _build(self, kind, build):
+        built = []
+        for line, record in self.pending:
+            if (record.get('type') or 'post') != kind:
+                continue
+            try:
+                built.append(build(record))
+            except (TypeError, ValueError) as error:
+                self.skip(line, error)
+        return built
+
+    def _resolve_taken_ids(self, records):
+        ids = {
+            int(record['id']) for record in records
+            if str(record.get('id', '')).isdigit()
+        }
+        self.taken_ids.update(Post.objects.filter(
+            pk__in=ids - self.taken_ids
+        ).values_list('pk', flat=True))
+
+    def flush(self):
+        pending = self.pending
+        self._resolve_taken_ids(
+            record for _, record in pending
+            if (record.get('type') or 'post') == 'post'
+        )
+        self._resolve_users(
+            record['author'] for _, record in pending if record.get('author')
+        )
+        self._resolve_groups(
+            record['group'] for _, record in pending if record.get('group')
+        )
+        with transaction.atomic():
+            posts = self._build('post', self._build_post)
+            insert_raw(Post, posts, self.batch_size)
+            post_ids = set(Post.objects.filter(pk__in={
+                record['post'] for _, record in pending
+                if record.get('type') == 'comment'
+                and str(record.get('post', '')).isdigit()
+            }).values_list('pk', flat=True))
+            comments = self._build(
+                'comment', lambda record: self._build_comment(
+                    record, post_ids
+                )
+            )
+            insert_raw(Comment, comments, self.batch_size)
+        self.old_ids.extend(
+            post.pk for post in posts
+            if post.pk is not None and post.pk <= self.last_post_id
+        )
+        self.posts += len(posts)
+        self.comments += len(comments)
+        self.authors.update(post.author_id for post in posts)
+        self.authors.update(comment.author_id for comment in comments)
+        self.touched_groups.update(
+            post.group_id for post in posts if post.group_id is not None
+        )
+        self.commented.update(comment.post_id for comment in comments)
+        self.pending = []
+
+    def finish(self):
+        """Дописывает остаток и приводит в порядок производные данные."""
+        try:
+            if self.pending:
+                self.flush()
+        finally:
+            self.derive()
+        seconds = time.perf_counter() - self.started
+        rows = self.posts + self.comments
+        return {
+            'posts': self.posts,
+            'comments': self.comments,
+            'skipped': self.skipped,
+            'errors': self.errors,
+            'seconds': seconds,
+            'rows_per_second': rows / seconds if seconds else rows,
+        }
+
+    def derive(self):
+        """То, что сделали бы сигналы, для записанных пачек."""
+        imported = Post.objects.filter(
+            Q(pk__gt=self.last_post_id) | Q(pk__in=self.old_ids)
+        )
+        search.index_queryset(imported, self.batch_size)
+        self._fan_out(imported)
+        for user_ids in self._chunks(self.authors):
+            counters.reconcile(
+                self.batch_size, user_ids=user_ids, group_ids=()
+            )
+        for group_ids in self._chunks(self.touched_groups):
+            counters.reconcile(
+                self.batch_size, user_ids=(), group_ids=group_ids
+            )
+        for post_ids in self._chunks(self.commented):
+            summaries.reconcile(self.batch_size, post_ids=post_ids)
+        self._invalidate()
+        blobs.recount()
+
+    def _chunks(self, ids):
+        ids = sorted(ids)
+        for start in range(0, len(ids), self.batch_size):
+            yield ids[start:start + self.batch_size]
+
+    def _fan_out(self, imported):
+        posts = imported.only('pk', 'author_id', 'pub_date').order_by('pk')
+        chunk = []
+        for post in posts.iterator(self.batch_size):
+            chunk.append(post)
+            if len(chunk) >= self.batch_size:
+                feed.fan_out_posts(chunk)
+                chunk = []
+        feed.fan_out_posts(chunk)
+
+    def _invalidate(self):
+        """Версии, которые сигналы сменили бы при обычном сохранении."""
+        names = {caching.FEEDS_VERSION_NAME}
+        names.update(map(caching.author_version_name, self.authors))
+        names.update(map(caching.group_version_name, self.touched_groups))
+        names.update(map(caching.post_version_name, self.commented))
+        for name in names:
+            caching.bump_version(name)
+
+
+def import_records(records, batch_size=1000, create_users=False):
+    importer = Importer(batch_size, create_users)
+    try:
+        for line, record in records:
+            importer.add(line, record)
+    except DatabaseError:
+        # Упавшая пачка откатилась, записанные до неё остаются в базе.
+        importer.derive()
+        raise
+    return importer.finish()
@@ -0,0 +1,62 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from posts.benchmarks import bench_concurrency, database_profiles
+from posts.models import Post, User
+
+from .bench_views import git_revision
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагружает базу потоками читателей и писателей комментариев с '
+        'обычным и производственным профилем подключений и сравнивает '
+        'пропускную способность. Результат пишет в JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--duration', type=float, default=5.0,
+                            help='секунд на каждый профиль')
+        parser.add_argument('--profile', action='append',
+                            choices=tuple(database_profiles()),
+                            help='замерить только эти профили')
+        parser.add_argument('--output', help='файл для JSON, иначе stdout')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Замер рассчитан на SQLite.')
+        if not Post.objects.exists() or not User.objects.exists():
+            raise CommandError(
+                'В базе нет постов: сначала запустите manage.py seed_demo.'
+            )
+        profiles = {
+            name: bench_concurrency(
+                options['readers'], options['writers'],
+                options['duration'], conn_max_age, pragmas
+            )
+            for name, (conn_max_age, pragmas) in database_profiles().items()
+            if not options['profile'] or name in options['profile']
+        }
+        report = {
+            'revision': git_revision(),
+            'created': timezone.now().isoformat(),
+            'profiles': profiles,
+        }
+        data = json.dumps(report, ensure_ascii=False, indent=2)
+        if not options['output']:
+            self.stdout.write(data)
+            return
+        with open(options['output'], 'w', encoding='utf-8') as output:
+            output.write(data)
+        for name, result in profiles.items():
+            self.stdout.write(
+                f'{name:10} чтений/с {result["reads_per_second"]:8.1f}  '
+                f'записей/с {result["writes_per_second"]:7.1f}  '
+                f'блокировок {result["read_errors"]}'
+                f'/{result["write_errors"]}'
+            )
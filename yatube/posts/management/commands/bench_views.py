@@ -0,0 +1,72 @@
+import json
+import platform
+import subprocess
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from posts.benchmarks import bench_views
+from posts.models import Comment, Follow, Post, User
+
+VIEWS = ('index', 'group_list', 'profile', 'post_detail', 'follow_index')
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет страницы постов через тестовый клиент: p50/p95/p99, '
+        'запросы к базе и память. Результат пишет в JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--cold', action='store_true',
+                            help='очищать кэш перед каждым запросом')
+        parser.add_argument('--view', action='append', choices=VIEWS,
+                            help='замерить только эти страницы')
+        parser.add_argument('--output', help='файл для JSON, иначе stdout')
+
+    def handle(self, *args, **options):
+        report = {
+            'revision': git_revision(),
+            'created': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'cold_cache': options['cold'],
+            'rows': {
+                'users': User.objects.count(),
+                'posts': Post.objects.count(),
+                'comments': Comment.objects.count(),
+                'follows': Follow.objects.count(),
+            },
+            'views': bench_views(
+                options['requests'], options['warmup'], options['cold'],
+                options['view']
+            ),
+        }
+        data = json.dumps(report, ensure_ascii=False, indent=2)
+        if not options['output']:
+            self.stdout.write(data)
+            return
+        with open(options['output'], 'w', encoding='utf-8') as output:
+            output.write(data)
+        for name, result in report['views'].items():
+            self.stdout.write(
+                f'{name:14} p50 {result["p50_ms"]:8.2f} мс  '
+                f'p95 {result["p95_ms"]:8.2f} мс  '
+                f'p99 {result["p99_ms"]:8.2f} мс  '
+                f'запросов {result["queries"]}'
+            )
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from posts import feed
+
+
+class Command(BaseCommand):
+    help = (
+        'Раскладывает существующие посты по ящикам ленты подписок. '
+        'Запускается перед включением FEED_FANOUT_ENABLED и ещё раз '
+        'после, чтобы разложить посты, созданные в промежутке.'
+    )
+
+    def handle(self, *args, **options):
+        built = feed.rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(f'Разложены посты авторов: {built}')
+        )
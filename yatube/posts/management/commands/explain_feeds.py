@@ -0,0 +1,58 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from posts.benchmarks import listing_querysets, seed
+from posts.views import POSTS_COUNT
+
+
+class Command(BaseCommand):
+    help = (
+        'Показывает план и время запросов лент. С --seed сначала '
+        'наполняет базу (используйте отдельную базу: YATUBE_DB_PATH).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0,
+                            help='сколько постов создать перед замером')
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--deep-page', type=int, default=1000,
+                            help='номер «глубокой» страницы для OFFSET')
+
+    def measure(self, func, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            started = time.perf_counter()
+            seed(options['seed'], options['users'], options['groups'])
+            self.stdout.write(
+                f'Создано постов: {options["seed"]} за '
+                f'{time.perf_counter() - started:.1f} с'
+            )
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+        repeat = options['repeat']
+        offset = (options['deep_page'] - 1) * POSTS_COUNT
+        for name, queryset in listing_querysets().items():
+            first = queryset[:POSTS_COUNT]
+            deep = queryset[offset:offset + POSTS_COUNT]
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(first.explain())
+            self.stdout.write(
+                f'  первая страница: '
+                f'{self.measure(lambda: list(first.all()), repeat):.2f} мс\n'
+                f'  страница {options["deep_page"]}: '
+                f'{self.measure(lambda: list(deep.all()), repeat):.2f} мс\n'
+                f'  COUNT(*): '
+                f'{self.measure(queryset.count, repeat):.2f} мс'
+            )
@@ -0,0 +1,40 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import export
+from posts.models import User
+
+
+class Command(BaseCommand):
+    help = 'Выгружает посты и комментарии пользователя в NDJSON или zip.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('--format', choices=export.FORMATS,
+                            default='ndjson')
+        parser.add_argument('--output', default='-',
+                            help='файл для выгрузки, «-» — stdout')
+        parser.add_argument('--chunk-size', type=int,
+                            default=export.EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f'Нет пользователя {options["username"]}')
+        chunks = export.export_stream(
+            user, options['format'], options['chunk_size']
+        )
+        if options['output'] == '-':
+            output = sys.stdout.buffer
+            for chunk in chunks:
+                output.write(chunk)
+            output.flush()
+            return
+        with open(options['output'], 'wb') as output:
+            for chunk in chunks:
+                output.write(chunk)
+        self.stderr.write(self.style.SUCCESS(
+            f'Выгрузка записана в {options["output"]}'
+        ))
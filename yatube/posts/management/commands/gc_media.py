@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from posts import blobs
+
+
+class Command(BaseCommand):
+    help = ('Сверяет счётчики ссылок на картинки с постами и удаляет '
+            'файлы, на которые никто не ссылается.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, что будет исправлено и удалено.'
+        )
+
+    def handle(self, *args, **options):
+        fixed, orphans = blobs.reconcile(dry_run=options['dry_run'])
+        for name in orphans:
+            self.stdout.write(name)
+        verb = 'Будет удалено' if options['dry_run'] else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено счётчиков: {fixed}. {verb} файлов: {len(orphans)}'
+        ))
@@ -0,0 +1,50 @@
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError
+
+from posts.importer import import_records, read_records
+
+
+class Command(BaseCommand):
+    help = (
+        'Импортирует посты и комментарии из JSONL или CSV пачками через '
+        'bulk_create. «-» вместо файла — читать из stdin.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=('jsonl', 'csv'),
+                            help='по умолчанию — по расширению файла')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--create-users', action='store_true',
+                            help='создавать неизвестных авторов')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        data_format = options['format'] or (
+            'csv' if os.path.splitext(path)[1].lower() == '.csv' else 'jsonl'
+        )
+        if path == '-':
+            stream = sys.stdin
+        else:
+            stream = open(path, encoding='utf-8', newline='')
+        try:
+            report = import_records(
+                read_records(stream, data_format),
+                options['batch_size'], options['create_users']
+            )
+        except DatabaseError as error:
+            raise CommandError(f'Импорт остановлен: {error}')
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+        for error in report['errors']:
+            self.stderr.write(error)
+        self.stdout.write(self.style.SUCCESS(
+            f'Постов: {report["posts"]}, комментариев: '
+            f'{report["comments"]}, пропущено: {report["skipped"]} '
+            f'за {report["seconds"]:.1f} с '
+            f'({report["rows_per_second"]:.0f} записей/с)'
+        ))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = 'Полностью перестраивает поисковый индекс постов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        indexed = search.rebuild(chunk_size=options['chunk_size'])
+        backend = type(search.get_backend()).__name__
+        self.stdout.write(
+            self.style.SUCCESS(f'Проиндексировано постов: {indexed} '
+                               f'({backend})')
+        )
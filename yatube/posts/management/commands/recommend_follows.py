@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from posts import recommendations
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает рекомендации «кого почитать» по подпискам '
+        'и общим обсуждениям.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--chunk-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        written = recommendations.rebuild(
+            batch_size=options['batch_size'],
+            chunk_size=options['chunk_size'],
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f'Записано рекомендаций: {written}')
+        )
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters, summaries
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает денормализованные счётчики постов и подписок '
+        'и сводки комментариев.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        fixed = counters.reconcile(batch_size=options['batch_size'])
+        fixed += summaries.reconcile(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Исправлено записей: {fixed}'))
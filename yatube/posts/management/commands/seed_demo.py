@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.benchmarks import seed_demo
+
+
+class Command(BaseCommand):
+    help = (
+        'Наполняет базу пользователями, группами, постами, комментариями '
+        'и подписками с текстами Faker (используйте отдельную базу: '
+        'YATUBE_DB_PATH).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--follows', type=int, default=20,
+                            help='подписок на пользователя')
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument('--random-seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        seed_demo(
+            options['posts'], options['users'], options['groups'],
+            options['follows'], options['comments'], options['random_seed']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'База наполнена за {time.perf_counter() - started:.1f} с'
+        ))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Создаёт миниатюры картинок всех постов, которых ещё нет.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').only(
+            'pk', 'author_id', 'group_id', 'image'
+        ).order_by('pk')
+        warmed = 0
+        for post in posts.iterator(options['chunk_size']):
+            thumbnails.generate(post.image.name, thumbnails.post_scopes(post))
+            warmed += 1
+        self.stdout.write(
+            self.style.SUCCESS(f'Обработано картинок: {warmed}')
+        )
@@ -0,0 +1,38 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:55
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def count_group_posts(apps, schema_editor):
+    Group = apps.get_model('posts', 'Group')
+    for group in Group.objects.annotate(total=models.Count('posts')):
+        Group.objects.filter(pk=group.pk).update(posts_count=group.total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0005_feedentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('posts_count', models.PositiveIntegerField(default=0)),
+                ('followers_count', models.PositiveIntegerField(default=0)),
+                ('following_count', models.PositiveIntegerField(default=0)),
+                ('comments_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='posts_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_group_posts, migrations.RunPython.noop),
+    ]
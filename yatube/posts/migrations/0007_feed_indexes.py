@@ -0,0 +1,47 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:59
+
+from django.db import migrations, models
+import django.db.models.expressions
+
+
+def remove_invalid_follows(apps, schema_editor):
+    Follow = apps.get_model('posts', 'Follow')
+    Follow.objects.filter(user=models.F('author')).delete()
+    duplicates = Follow.objects.values('user', 'author').annotate(
+        first_id=models.Min('id'), total=models.Count('id')
+    ).filter(total__gt=1)
+    for row in duplicates:
+        Follow.objects.filter(
+            user=row['user'], author=row['author']
+        ).exclude(id=row['first_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0006_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_invalid_follows, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-pub_date'], name='posts_post_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', '-pub_date'], name='posts_post_author_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['group', '-pub_date'], name='posts_post_group_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='posts_follow_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.CheckConstraint(check=models.Q(_negated=True, user=django.db.models.expressions.F('author')), name='posts_follow_not_self'),
+        ),
+    ]
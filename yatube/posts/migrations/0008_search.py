@@ -0,0 +1,50 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_fts_table(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA compile_options')
+        if ('ENABLE_FTS5',) not in cursor.fetchall():
+            return
+        cursor.execute(
+            'CREATE VIRTUAL TABLE IF NOT EXISTS posts_post_fts '
+            "USING fts5(text, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        cursor.execute(
+            'INSERT INTO posts_post_fts (rowid, text) '
+            'SELECT id, text FROM posts_post'
+        )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS posts_post_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0007_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('frequency', models.PositiveIntegerField(default=1)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='posts.Post')),
+            ],
+            options={
+                'unique_together': {('term', 'post')},
+            },
+        ),
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
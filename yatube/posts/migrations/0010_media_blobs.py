@@ -0,0 +1,42 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:07
+
+from django.db import migrations, models
+import posts.storage
+
+
+def count_blob_references(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    MediaBlob = apps.get_model('posts', 'MediaBlob')
+    references = Post.objects.exclude(image='').values('image').annotate(
+        total=models.Count('pk')
+    ).order_by()
+    MediaBlob.objects.bulk_create(
+        MediaBlob(name=row['image'], refcount=row['total'])
+        for row in references
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_image_metadata'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('refcount', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, storage=posts.storage.ContentAddressedStorage(), upload_to='posts/', verbose_name='Картинка'),
+        ),
+        migrations.RunPython(
+            count_blob_references, migrations.RunPython.noop
+        ),
+    ]
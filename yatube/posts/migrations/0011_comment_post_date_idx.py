@@ -0,0 +1,21 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_media_blobs'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='comment',
+            options={'ordering': ['pub_date', 'id']},
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'pub_date'], name='posts_comment_post_date_idx'),
+        ),
+    ]
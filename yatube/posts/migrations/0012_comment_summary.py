@@ -0,0 +1,22 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_comment_post_date_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CommentSummary',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='comment_summary', serialize=False, to='posts.Post')),
+                ('comments_count', models.PositiveIntegerField(default=0)),
+                ('latest', models.TextField(default='[]')),
+            ],
+        ),
+    ]
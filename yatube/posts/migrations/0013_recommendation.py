@@ -0,0 +1,38 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:35
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0012_comment_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Recommendation',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('via_follows', models.PositiveIntegerField(default=0)),
+                ('via_comments', models.PositiveIntegerField(default=0)),
+                ('candidate', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-score', 'candidate'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='recommendation',
+            index=models.Index(fields=['user', '-score'], name='posts_recommend_user_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='recommendation',
+            unique_together={('user', 'candidate')},
+        ),
+    ]
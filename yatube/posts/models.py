@@ -1,5 +1,11 @@
+import json
+
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+from .storage import post_images
 
 User = get_user_model()
 Group = get_user_model()
@@ -9,6 +15,7 @@ class Group(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True, max_length=40)
     description = models.TextField(max_length=400)
+    posts_count = models.PositiveIntegerField(default=0)
 
     class Meta:
         verbose_name = 'Заголовок группы'
@@ -17,6 +24,34 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def for_feed(self, comments=0):
+        """Посты для лент вместе с автором и группой.
+
+        С ``comments`` каждому посту в ``latest_comments`` подгружаются
+        не больше стольких последних комментариев — одним запросом на
+        страницу. Карточки лент читают их из ``CommentSummary``.
+        """
+        queryset = self.select_related('author', 'group')
+        if comments:
+            queryset = queryset.prefetch_related(latest_comments(comments))
+        return queryset
+
+
+def latest_comments(limit):
+    """Prefetch последних ``limit`` комментариев каждого поста."""
+    latest = Comment.objects.filter(
+        post_id=models.OuterRef('post_id')
+    ).order_by('-pub_date', '-id').values('pk')[:limit]
+    return models.Prefetch(
+        'comments',
+        queryset=Comment.objects.filter(
+            pk__in=models.Subquery(latest)
+        ).select_related('author'),
+        to_attr='latest_comments'
+    )
+
+
 class Post(models.Model):
     text = models.TextField()
     pub_date = models.DateTimeField(auto_now_add=True)
@@ -35,14 +70,38 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=post_images,
         blank=True
     )
+    image_width = models.PositiveIntegerField(
+        null=True, blank=True, editable=False
+    )
+    image_height = models.PositiveIntegerField(
+        null=True, blank=True, editable=False
+    )
+    image_hash = models.CharField(max_length=64, blank=True, editable=False)
+
+    objects = PostQuerySet.as_manager()
 
     def __str__(self):
         return self.text[:15]
 
     class Meta:
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(
+                fields=['-pub_date'],
+                name='posts_post_date_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date'],
+                name='posts_post_author_date_idx'
+            ),
+            models.Index(
+                fields=['group', '-pub_date'],
+                name='posts_post_group_date_idx'
+            ),
+        ]
 
 
 class Comment(models.Model):
@@ -59,6 +118,15 @@ class Comment(models.Model):
     text = models.TextField()
     pub_date = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        ordering = ['pub_date', 'id']
+        indexes = [
+            models.Index(
+                fields=['post', 'pub_date'],
+                name='posts_comment_post_date_idx'
+            ),
+        ]
+
     def __str__(self):
         return self.text
 
@@ -75,5 +143,143 @@ class Follow(models.Model):
         related_name='following'
     )
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'],
+                name='posts_follow_unique'
+            ),
+            models.CheckConstraint(
+                check=~models.Q(user=models.F('author')),
+                name='posts_follow_not_self'
+            ),
+        ]
+
     def __str__(self):
         return str(self.user.username)
+
+
+class FeedEntry(models.Model):
+    """Запись в предрассчитанной ленте подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_entries'
+    )
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-pub_date']
+        unique_together = ('user', 'post')
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date'],
+                name='posts_feed_user_date_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id}: {self.post_id}'
+
+
+class UserStats(models.Model):
+    """Денормализованные счётчики пользователя."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats'
+    )
+    posts_count = models.PositiveIntegerField(default=0)
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+    comments_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return str(self.user_id)
+
+
+class CommentSummary(models.Model):
+    """Число комментариев поста и последние из них для карточек лент."""
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='comment_summary'
+    )
+    comments_count = models.PositiveIntegerField(default=0)
+    # JSON: список {author, text, pub_date} от старых к новым.
+    latest = models.TextField(default='[]')
+
+    def __str__(self):
+        return f'{self.post_id}: {self.comments_count}'
+
+    @cached_property
+    def preview(self):
+        comments = json.loads(self.latest)
+        for comment in comments:
+            comment['pub_date'] = parse_datetime(comment['pub_date'])
+        return comments
+
+
+class Recommendation(models.Model):
+    """Кого почитать: кандидат для пользователя из ``recommend_follows``."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='recommendations'
+    )
+    candidate = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    score = models.FloatField()
+    # Сколько подписок пользователя подписаны на кандидата и под
+    # сколькими его постами-обсуждениями кандидат тоже писал.
+    via_follows = models.PositiveIntegerField(default=0)
+    via_comments = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-score', 'candidate']
+        unique_together = ('user', 'candidate')
+        indexes = [
+            models.Index(
+                fields=['user', '-score'],
+                name='posts_recommend_user_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id}: {self.candidate_id}'
+
+
+class SearchTerm(models.Model):
+    """Обратный индекс поиска по постам, если в базе нет FTS5."""
+    term = models.CharField(max_length=64)
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='search_terms'
+    )
+    frequency = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        unique_together = ('term', 'post')
+
+    def __str__(self):
+        return self.term
+
+
+class MediaBlob(models.Model):
+    """Файл хранилища картинок и число постов, которые на него ссылаются."""
+    name = models.CharField(max_length=100, unique=True)
+    refcount = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.name}: {self.refcount}'
@@ -0,0 +1,153 @@
+"""Рекомендации «кого почитать», рассчитанные заранее.
+
+Команда ``manage.py recommend_follows`` читает таблицы подписок и
+комментариев потоково, по одному запросу на таблицу, и складывает их в
+разреженные матрицы в формате CSR на ``array``: смещения строк и
+отсортированные номера столбцов, 8 байт на связь. Матрицы три:
+пользователь → авторы, на которых он подписан; пользователь → посты,
+которые он комментировал; пост → его комментаторы.
+
+Затем пользователи обходятся пачками по ``batch_size`` id. Для каждого
+считаются два сигнала: друзья друзей (на кого подписаны его подписки)
+и соседи по обсуждениям (кто комментировал те же посты). Авторы с
+подписками длиннее ``RECOMMENDATION_MAX_DEGREE`` и посты с большим
+числом комментаторов пропускаются: они почти ничего не говорят о
+пользователе и дают квадратичный перебор. Из кандидатов выбираются
+``RECOMMENDATIONS_PER_USER`` лучших, и рекомендации пачки заменяются
+в одной транзакции. Память — матрицы плюс счётчики одной пачки.
+"""
+import heapq
+from array import array
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+
+from . import caching, graph
+from .models import Comment, Follow, Recommendation, User
+
+# Веса сигналов в итоговой оценке кандидата.
+FOLLOW_WEIGHT = 1.0
+COMMENT_WEIGHT = 0.5
+
+_EMPTY = array('q')
+
+
+def _csr(pairs, size):
+    """Матрица из пар (строка, столбец), отсортированных по строке."""
+    indptr = array('q', bytes(8 * (size + 1)))
+    indices = array('q')
+    for row, column in pairs:
+        indices.append(column)
+        indptr[row + 1] += 1
+    for row in range(size):
+        indptr[row + 1] += indptr[row]
+    return indptr, indices
+
+
+def _row(matrix, row):
+    indptr, indices = matrix
+    if row + 1 >= len(indptr):
+        return _EMPTY
+    return indices[indptr[row]:indptr[row + 1]]
+
+
+def _pairs(queryset, row, column, chunk_size):
+    return queryset.order_by(row, column).values_list(
+        row, column
+    ).distinct().iterator(chunk_size=chunk_size)
+
+
+def load_matrices(chunk_size=10000):
+    """Матрицы подписок, комментариев пользователей и комментаторов."""
+    users = (User.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+    # Комментарий без поста (поле допускает NULL) ни с кем не связывает.
+    comments = Comment.objects.exclude(post__isnull=True)
+    posts = (comments.aggregate(last=Max('post'))['last'] or 0) + 1
+    return (
+        _csr(_pairs(
+            Follow.objects, 'user_id', 'author_id', chunk_size
+        ), users),
+        _csr(_pairs(
+            comments, 'author_id', 'post_id', chunk_size
+        ), users),
+        _csr(_pairs(
+            comments, 'post_id', 'author_id', chunk_size
+        ), posts),
+    )
+
+
+def recommend(user_id, follows, commented, commenters):
+    """Лучшие кандидаты пользователя: (id, оценка, подписки, обсуждения)."""
+    max_degree = settings.RECOMMENDATION_MAX_DEGREE
+    followees = _row(follows, user_id)
+    via_follows = Counter()
+    for followee in followees:
+        candidates = _row(follows, followee)
+        if len(candidates) <= max_degree:
+            via_follows.update(candidates)
+    via_comments = Counter()
+    for post_id in _row(commented, user_id):
+        candidates = _row(commenters, post_id)
+        if len(candidates) <= max_degree:
+            via_comments.update(candidates)
+    excluded = {user_id, *followees}
+    scores = {
+        candidate: (
+            via_follows[candidate] * FOLLOW_WEIGHT
+            + via_comments[candidate] * COMMENT_WEIGHT
+        )
+        for candidate in via_follows.keys() | via_comments.keys()
+        if candidate not in excluded
+    }
+    best = heapq.nlargest(
+        settings.RECOMMENDATIONS_PER_USER, scores,
+        key=lambda candidate: (scores[candidate], -candidate)
+    )
+    return [
+        (candidate, scores[candidate], via_follows[candidate],
+         via_comments[candidate])
+        for candidate in best
+    ]
+
+
+def rebuild(batch_size=1000, chunk_size=10000):
+    """Пересчитывает рекомендации всех пользователей, возвращает число."""
+    follows, commented, commenters = load_matrices(chunk_size)
+    users = len(follows[0]) - 1
+    written = 0
+    for start in range(0, users, batch_size):
+        stop = min(start + batch_size, users)
+        rows = [
+            Recommendation(
+                user_id=user_id, candidate_id=candidate, score=score,
+                via_follows=by_follows, via_comments=by_comments
+            )
+            for user_id in range(start, stop)
+            for candidate, score, by_follows, by_comments in recommend(
+                user_id, follows, commented, commenters
+            )
+        ]
+        with transaction.atomic():
+            Recommendation.objects.filter(
+                user_id__gte=start, user_id__lt=stop
+            ).delete()
+            Recommendation.objects.bulk_create(rows, batch_size=batch_size)
+        written += len(rows)
+    Recommendation.objects.filter(user_id__gte=users).delete()
+    caching.bump_version(caching.RECOMMENDATIONS_VERSION_NAME)
+    return written
+
+
+def for_user(user):
+    """Рекомендации пользователя без авторов, на которых он уже подписан."""
+    if not user.is_authenticated:
+        return []
+    return [
+        recommendation
+        for recommendation in Recommendation.objects.filter(
+            user=user
+        ).select_related('candidate')
+        if not graph.is_following(user.pk, recommendation.candidate_id)
+    ]
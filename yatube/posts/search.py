@@ -0,0 +1,213 @@
+"""Полнотекстовый поиск по постам.
+
+Если база — SQLite с модулем FTS5, посты индексируются в виртуальной
+таблице ``posts_post_fts`` и ранжируются по BM25. Иначе используется
+обратный индекс в модели ``SearchTerm`` с ранжированием по TF-IDF.
+Индекс обновляют сигналы сохранения и удаления поста, полностью его
+перестраивает команда ``manage.py rebuild_search_index``.
+"""
+import math
+import re
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, Count, F, FloatField, Sum, When
+
+from .models import Post, SearchTerm
+
+FTS_TABLE = 'posts_post_fts'
+TOKEN_RE = re.compile(r'\w+')
+TERM_MAX_LENGTH = SearchTerm._meta.get_field('term').max_length
+
+
+def tokenize(text):
+    return [
+        token[:TERM_MAX_LENGTH] for token in TOKEN_RE.findall(text.lower())
+        if len(token) > 1
+    ]
+
+
+def fts_available():
+    """В базе есть FTS5 и таблица индекса создана миграцией."""
+    if settings.SEARCH_BACKEND == 'python' or connection.vendor != 'sqlite':
+        return False
+    name = connection.settings_dict['NAME']
+    checked = getattr(connection, '_posts_fts_checked', None)
+    if checked is None or checked[0] != name:
+        checked = (
+            name, FTS_TABLE in connection.introspection.table_names()
+        )
+        connection._posts_fts_checked = checked
+    return checked[1]
+
+
+class FTSBackend:
+    def index(self, post):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post.pk]
+            )
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, text) VALUES (%s, %s)',
+                [post.pk, post.text]
+            )
+
+    def index_many(self, posts):
+        rows = [(post.pk, post.text) for post in posts]
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                [(pk,) for pk, _ in rows]
+            )
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, text) VALUES (%s, %s)',
+                rows
+            )
+
+    def remove(self, post_id):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id]
+            )
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+
+    @staticmethod
+    def _match(terms):
+        return ' '.join(f'"{term}"' for term in terms)
+
+    def count(self, terms):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT COUNT(*) FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s',
+                [self._match(terms)]
+            )
+            return cursor.fetchone()[0]
+
+    def ranked_ids(self, terms, offset, limit):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+                f'ORDER BY bm25({FTS_TABLE}), rowid DESC LIMIT %s OFFSET %s',
+                [self._match(terms), limit, offset]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class PythonBackend:
+    def index(self, post):
+        self.index_many([post])
+
+    def index_many(self, posts):
+        SearchTerm.objects.filter(
+            post__in=[post.pk for post in posts]
+        ).delete()
+        SearchTerm.objects.bulk_create(
+            SearchTerm(term=term, post_id=post.pk, frequency=frequency)
+            for post in posts
+            for term, frequency in Counter(tokenize(post.text)).items()
+        )
+
+    def remove(self, post_id):
+        SearchTerm.objects.filter(post_id=post_id).delete()
+
+    def clear(self):
+        SearchTerm.objects.all().delete()
+
+    def _matches(self, terms):
+        return SearchTerm.objects.filter(term__in=terms).values(
+            'post'
+        ).annotate(
+            matched=Count('term')
+        ).filter(matched=len(terms))
+
+    def count(self, terms):
+        return self._matches(terms).count()
+
+    def ranked_ids(self, terms, offset, limit):
+        total = Post.objects.count() or 1
+        frequencies = dict(
+            SearchTerm.objects.filter(term__in=terms).values(
+                'term'
+            ).annotate(posts=Count('post')).values_list('term', 'posts')
+        )
+        weights = [
+            When(term=term, then=F('frequency') * math.log(
+                1 + total / frequencies.get(term, 1)
+            ))
+            for term in terms
+        ]
+        rows = self._matches(terms).annotate(
+            score=Sum(Case(*weights, output_field=FloatField()))
+        ).order_by('-score', '-post')
+        return [row['post'] for row in rows[offset:offset + limit]]
+
+
+def get_backend():
+    return FTSBackend() if fts_available() else PythonBackend()
+
+
+def index_post(post):
+    get_backend().index(post)
+
+
+def remove_post(post_id):
+    get_backend().remove(post_id)
+
+
+def index_queryset(queryset, chunk_size=1000):
+    """Индексирует посты пачками, возвращает их число."""
+    backend = get_backend()
+    indexed = 0
+    chunk = []
+    for post in queryset.only('pk', 'text').iterator(chunk_size):
+        chunk.append(post)
+        if len(chunk) >= chunk_size:
+            backend.index_many(chunk)
+            indexed += len(chunk)
+            chunk = []
+    if chunk:
+        backend.index_many(chunk)
+        indexed += len(chunk)
+    return indexed
+
+
+def rebuild(chunk_size=1000):
+    """Полностью перестраивает индекс, возвращает число постов."""
+    with transaction.atomic():
+        get_backend().clear()
+        return index_queryset(Post.objects.all(), chunk_size)
+
+
+class SearchResults:
+    """Ленивая выдача поиска, которую умеет листать Paginator."""
+
+    def __init__(self, query):
+        self.terms = list(dict.fromkeys(tokenize(query)))
+        self.backend = get_backend()
+
+    def count(self):
+        if not self.terms:
+            return 0
+        return self.backend.count(self.terms)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if not self.terms:
+            return []
+        if isinstance(key, int):
+            return self[key:key + 1][0]
+        offset = key.start or 0
+        ids = self.backend.ranked_ids(self.terms, offset, key.stop - offset)
+        posts = Post.objects.for_feed().in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
+
+
+def search_posts(query):
+    return SearchResults(query)
@@ -0,0 +1,206 @@
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from . import (blobs, caching, counters, feed, graph, search, summaries,
+               thumbnails)
+from .models import Comment, Follow, Group, Post, User
+
+USER_CARD_FIELDS = {'username', 'first_name', 'last_name'}
+
+
+@receiver(pre_save, sender=Post)
+def remember_saved_post(sender, instance, **kwargs):
+    instance._saved_group_id = instance._saved_image = None
+    if instance.pk is not None:
+        instance._saved_group_id, instance._saved_image = (
+            Post.objects.filter(pk=instance.pk).values_list(
+                'group_id', 'image'
+            ).first() or (None, None)
+        )
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, **kwargs):
+    if kwargs.get('raw'):
+        return
+    if created:
+        counters.change_user_counter(instance.author_id, 'posts_count', 1)
+        counters.change_group_counter(instance.group_id, 1)
+        return
+    old_group_id = getattr(instance, '_saved_group_id', None)
+    if old_group_id != instance.group_id:
+        counters.change_group_counter(old_group_id, -1)
+        counters.change_group_counter(instance.group_id, 1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.change_user_counter(instance.author_id, 'posts_count', -1)
+    counters.change_group_counter(instance.group_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_saved_follow(sender, instance, created, **kwargs):
+    if created and not kwargs.get('raw'):
+        counters.change_user_counter(instance.author_id, 'followers_count', 1)
+        counters.change_user_counter(instance.user_id, 'following_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    counters.change_user_counter(instance.author_id, 'followers_count', -1)
+    counters.change_user_counter(instance.user_id, 'following_count', -1)
+
+
+# Ящики ленты подписок обновляются после счётчиков: порог популярности
+# автора считается по уже изменённому числу подписчиков.
+@receiver(post_save, sender=Post)
+def fan_out_saved_post(sender, instance, created, **kwargs):
+    if created and not kwargs.get('raw'):
+        feed.fan_out_post(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_saved_follow(sender, instance, created, **kwargs):
+    if created and not kwargs.get('raw'):
+        feed.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_deleted_follow(sender, instance, **kwargs):
+    feed.prune(instance.user_id, instance.author_id)
+    feed.follower_removed(instance.author_id)
+
+
+@receiver(post_save, sender=Comment)
+def count_saved_comment(sender, instance, created, **kwargs):
+    if created and not kwargs.get('raw'):
+        counters.change_user_counter(instance.author_id, 'comments_count', 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    counters.change_user_counter(instance.author_id, 'comments_count', -1)
+
+
+@receiver(post_save, sender=Post)
+def create_comment_summary(sender, instance, created, **kwargs):
+    if created and not kwargs.get('raw'):
+        summaries.create(instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+def summarize_saved_comment(sender, instance, created, **kwargs):
+    if not kwargs.get('raw'):
+        summaries.comment_changed(instance.post_id, 1 if created else 0)
+
+
+@receiver(pre_delete, sender=Comment)
+def remember_deleted_comment(sender, instance, **kwargs):
+    summaries.comment_deleting(instance.post_id)
+
+
+@receiver(post_delete, sender=Comment)
+def summarize_deleted_comment(sender, instance, **kwargs):
+    summaries.comment_deleted(instance.post_id)
+
+
+@receiver(pre_delete, sender=Post)
+def remember_deleted_post(sender, instance, **kwargs):
+    summaries.post_deleting(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def forget_deleted_post(sender, instance, **kwargs):
+    summaries.post_deleted(instance.pk)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_card(sender, instance, **kwargs):
+    caching.bump_version(caching.post_version_name(instance.pk))
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_scopes(sender, instance, **kwargs):
+    caching.bump_version(caching.FEEDS_VERSION_NAME)
+    caching.bump_version(caching.author_version_name(instance.author_id))
+    group_ids = {
+        instance.group_id, getattr(instance, '_saved_group_id', None)
+    }
+    for group_id in group_ids - {None}:
+        caching.bump_version(caching.group_version_name(group_id))
+
+
+@receiver(post_save, sender=Group)
+def invalidate_group_scope(sender, instance, created, **kwargs):
+    caching.bump_version(caching.group_version_name(instance.pk))
+    caching.bump_version(caching.group_info_version_name(instance.pk))
+    if not created:
+        caching.bump_version(caching.NAMES_VERSION_NAME)
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_cards(sender, instance, created, update_fields,
+                          **kwargs):
+    # Вход сохраняет только last_login: имя в карточках не меняется.
+    if update_fields and not set(update_fields) & USER_CARD_FIELDS:
+        return
+    caching.bump_version(caching.user_version_name(instance.pk))
+    if not created:
+        caching.bump_version(caching.NAMES_VERSION_NAME)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_feed(sender, instance, **kwargs):
+    caching.bump_version(caching.follows_version_name(instance.user_id))
+    caching.bump_version(caching.followers_version_name(instance.author_id))
+    graph.forget(user_id=instance.user_id, author_id=instance.author_id)
+    # Счётчики подписок видны в профилях обоих пользователей.
+    caching.bump_version(caching.author_version_name(instance.user_id))
+    caching.bump_version(caching.author_version_name(instance.author_id))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_commented_post_card(sender, instance, **kwargs):
+    if instance.post_id is not None:
+        caching.bump_version(caching.post_version_name(instance.post_id))
+    # Комментарии показаны в карточках главной страницы.
+    caching.bump_version(caching.FEEDS_VERSION_NAME)
+
+
+@receiver(post_save, sender=Post)
+def index_saved_post(sender, instance, **kwargs):
+    search.index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_deleted_post(sender, instance, **kwargs):
+    search.remove_post(instance.pk)
+
+
+@receiver(post_save, sender=Post)
+def schedule_post_thumbnails(sender, instance, **kwargs):
+    if kwargs.get('raw') or not instance.image:
+        return
+    if instance.image.name != getattr(instance, '_saved_image', None):
+        thumbnails.schedule_post(instance)
+
+
+@receiver(post_save, sender=Post)
+def count_image_references(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    old_name = getattr(instance, '_saved_image', None) or ''
+    if instance.image.name != old_name:
+        blobs.acquire(instance.image.name)
+        blobs.release(old_name)
+
+
+@receiver(post_delete, sender=Post)
+def release_deleted_image(sender, instance, **kwargs):
+    blobs.release(instance.image.name)
@@ -0,0 +1,42 @@
+"""Хранилище картинок постов с именами по содержимому.
+
+Имя файла — SHA-256 его байтов (``posts/ab/abcdef….jpg``), поэтому
+одинаковые картинки разных постов и повторные загрузки при
+редактировании хранятся одним файлом, а миниатюры для него создаются
+один раз. Сколько постов ссылается на файл, учитывает модель
+``MediaBlob`` (``posts.blobs``).
+"""
+import hashlib
+import os
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+def content_hash(content):
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def hashed_name(self, name, digest):
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        return os.path.join(directory, digest[:2], digest + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content_hash(content))
+        if self.exists(name):
+            return name.replace('\\', '/')
+        return super().save(name, content, max_length)
+
+
+post_images = ContentAddressedStorage()
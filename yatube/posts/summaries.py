@@ -0,0 +1,185 @@
+"""Сводки комментариев для карточек постов в лентах.
+
+У каждого поста хранится число комментариев и последние
+``COMMENT_PREVIEW_SIZE`` из них (``CommentSummary``), поэтому карточка
+не читает таблицу комментариев. Сводку обновляют сигналы сохранения и
+удаления комментариев: счётчик меняется через F-выражение, а последние
+комментарии перечитываются коротким запросом по индексу
+``(post, pub_date)``. Удаление нескольких комментариев одним
+``delete()`` обновляет сводку каждого поста один раз, а комментарии
+удаляемого поста её не трогают: сводка удаляется вместе с ним. Пустая
+сводка создаётся вместе с постом, а для постов, вставленных в обход
+ORM, — при первой отрисовке карточки.
+После массовой вставки комментариев расхождения исправляет
+``manage.py reconcile_counters``.
+"""
+import contextvars
+import json
+from collections import Counter
+
+from django.conf import settings
+from django.db.models import Count, F
+
+from . import caching
+from .counters import count_subquery
+from .models import Comment, CommentSummary, Post, latest_comments
+
+
+# Состояние текущего delete(): pre_delete всех объектов приходит до
+# первого post_delete, поэтому к сигналу об удалённом комментарии уже
+# известно, сколько ещё комментариев его поста удалится. Первый
+# pre_delete после post_delete начинает новое удаление с чистого
+# состояния: так не переживают остатки delete(), упавшего посередине.
+_deleting = contextvars.ContextVar('comment_summaries', default=None)
+
+
+def _deletion(collecting):
+    state = _deleting.get()
+    if state is None or collecting and state['deleting']:
+        state = {
+            'deleting': False,
+            'posts': set(), 'left': Counter(), 'removed': Counter(),
+        }
+        _deleting.set(state)
+    state['deleting'] = not collecting
+    return state
+
+
+def _dump(comments):
+    """JSON последних комментариев от старых к новым."""
+    return json.dumps([
+        {
+            'author': comment.author.username,
+            'text': comment.text,
+            'pub_date': comment.pub_date.isoformat(),
+        }
+        for comment in comments
+    ], ensure_ascii=False)
+
+
+def _latest(post_id):
+    comments = Comment.objects.filter(post_id=post_id).order_by(
+        '-pub_date', '-id'
+    ).select_related('author')[:settings.COMMENT_PREVIEW_SIZE]
+    return _dump(reversed(comments))
+
+
+def recount(post_id):
+    """Пересчитывает сводку поста по базе."""
+    summary, _ = CommentSummary.objects.update_or_create(
+        post_id=post_id, defaults={
+            'comments_count': Comment.objects.filter(post_id=post_id).count(),
+            'latest': _latest(post_id),
+        }
+    )
+    return summary
+
+
+def create(post_id):
+    CommentSummary.objects.bulk_create(
+        [CommentSummary(post_id=post_id)], ignore_conflicts=True
+    )
+
+
+def comment_changed(post_id, delta):
+    """Обновляет сводку после добавления, правки или удаления."""
+    if post_id is None:
+        return
+    queryset = CommentSummary.objects.filter(post_id=post_id)
+    if delta < 0:
+        # Сводку не создаём: пост может удаляться вместе с комментариями.
+        queryset.filter(comments_count__gte=-delta).update(
+            comments_count=F('comments_count') + delta,
+            latest=_latest(post_id)
+        )
+    elif not queryset.update(
+            comments_count=F('comments_count') + delta,
+            latest=_latest(post_id)):
+        recount(post_id)
+
+
+def post_deleting(post_id):
+    _deletion(collecting=True)['posts'].add(post_id)
+
+
+def post_deleted(post_id):
+    # Пост удаляется раньше своих комментариев: отметку снимет
+    # последний из них.
+    state = _deletion(collecting=False)
+    if not state['left'][post_id]:
+        state['posts'].discard(post_id)
+
+
+def comment_deleting(post_id):
+    if post_id is not None:
+        _deletion(collecting=True)['left'][post_id] += 1
+
+
+def comment_deleted(post_id):
+    """Обновляет сводку после последнего удалённого комментария поста."""
+    if post_id is None:
+        return
+    state = _deletion(collecting=False)
+    state['left'][post_id] -= 1
+    state['removed'][post_id] += 1
+    if state['left'][post_id] > 0:
+        return
+    del state['left'][post_id]
+    removed = state['removed'].pop(post_id)
+    if post_id in state['posts']:
+        state['posts'].discard(post_id)
+    else:
+        comment_changed(post_id, -removed)
+
+
+def _summaries(post_ids):
+    """Сводки постов по базе: два запроса на любое число постов."""
+    posts = Post.objects.filter(pk__in=post_ids).annotate(
+        total=Count('comments')
+    ).prefetch_related(latest_comments(settings.COMMENT_PREVIEW_SIZE))
+    return [
+        CommentSummary(
+            post_id=post.pk,
+            comments_count=post.total,
+            latest=_dump(post.latest_comments),
+        )
+        for post in posts
+    ]
+
+
+def _create_missing(post_ids):
+    """Сводки постов, у которых их нет (вставка в обход ORM)."""
+    created = _summaries(post_ids)
+    CommentSummary.objects.bulk_create(created, ignore_conflicts=True)
+    return {summary.post_id: summary for summary in created}
+
+
+def attach(posts):
+    """Проставляет постам атрибут ``summary``, недостающие создаёт."""
+    posts = list(posts)
+    found = CommentSummary.objects.in_bulk([post.pk for post in posts])
+    missing = [post.pk for post in posts if post.pk not in found]
+    if missing:
+        found.update(_create_missing(missing))
+    for post in posts:
+        post.summary = found[post.pk]
+    return posts
+
+
+def reconcile(batch_size=1000, post_ids=None):
+    """Пересчитывает сводки с неверным числом комментариев.
+
+    Версия карточки исправленного поста меняется, чтобы ленты не
+    показывали закэшированную старую сводку.
+    """
+    stale = CommentSummary.objects.annotate(
+        actual=count_subquery(Comment, 'post')
+    ).exclude(comments_count=F('actual')).values_list('post_id', flat=True)
+    if post_ids is not None:
+        stale = stale.filter(post_id__in=post_ids)
+    fixed = 0
+    for post_id in stale.iterator(chunk_size=batch_size):
+        recount(post_id)
+        caching.bump_version(caching.post_version_name(post_id))
+        fixed += 1
+    return fixed
@@ -0,0 +1,24 @@
+from django import template
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.inclusion_tag('posts/includes/thumbnail.html')
+def post_thumbnail(post, geometry=thumbnails.LIST_GEOMETRY):
+    """Готовая миниатюра картинки поста или заглушка, пока её нет."""
+    context = {'image': post.image, 'thumbnail': None}
+    if not post.image:
+        return context
+    thumbnail = thumbnails.ready_thumbnail(
+        post.image, geometry, **thumbnails.THUMBNAIL_OPTIONS
+    )
+    if thumbnail is None:
+        thumbnails.queue(post.image.name, thumbnails.post_scopes(post))
+    context['thumbnail'] = thumbnail
+    # Миниатюра обрезается точно по размеру: место под неё известно
+    # заранее, и заглушка не сдвигает страницу.
+    context['width'], context['height'] = geometry.split('x')
+    context['placeholder'] = thumbnails.placeholder(geometry)
+    return context
@@ -0,0 +1,140 @@
+from http import HTTPStatus
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from posts import api
+from posts.models import Comment, Follow, Group, Post, User
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='api_author')
+        cls.reader = User.objects.create_user(username='api_reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='api-group', description='Описание'
+        )
+        Post.objects.bulk_create(
+            Post(author=cls.author, group=cls.group, text=f'Пост {number}')
+            for number in range(api.API_PAGE_SIZE + 5)
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Последний пост'
+        )
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Комментарий'
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_feed_pages_cover_all_posts(self):
+        url = reverse('posts:api_index')
+        first = self.client.get(url).json()
+        self.assertEqual(len(first['results']), api.API_PAGE_SIZE)
+        self.assertIsNone(first['previous'])
+        self.assertEqual(first['results'][0], {
+            'id': self.post.pk,
+            'text': 'Последний пост',
+            'pub_date': self.post.pub_date.isoformat(),
+            'author': 'api_author',
+            'group': 'api-group',
+            'image': None,
+            'image_width': None,
+            'image_height': None,
+        })
+        second = self.client.get(url, {'cursor': first['next']}).json()
+        self.assertIsNone(second['next'])
+        ids = [row['id'] for row in first['results'] + second['results']]
+        self.assertCountEqual(ids, Post.objects.values_list('pk', flat=True))
+
+    def test_unchanged_feed_answers_not_modified(self):
+        url = reverse('posts:api_group_list', args=[self.group.slug])
+        response = self.client.get(url)
+        self.assertNotIn('Last-Modified', response)
+        self.assertFalse(response['ETag'].startswith('W/'))
+        # Группа и новейший pub_date, страница не выбирается.
+        with self.assertNumQueries(2):
+            cached = self.client.get(
+                url, HTTP_IF_NONE_MATCH=response['ETag']
+            )
+        self.assertEqual(cached.status_code, HTTPStatus.NOT_MODIFIED)
+        self.assertEqual(cached.content, b'')
+
+    def test_new_or_edited_post_changes_etag(self):
+        url = reverse('posts:api_profile', args=[self.author.username])
+        etag = self.client.get(url)['ETag']
+        Post.objects.filter(pk=self.post.pk).first().save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_edit_is_not_hidden_by_if_modified_since(self):
+        url = reverse('posts:api_post_detail', args=[self.post.pk])
+        response = self.client.get(url)
+        self.assertNotIn('Last-Modified', response)
+        self.post.text = 'Исправленный пост'
+        self.post.save()
+        fresh = self.client.get(
+            url,
+            HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT',
+            HTTP_IF_NONE_MATCH=response['ETag'],
+        )
+        self.assertEqual(fresh.status_code, HTTPStatus.OK)
+        self.assertEqual(fresh.json()['text'], 'Исправленный пост')
+
+    def test_cursor_is_part_of_etag(self):
+        url = reverse('posts:api_index')
+        first = self.client.get(url)
+        second = self.client.get(url, {'cursor': first.json()['next']})
+        self.assertNotEqual(first['ETag'], second['ETag'])
+
+    def test_unknown_group_and_profile(self):
+        for url in (
+            reverse('posts:api_group_list', args=['missing']),
+            reverse('posts:api_profile', args=['missing']),
+            reverse('posts:api_post_detail', args=[0]),
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(
+                    self.client.get(url).status_code, HTTPStatus.NOT_FOUND
+                )
+
+    def test_follow_feed(self):
+        url = reverse('posts:api_follow_index')
+        self.assertEqual(
+            self.client.get(url).status_code, HTTPStatus.FOUND
+        )
+        self.client.force_login(self.reader)
+        empty = self.client.get(url)
+        self.assertEqual(empty.json()['results'], [])
+        Follow.objects.create(user=self.reader, author=self.author)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=empty['ETag'])
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(len(response.json()['results']), api.API_PAGE_SIZE)
+
+    def test_post_detail_with_comments(self):
+        url = reverse('posts:api_post_detail', args=[self.post.pk])
+        response = self.client.get(url)
+        data = response.json()
+        self.assertEqual(data['id'], self.post.pk)
+        self.assertEqual(
+            [comment['text'] for comment in data['comments']],
+            ['Комментарий']
+        )
+        cached = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, HTTPStatus.NOT_MODIFIED)
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Ответ'
+        )
+        fresh = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(fresh.status_code, HTTPStatus.OK)
+        self.assertEqual(len(fresh.json()['comments']), 2)
+
+    def test_writes_are_not_allowed(self):
+        response = self.client.post(reverse('posts:api_index'))
+        self.assertEqual(
+            response.status_code, HTTPStatus.METHOD_NOT_ALLOWED
+        )
@@ -0,0 +1,60 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connections
+from django.test import TestCase
+
+from posts.benchmarks import database_profile
+from posts.models import Comment, Group, Post, User
+
+
+class BenchmarkCommandsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            'seed_demo', posts=30, users=10, groups=3, follows=3,
+            comments=40, stdout=StringIO()
+        )
+
+    def test_seed_demo_creates_consistent_data(self):
+        self.assertEqual(Post.objects.count(), 30)
+        self.assertEqual(User.objects.count(), 10)
+        self.assertEqual(Group.objects.count(), 3)
+        self.assertEqual(Comment.objects.count(), 40)
+        author = Post.objects.first().author
+        self.assertEqual(
+            author.stats.posts_count, author.posts.count()
+        )
+
+    def test_bench_views_writes_json_report(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'report.json')
+            call_command(
+                'bench_views', requests=3, warmup=1, output=path,
+                stdout=StringIO()
+            )
+            with open(path, encoding='utf-8') as report_file:
+                report = json.load(report_file)
+        self.assertEqual(report['rows']['posts'], 30)
+        self.assertEqual(set(report['views']), {
+            'index', 'group_list', 'profile', 'post_detail', 'follow_index'
+        })
+        for name, result in report['views'].items():
+            with self.subTest(view=name):
+                self.assertEqual(result['status'], 200)
+                self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+                self.assertGreater(result['peak_memory_kb'], 0)
+
+    def test_database_profile_is_restored(self):
+        database = connections.databases['default']
+        saved = database.get('CONN_MAX_AGE', 0)
+        pragmas = {'cache_size': -4096}
+        with database_profile(600, pragmas):
+            self.assertEqual(database['CONN_MAX_AGE'], 600)
+            self.assertEqual(settings.SQLITE_PRAGMAS, pragmas)
+        self.assertEqual(database['CONN_MAX_AGE'], saved)
+        self.assertEqual(settings.SQLITE_PRAGMAS, {})
@@ -0,0 +1,90 @@
+from http import HTTPStatus
+
+from django.conf import settings
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Post, User
+
+
+class CommentPagesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='thread_author')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.author, text=f'Ответ {number}')
+            for number in range(settings.COMMENTS_PER_PAGE + 5)
+        )
+
+    def test_first_page_is_embedded(self):
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk])
+        )
+        comments = response.context['comments']
+        self.assertEqual(len(comments), settings.COMMENTS_PER_PAGE)
+        self.assertEqual(comments[0].text, 'Ответ 0')
+        self.assertTrue(comments.has_next())
+        self.assertContains(response, 'js-more-comments')
+
+    def test_detail_queries_do_not_depend_on_comments(self):
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        with CaptureQueriesContext(connection) as before:
+            self.client.get(url)
+        Comment.objects.bulk_create(
+            Comment(post=self.post, author=self.author, text='Ещё')
+            for _ in range(50)
+        )
+        with CaptureQueriesContext(connection) as after:
+            self.client.get(url)
+        self.assertEqual(len(before), len(after))
+
+    def test_fragment_returns_next_page(self):
+        first = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk])
+        ).context['comments']
+        response = self.client.get(
+            reverse('posts:post_comments', args=[self.post.pk]),
+            {'cursor': first.next_cursor}
+        )
+        self.assertTemplateUsed(response, 'posts/includes/comments.html')
+        self.assertEqual(
+            [comment.text for comment in response.context['comments']],
+            [f'Ответ {number}' for number in range(
+                settings.COMMENTS_PER_PAGE, settings.COMMENTS_PER_PAGE + 5
+            )]
+        )
+        self.assertNotContains(response, 'js-more-comments')
+
+    def test_fragment_for_missing_post(self):
+        response = self.client.get(reverse('posts:post_comments', args=[0]))
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_json_pages(self):
+        detail = self.client.get(
+            reverse('posts:api_post_detail', args=[self.post.pk])
+        ).json()
+        self.assertEqual(
+            len(detail['comments']), settings.COMMENTS_PER_PAGE
+        )
+        rest = self.client.get(
+            reverse('posts:api_post_comments', args=[self.post.pk]),
+            {'cursor': detail['comments_next']}
+        ).json()
+        self.assertEqual(len(rest['results']), 5)
+        self.assertIsNone(rest['next'])
+
+    def test_comment_form_for_authenticated_user(self):
+        reader = User.objects.create_user(username='thread_reader')
+        self.client.force_login(reader)
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk])
+        )
+        self.assertContains(
+            response, reverse('posts:add_comment', args=[self.post.pk])
+        )
+        self.assertNotContains(
+            response, reverse('posts:post_edit', args=[self.post.pk])
+        )
@@ -0,0 +1,125 @@
+from http import HTTPStatus
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, User
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='etag_author')
+        cls.reader = User.objects.create_user(username='etag_reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='etag-group', description='Описание'
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая', slug='etag-other', description='Описание'
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Пост'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.group_url = reverse('posts:group_list', args=[self.group.slug])
+        self.profile_url = reverse(
+            'posts:profile', args=[self.author.username]
+        )
+
+    def revalidate(self, url, etag):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code
+
+    def test_unchanged_page_answers_not_modified(self):
+        for url in (self.group_url, self.profile_url):
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                with self.assertNumQueries(1):
+                    status = self.revalidate(url, etag)
+                self.assertEqual(status, HTTPStatus.NOT_MODIFIED)
+
+    def test_new_post_changes_only_its_group(self):
+        etag = self.client.get(self.group_url)['ETag']
+        Post.objects.create(
+            author=self.reader, group=self.other_group, text='Чужой'
+        )
+        self.assertEqual(
+            self.revalidate(self.group_url, etag), HTTPStatus.NOT_MODIFIED
+        )
+        Post.objects.create(
+            author=self.reader, group=self.group, text='Новый'
+        )
+        self.assertEqual(self.revalidate(self.group_url, etag), HTTPStatus.OK)
+
+    def test_rename_changes_pages_showing_the_name(self):
+        self.client.force_login(self.reader)
+        index_url = reverse('posts:index')
+        urls = (index_url, self.group_url, self.profile_url)
+        etags = {url: self.client.get(url)['ETag'] for url in urls}
+        self.author.first_name = 'Переименованный'
+        self.author.save()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.revalidate(url, etags[url]),
+                                 HTTPStatus.OK)
+        etags = {url: self.client.get(url)['ETag'] for url in urls}
+        self.group.title = 'Новое название'
+        self.group.save()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.revalidate(url, etags[url]),
+                                 HTTPStatus.OK)
+        self.assertContains(self.client.get(index_url), 'Новое название')
+
+    def test_login_keeps_etags(self):
+        etag = self.client.get(self.group_url)['ETag']
+        User.objects.create_user(username='newcomer')
+        self.author.save(update_fields=['last_login'])
+        self.assertEqual(
+            self.revalidate(self.group_url, etag), HTTPStatus.NOT_MODIFIED
+        )
+
+    def test_moved_post_changes_old_group(self):
+        etag = self.client.get(self.group_url)['ETag']
+        self.post.group = self.other_group
+        self.post.save()
+        self.assertEqual(self.revalidate(self.group_url, etag), HTTPStatus.OK)
+
+    def test_follow_changes_profile(self):
+        self.client.force_login(self.reader)
+        etag = self.client.get(self.profile_url)['ETag']
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(
+            self.revalidate(self.profile_url, etag), HTTPStatus.OK
+        )
+
+    def test_etag_depends_on_user(self):
+        anonymous = self.client.get(self.group_url)['ETag']
+        self.client.force_login(self.reader)
+        self.assertEqual(
+            self.revalidate(self.group_url, anonymous), HTTPStatus.OK
+        )
+
+    def test_unknown_group_is_not_found(self):
+        response = self.client.get(
+            reverse('posts:group_list', args=['missing'])
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_cached_index_answers_not_modified(self):
+        url = reverse('posts:index')
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_comment_changes_index(self):
+        self.client.force_login(self.reader)
+        url = reverse('posts:index')
+        etag = self.client.get(url)['ETag']
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий'
+        )
+        self.assertEqual(self.revalidate(url, etag), HTTPStatus.OK)
@@ -0,0 +1,74 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, User, UserStats
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа',
+            slug='counters',
+            description='Описание'
+        )
+        cls.group2 = Group.objects.create(
+            title='Группа 2',
+            slug='counters2',
+            description='Описание'
+        )
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_post_counters(self):
+        post = Post.objects.create(
+            author=self.author, text='Пост', group=self.group
+        )
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+        post.group = self.group2
+        post.save()
+        self.group.refresh_from_db()
+        self.group2.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 0)
+        self.assertEqual(self.group2.posts_count, 1)
+        post.delete()
+        self.group2.refresh_from_db()
+        self.assertEqual(self.stats(self.author).posts_count, 0)
+        self.assertEqual(self.group2.posts_count, 0)
+
+    def test_follow_and_comment_counters(self):
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='Пост')
+        Comment.objects.create(post=post, author=self.reader, text='Да')
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        self.assertEqual(self.stats(self.reader).comments_count, 1)
+        follow.delete()
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+
+    def test_reconcile_fixes_drift(self):
+        Post.objects.create(author=self.author, text='Пост', group=self.group)
+        UserStats.objects.filter(user=self.author).update(posts_count=7)
+        Group.objects.filter(pk=self.group.pk).update(posts_count=7)
+        call_command('reconcile_counters', stdout=StringIO())
+        self.group.refresh_from_db()
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertEqual(self.group.posts_count, 1)
+
+    def test_profile_uses_stats(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        response = self.client.get(
+            reverse('posts:profile', args=[self.author.username])
+        )
+        self.assertEqual(response.context['stats'].followers_count, 1)
+        self.assertContains(response, 'Подписчиков: 1')
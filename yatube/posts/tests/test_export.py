@@ -0,0 +1,114 @@
+import json
+import shutil
+import tempfile
+import tracemalloc
+import zipfile
+from io import BytesIO, StringIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts import export
+from posts.models import Comment, Group, Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x01\x00\x01\x00\x00\x00\x00\x21\xf9\x04'
+    b'\x01\x0a\x00\x01\x00\x2c\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02'
+    b'\x02\x4c\x01\x00\x3b'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ExportTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='exporter')
+        cls.other = User.objects.create_user(username='other')
+        cls.group = Group.objects.create(
+            title='Группа', slug='export-group', description='Описание'
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, group=cls.group, text='Пост с картинкой',
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif')
+        )
+        Post.objects.create(author=cls.other, text='Чужой пост')
+        Comment.objects.create(
+            post=cls.post, author=cls.user, text='Мой комментарий'
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_ndjson_export(self):
+        response = self.client.get(reverse('posts:export'))
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        records = [
+            json.loads(line)
+            for line in b''.join(response.streaming_content).splitlines()
+        ]
+        self.assertEqual(
+            [(record['type'], record['text']) for record in records],
+            [('post', 'Пост с картинкой'), ('comment', 'Мой комментарий')]
+        )
+        self.assertEqual(records[0]['group'], 'export-group')
+        self.assertEqual(records[0]['image'], self.post.image.name)
+        self.assertEqual(records[1]['post'], self.post.pk)
+
+    def test_zip_export_contains_images(self):
+        response = self.client.get(reverse('posts:export') + '?format=zip')
+        archive = zipfile.ZipFile(
+            BytesIO(b''.join(response.streaming_content))
+        )
+        self.assertEqual(archive.namelist(), [
+            'posts.ndjson', f'images/{self.post.image.name}'
+        ])
+        self.assertEqual(
+            archive.read(f'images/{self.post.image.name}'), SMALL_GIF
+        )
+        self.assertEqual(len(archive.read('posts.ndjson').splitlines()), 2)
+
+    def test_export_command(self):
+        path = f'{TEMP_MEDIA_ROOT}/exporter.ndjson'
+        call_command(
+            'export_posts', 'exporter', output=path, stderr=StringIO()
+        )
+        with open(path, encoding='utf-8') as output:
+            self.assertEqual(len(output.readlines()), 2)
+
+    def test_export_requires_login(self):
+        self.client.logout()
+        response = self.client.get(reverse('posts:export'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_memory_does_not_grow_with_posts(self):
+        def peak_for(user):
+            tracemalloc.start()
+            try:
+                for _ in export.export_ndjson(user, chunk_size=50):
+                    pass
+                return tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        def add_posts(count):
+            Post.objects.bulk_create(
+                Post(author=self.other, text=f'Пост {num} ' * 20)
+                for num in range(count)
+            )
+
+        add_posts(500)
+        small = peak_for(self.other)
+        add_posts(4500)
+        large = peak_for(self.other)
+        self.assertLess(large, small * 1.5)
@@ -0,0 +1,113 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import FeedEntry, Follow, Post, User
+
+
+@override_settings(FEED_FANOUT_ENABLED=True)
+class FanOutFeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.old_post = Post.objects.create(
+            author=cls.author,
+            text='Старый пост',
+        )
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def follow(self):
+        self.reader_client.get(
+            reverse('posts:profile_follow', args=[self.author.username])
+        )
+
+    def test_follow_backfills_inbox(self):
+        self.follow()
+        self.assertTrue(
+            FeedEntry.objects.filter(
+                user=self.reader, post=self.old_post
+            ).exists()
+        )
+
+    def test_post_create_fans_out(self):
+        self.follow()
+        self.author_client.post(
+            reverse('posts:post_create'), {'text': 'Новый пост'}
+        )
+        post = Post.objects.get(text='Новый пост')
+        self.assertTrue(
+            FeedEntry.objects.filter(user=self.reader, post=post).exists()
+        )
+        response = self.reader_client.get(reverse('posts:follow_index'))
+        self.assertIn(post, response.context['page_obj'])
+
+    def test_unfollow_prunes_inbox(self):
+        self.follow()
+        self.reader_client.get(
+            reverse('posts:profile_unfollow', args=[self.author.username])
+        )
+        self.assertFalse(FeedEntry.objects.filter(user=self.reader).exists())
+        response = self.reader_client.get(reverse('posts:follow_index'))
+        self.assertEqual(len(response.context['page_obj']), 0)
+
+    @override_settings(FEED_FANOUT_MAX_FOLLOWERS=1)
+    def test_popular_author_read_on_demand(self):
+        self.follow()
+        self.assertTrue(Follow.objects.filter(user=self.reader).exists())
+        self.assertFalse(FeedEntry.objects.exists())
+        response = self.reader_client.get(reverse('posts:follow_index'))
+        self.assertIn(self.old_post, response.context['page_obj'])
+
+    def test_orm_writes_fill_inbox(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='Из ORM')
+        self.assertEqual(
+            set(FeedEntry.objects.filter(user=self.reader).values_list(
+                'post', flat=True
+            )),
+            {self.old_post.pk, post.pk}
+        )
+        Follow.objects.get(user=self.reader).delete()
+        self.assertFalse(FeedEntry.objects.exists())
+
+    @override_settings(FEED_FANOUT_MAX_FOLLOWERS=2, FEED_BACKFILL_POSTS=1)
+    def test_author_below_threshold_is_backfilled(self):
+        other = User.objects.create_user(username='other_reader')
+        Follow.objects.create(user=self.reader, author=self.author)
+        follow = Follow.objects.create(user=other, author=self.author)
+        newer = Post.objects.create(author=self.author, text='Популярный')
+        self.assertFalse(FeedEntry.objects.filter(post=newer).exists())
+        follow.delete()
+        self.assertTrue(
+            FeedEntry.objects.filter(user=self.reader, post=newer).exists()
+        )
+        response = self.reader_client.get(reverse('posts:follow_index'))
+        self.assertIn(newer, response.context['page_obj'])
+
+
+class BuildFeedInboxTests(TestCase):
+    def test_command_fills_inbox_of_existing_follows(self):
+        reader = User.objects.create_user(username='reader')
+        author = User.objects.create_user(username='author')
+        Follow.objects.create(user=reader, author=author)
+        post = Post.objects.create(author=author, text='До включения')
+        self.assertFalse(FeedEntry.objects.exists())
+        client = Client()
+        client.force_login(reader)
+        with override_settings(FEED_FANOUT_ENABLED=True):
+            out = StringIO()
+            call_command('build_feed_inbox', stdout=out)
+            call_command('build_feed_inbox', stdout=StringIO())
+            response = client.get(reverse('posts:follow_index'))
+        self.assertIn('Разложены посты авторов: 1', out.getvalue())
+        self.assertEqual(FeedEntry.objects.get().post, post)
+        self.assertIn(post, response.context['page_obj'])
@@ -1,11 +1,15 @@
 import shutil
 import tempfile
+from io import BytesIO
 
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image, PngImagePlugin
 
+from posts import images, uploads
+from posts.forms import PostForm
 from posts.models import Group, Post, User, Comment
 
 from http import HTTPStatus
@@ -85,18 +89,107 @@ class PostCreateFormTests(TestCase):
             data=form_data,
             follow=True
         )
+        # Картинка перекодируется и называется по хешу содержимого,
+        # расширение зависит от сборки Pillow.
+        response_1 = Post.objects.all().first()
+        digest = response_1.image_hash
+        image_name = (
+            f'posts/{digest[:2]}/{digest}.'
+            f'{images.FORMATS[images.output_format()]}'
+        )
         self.assertTrue(
             Post.objects.filter(
                 text='Тестовый текст',
-                image=f'posts/{self.uploaded.name}'
+                image=image_name
             ).exists()
         )
         self.assertEqual('image/gif', self.uploaded.content_type)
-        response_1 = Post.objects.all().first()
         response_test_text = response_1.text
         response_test_image = response_1.image
         self.assertEqual(response_test_text, form_data['text'])
-        self.assertEqual(response_test_image, f'posts/{self.uploaded.name}')
+        self.assertEqual(response_test_image, image_name)
+        self.assertEqual(
+            (response_1.image_width, response_1.image_height), (2, 1)
+        )
+        self.assertEqual(len(response_1.image_hash), 64)
+
+    def upload(self, content, name='photo.png'):
+        return self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={
+                'text': 'Пост с загрузкой',
+                'image': SimpleUploadedFile(name, content, 'image/png'),
+            }
+        )
+
+    def png(self, size, **save_kwargs):
+        buffer = BytesIO()
+        Image.new('RGB', size, 'red').save(buffer, 'PNG', **save_kwargs)
+        return buffer.getvalue()
+
+    @override_settings(POST_IMAGE_MAX_SIDE=100)
+    def test_image_is_downscaled_and_stripped(self):
+        info = PngImagePlugin.PngInfo()
+        info.add_text('Comment', 'секрет')
+        self.upload(self.png((400, 200), pnginfo=info))
+        post = Post.objects.get(text='Пост с загрузкой')
+        self.assertEqual((post.image_width, post.image_height), (100, 50))
+        with Image.open(post.image.path) as stored:
+            self.assertEqual(stored.size, (100, 50))
+            self.assertNotIn('Comment', stored.info)
+            self.assertEqual(stored.format, images.output_format())
+
+    @override_settings(POST_IMAGE_MAX_UPLOAD_SIZE=100)
+    def test_too_large_upload_is_rejected(self):
+        response = self.upload(self.png((300, 300)))
+        self.assertFormError(
+            response, 'form', 'image', 'Файл картинки слишком большой.'
+        )
+        self.assertFalse(Post.objects.filter(text='Пост с загрузкой'))
+
+    def test_upload_error_does_not_leak_into_other_forms(self):
+        rejected = SimpleUploadedFile('big.png', b'', 'image/png')
+        rejected.upload_error = uploads.TOO_LARGE
+        form = PostForm({'text': 'Текст'}, {'image': rejected})
+        self.assertEqual(
+            form.errors['image'], ['Файл картинки слишком большой.']
+        )
+        empty = SimpleUploadedFile('empty.png', b'', 'image/png')
+        form = PostForm({'text': 'Текст'}, {'image': empty})
+        self.assertNotIn(
+            'Файл картинки слишком большой.', form.errors['image']
+        )
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=100)
+    def test_too_many_pixels_rejected_by_header(self):
+        response = self.upload(self.png((20, 20)))
+        self.assertFormError(
+            response, 'form', 'image', 'У картинки слишком большое разрешение.'
+        )
+
+    def test_upload_views_still_check_csrf(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        response = client.post(
+            reverse('posts:post_create'), {'text': 'Без токена'}
+        )
+        self.assertTemplateUsed(response, 'core/403csrf.html')
+        self.assertFalse(Post.objects.filter(text='Без токена').exists())
+
+    @override_settings(POST_IMAGE_MAX_SIDE=100)
+    def test_detail_links_original_with_size(self):
+        self.upload(self.png((400, 200)))
+        post = Post.objects.get(text='Пост с загрузкой')
+        response = self.authorized_client.get(
+            reverse('posts:post_detail', args=[post.pk])
+        )
+        self.assertContains(response, 'Оригинал 100×50')
+        self.assertContains(response, 'width="820" height="339"')
+
+    def test_not_an_image_is_rejected(self):
+        response = self.upload(b'not an image' * 100, name='photo.txt')
+        self.assertIn('image', response.context['form'].errors)
+        self.assertFalse(Post.objects.filter(text='Пост с загрузкой'))
 
     def test_post_edit(self):
         post = PostCreateFormTests.post
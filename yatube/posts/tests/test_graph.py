@@ -0,0 +1,112 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import caching, graph
+from posts.models import Follow, Post, User
+
+
+class FollowGraphTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create_user(username=f'graph_{number}')
+            for number in range(4)
+        ]
+        first, second, third, fourth = cls.users
+        Follow.objects.bulk_create([
+            Follow(user=first, author=second),
+            Follow(user=first, author=third),
+            Follow(user=second, author=first),
+            Follow(user=second, author=third),
+            Follow(user=fourth, author=third),
+        ])
+
+    def setUp(self):
+        cache.clear()
+        graph.clear()
+        self.first, self.second, self.third, self.fourth = (
+            user.pk for user in self.users
+        )
+
+    def test_graph_questions(self):
+        self.assertEqual(
+            list(graph.followees(self.first)), [self.second, self.third]
+        )
+        self.assertTrue(graph.is_following(self.first, self.third))
+        self.assertFalse(graph.is_following(self.third, self.first))
+        self.assertFalse(graph.is_following(None, self.first))
+        self.assertEqual(graph.followers_count(self.third), 3)
+        self.assertEqual(graph.following_count(self.fourth), 1)
+        self.assertTrue(graph.is_mutual(self.first, self.second))
+        self.assertFalse(graph.is_mutual(self.first, self.third))
+        self.assertEqual(
+            list(graph.common_followees(self.first, self.second)),
+            [self.third]
+        )
+
+    def test_arrays_are_loaded_once(self):
+        graph.followees(self.first)
+        with self.assertNumQueries(0):
+            self.assertTrue(graph.is_following(self.first, self.second))
+
+    def test_follow_signals_invalidate(self):
+        self.assertFalse(graph.is_following(self.third, self.fourth))
+        follow = Follow.objects.create(
+            user=self.users[2], author=self.users[3]
+        )
+        self.assertTrue(graph.is_following(self.third, self.fourth))
+        self.assertEqual(graph.followers_count(self.fourth), 1)
+        follow.delete()
+        self.assertFalse(graph.is_following(self.third, self.fourth))
+
+    def test_version_from_other_process_reloads(self):
+        graph.followees(self.fourth)
+        Follow.objects.bulk_create([
+            Follow(user=self.users[3], author=self.users[0])
+        ])
+        caching.bump_version(caching.follows_version_name(self.fourth))
+        self.assertTrue(graph.is_following(self.fourth, self.first))
+
+    @override_settings(FOLLOW_GRAPH_TTL=30)
+    def test_entry_expires_without_shared_version(self):
+        # Другой процесс с кэшем в своей памяти: подписка записана, но
+        # версия в нашем кэше не изменилась.
+        with mock.patch('posts.graph.time') as clock:
+            clock.monotonic.return_value = 1000
+            self.assertFalse(graph.is_following(self.fourth, self.first))
+            Follow.objects.bulk_create([
+                Follow(user=self.users[3], author=self.users[0])
+            ])
+            clock.monotonic.return_value = 1029
+            self.assertFalse(graph.is_following(self.fourth, self.first))
+            clock.monotonic.return_value = 1030
+            self.assertTrue(graph.is_following(self.fourth, self.first))
+
+    @override_settings(FOLLOW_GRAPH_MAX_USERS=1)
+    def test_least_recently_used_is_evicted(self):
+        graph.followees(self.first)
+        graph.followees(self.second)
+        with self.assertNumQueries(1):
+            graph.followees(self.first)
+
+    def test_profile_and_feed_skip_follow_table(self):
+        Post.objects.create(author=self.users[1], text='Пост автора')
+        self.client.force_login(self.users[0])
+        graph.followees(self.first)
+        graph.followees(self.second)
+        with CaptureQueriesContext(connection) as context:
+            profile = self.client.get(
+                reverse('posts:profile', args=['graph_1'])
+            )
+            index = self.client.get(reverse('posts:follow_index'))
+        self.assertTrue(profile.context['following'])
+        self.assertTrue(profile.context['mutual'])
+        self.assertContains(index, 'Пост автора')
+        self.assertNotIn('"posts_follow"', ' '.join(
+            query['sql'] for query in context.captured_queries
+        ))
@@ -0,0 +1,179 @@
+import json
+import os
+import tempfile
+from datetime import datetime
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from posts import importer
+from posts.models import (Comment, FeedEntry, Follow, Group, Post, User,
+                          UserStats)
+from posts.search import search_posts
+
+
+class ImportPostsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='historian')
+        cls.group = Group.objects.create(
+            title='Архив', slug='archive', description='Старые посты'
+        )
+
+    def import_file(self, content, suffix, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, f'data{suffix}')
+            with open(path, 'w', encoding='utf-8') as data:
+                data.write(content)
+            stdout, stderr = StringIO(), StringIO()
+            call_command(
+                'import_posts', path, stdout=stdout, stderr=stderr, **options
+            )
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_import_jsonl(self):
+        records = [
+            {'id': 500, 'author': 'historian', 'group': 'archive',
+             'text': 'Летопись пароходства', 'pub_date': '2010-05-01T12:00'},
+            {'author': 'historian', 'text': 'Второй пост'},
+            {'type': 'comment', 'post': 500, 'author': 'historian',
+             'text': 'Первый отклик'},
+            {'author': 'stranger', 'text': 'Чужой пост'},
+            {'type': 'comment', 'post': 999, 'author': 'historian',
+             'text': 'Комментарий к несуществующему посту'},
+        ]
+        output, errors = self.import_file(
+            '\n'.join(json.dumps(record) for record in records) + '\nnope\n',
+            '.jsonl', batch_size=2
+        )
+        self.assertIn('Постов: 2, комментариев: 1, пропущено: 3', output)
+        self.assertIn('stranger', errors)
+        post = Post.objects.get(pk=500)
+        self.assertEqual(post.group, self.group)
+        self.assertEqual(
+            post.pub_date,
+            timezone.make_aware(datetime(2010, 5, 1, 12))
+        )
+        self.assertEqual(Comment.objects.get().post, post)
+        self.author.stats.refresh_from_db()
+        self.assertEqual(self.author.stats.posts_count, 2)
+        self.assertEqual(self.author.stats.comments_count, 1)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+        self.assertEqual(list(search_posts('пароходства')[:10]), [post])
+
+    def test_import_csv_creates_users(self):
+        output, _ = self.import_file(
+            'type,author,group,text,post\n'
+            'post,newcomer,,Пост из таблицы,\n',
+            '.csv', create_users=True
+        )
+        self.assertIn('Постов: 1', output)
+        post = Post.objects.get(text='Пост из таблицы')
+        self.assertEqual(post.author.username, 'newcomer')
+        self.assertFalse(post.author.has_usable_password())
+
+    def test_auto_now_add_restored(self):
+        self.import_file(
+            json.dumps({'author': 'historian', 'text': 'Пост',
+                        'pub_date': '2001-01-01T00:00'}),
+            '.jsonl'
+        )
+        self.assertTrue(Post._meta.get_field('pub_date').auto_now_add)
+        post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertEqual(post.pub_date.year, timezone.now().year)
+
+    def import_records(self, *records):
+        return self.import_file(
+            '\n'.join(json.dumps(record) for record in records), '.jsonl'
+        )
+
+    def test_comments_refresh_cached_cards(self):
+        cache.clear()
+        post = Post.objects.create(author=self.author, text='Старый пост')
+        self.client.force_login(self.author)
+        self.client.get(reverse('posts:index'))
+        etag = self.client.get(
+            reverse('posts:group_list', args=['archive'])
+        )['ETag']
+        self.import_records(
+            {'type': 'comment', 'post': post.pk, 'author': 'historian',
+             'text': 'Отклик из архива'},
+            {'author': 'historian', 'group': 'archive', 'text': 'В группу'},
+        )
+        self.assertContains(
+            self.client.get(reverse('posts:index')), 'Отклик из архива'
+        )
+        response = self.client.get(
+            reverse('posts:group_list', args=['archive']),
+            HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertContains(response, 'В группу')
+
+    @override_settings(FEED_FANOUT_ENABLED=True)
+    def test_imported_posts_fan_out(self):
+        reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=reader, author=self.author)
+        self.import_records({'author': 'historian', 'text': 'В ленту'})
+        self.assertTrue(FeedEntry.objects.filter(
+            user=reader, post__text='В ленту'
+        ).exists())
+
+    def test_only_touched_counters_reconciled(self):
+        bystander = User.objects.create_user(username='bystander')
+        UserStats.objects.create(user=bystander, posts_count=7)
+        self.import_records({'author': 'historian', 'text': 'Пост'})
+        self.assertEqual(
+            UserStats.objects.get(user=bystander).posts_count, 7
+        )
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).posts_count, 1
+        )
+
+    def test_taken_id_is_skipped(self):
+        old = Post.objects.create(author=self.author, text='Уже есть')
+        records = [
+            {'author': 'historian', 'text': 'Первый импортный'},
+            {'author': 'historian', 'text': 'Второй импортный'},
+            {'id': 900, 'author': 'historian', 'text': 'Третий импортный'},
+            {'id': old.pk, 'author': 'historian', 'text': 'Повтор'},
+            {'id': 900, 'author': 'historian', 'text': 'Повтор в файле'},
+        ]
+        output, errors = self.import_file(
+            '\n'.join(json.dumps(record) for record in records), '.jsonl',
+            batch_size=3
+        )
+        self.assertIn('Постов: 3, комментариев: 0, пропущено: 2', output)
+        self.assertIn(f'пост {old.pk} уже есть', errors)
+        self.assertEqual(Post.objects.get(pk=old.pk).text, 'Уже есть')
+        self.assertEqual(Post.objects.get(pk=900).text, 'Третий импортный')
+
+    def test_failed_batch_keeps_earlier_batches_consistent(self):
+        real_insert = importer.insert_raw
+        calls = []
+
+        def insert_raw(model, objs, batch_size):
+            if model is Post:
+                calls.append(model)
+                if len(calls) > 1:
+                    raise DatabaseError('диск переполнен')
+            real_insert(model, objs, batch_size)
+
+        records = '\n'.join(
+            json.dumps({'author': 'historian', 'text': f'Летопись {number}'})
+            for number in range(5)
+        )
+        with mock.patch('posts.importer.insert_raw', insert_raw):
+            with self.assertRaisesMessage(CommandError, 'диск переполнен'):
+                self.import_file(records, '.jsonl', batch_size=3)
+        self.assertEqual(Post.objects.count(), 3)
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).posts_count, 3
+        )
+        self.assertEqual(len(search_posts('Летопись')), 3)
@@ -1,6 +1,7 @@
+from django.db import IntegrityError, transaction
 from django.test import TestCase
 
-from ..models import Group, Post, User
+from ..models import Comment, Follow, Group, Post, User
 
 
 class PostModelTest(TestCase):
@@ -26,3 +27,44 @@ class PostModelTest(TestCase):
     def test_group_title_str(self):
         title = PostModelTest.group.title
         self.assertEqual(title, str(title))
+
+
+class FollowModelTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='follower')
+        cls.author = User.objects.create_user(username='author')
+
+    def test_follow_is_unique(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Follow.objects.create(user=self.user, author=self.author)
+
+    def test_self_follow_forbidden(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Follow.objects.create(user=self.user, author=self.user)
+
+
+class ForFeedTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='feed_user')
+        cls.posts = [
+            Post.objects.create(author=cls.user, text=f'Пост {number}')
+            for number in range(2)
+        ]
+        for post in cls.posts:
+            Comment.objects.bulk_create([
+                Comment(post=post, author=cls.user, text=f'Ответ {number}')
+                for number in range(4)
+            ])
+
+    def test_comments_prefetch_is_bounded(self):
+        with self.assertNumQueries(2):
+            posts = list(Post.objects.for_feed(comments=2))
+            latest = [
+                [comment.text for comment in post.latest_comments]
+                for post in posts
+            ]
+        self.assertEqual(latest, [['Ответ 2', 'Ответ 3']] * 2)
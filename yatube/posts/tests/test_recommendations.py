@@ -0,0 +1,116 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts import graph, recommendations
+from posts.models import Comment, Follow, Post, Recommendation, User
+
+
+class RecommendationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader, cls.friend, cls.author, cls.talker, cls.star = (
+            User.objects.create_user(username=f'recommend_{name}')
+            for name in ('reader', 'friend', 'author', 'talker', 'star')
+        )
+        Follow.objects.bulk_create([
+            Follow(user=cls.reader, author=cls.friend),
+            Follow(user=cls.friend, author=cls.author),
+            Follow(user=cls.friend, author=cls.reader),
+            Follow(user=cls.friend, author=cls.star),
+        ])
+        cls.post = Post.objects.create(author=cls.star, text='Обсуждение')
+        Comment.objects.bulk_create([
+            Comment(post=cls.post, author=cls.reader, text='Первый'),
+            Comment(post=cls.post, author=cls.reader, text='Ещё раз'),
+            Comment(post=cls.post, author=cls.talker, text='Второй'),
+        ])
+
+    def setUp(self):
+        cache.clear()
+        graph.clear()
+
+    def candidates(self, user):
+        return [
+            (item.candidate, item.via_follows, item.via_comments)
+            for item in Recommendation.objects.filter(user=user)
+        ]
+
+    def test_friends_of_friends_and_commenters(self):
+        out = StringIO()
+        call_command('recommend_follows', batch_size=2, stdout=out)
+        self.assertIn('Записано рекомендаций', out.getvalue())
+        self.assertEqual(self.candidates(self.reader), [
+            (self.author, 1, 0), (self.star, 1, 0), (self.talker, 0, 1),
+        ])
+        self.assertEqual(
+            self.candidates(self.talker), [(self.reader, 0, 1)]
+        )
+
+    def test_comment_without_post_is_ignored(self):
+        Comment.objects.create(author=self.talker, text='Без поста')
+        recommendations.rebuild()
+        self.assertEqual(
+            self.candidates(self.talker), [(self.reader, 0, 1)]
+        )
+
+    def test_rebuild_replaces_old_rows(self):
+        stale = User.objects.create_user(username='recommend_stale')
+        Recommendation.objects.create(
+            user=self.reader, candidate=stale, score=100
+        )
+        Recommendation.objects.create(
+            user=stale, candidate=self.reader, score=1
+        )
+        recommendations.rebuild(batch_size=3)
+        self.assertNotIn(stale, [
+            candidate for candidate, *_ in self.candidates(self.reader)
+        ])
+        self.assertFalse(Recommendation.objects.filter(user=stale).exists())
+
+    @override_settings(RECOMMENDATIONS_PER_USER=1)
+    def test_top_k_is_kept(self):
+        recommendations.rebuild()
+        self.assertEqual(
+            self.candidates(self.reader), [(self.author, 1, 0)]
+        )
+
+    @override_settings(RECOMMENDATION_MAX_DEGREE=2)
+    def test_generic_lists_are_skipped(self):
+        recommendations.rebuild()
+        self.assertEqual(
+            self.candidates(self.reader), [(self.talker, 0, 1)]
+        )
+
+    def test_pages_show_recommendations(self):
+        recommendations.rebuild()
+        self.client.force_login(self.reader)
+        Follow.objects.create(user=self.reader, author=self.star)
+        for url in (
+            reverse('posts:follow_index'),
+            reverse('posts:profile', args=[self.reader.username]),
+        ):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(
+                    [item.candidate for item in
+                     response.context['recommendations']],
+                    [self.author, self.talker]
+                )
+                self.assertContains(response, 'Кого почитать')
+        response = self.client.get(
+            reverse('posts:profile', args=[self.author.username])
+        )
+        self.assertEqual(response.context['recommendations'], [])
+
+    def test_rebuild_changes_profile_etag(self):
+        self.client.force_login(self.reader)
+        url = reverse('posts:profile', args=[self.reader.username])
+        etag = self.client.get(url)['ETag']
+        recommendations.rebuild()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, self.talker.username)
@@ -0,0 +1,65 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts import search
+from posts.models import Post, SearchTerm, User
+from posts.views import POSTS_COUNT
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.rare = Post.objects.create(
+            author=cls.user, text='Кошка спит на окне'
+        )
+        cls.often = Post.objects.create(
+            author=cls.user, text='Кошка, кошка и ещё раз кошка'
+        )
+        cls.other = Post.objects.create(
+            author=cls.user, text='Собака гуляет во дворе'
+        )
+
+    def found(self, query):
+        return list(search.search_posts(query)[0:POSTS_COUNT])
+
+    def test_ranked_results(self):
+        self.assertEqual(self.found('КОШКА'), [self.often, self.rare])
+        self.assertEqual(self.found('кошка окне'), [self.rare])
+        self.assertEqual(self.found(''), [])
+
+    def test_index_follows_edits_and_deletes(self):
+        post = Post.objects.get(pk=self.other.pk)
+        post.text = 'Кошка гуляет во дворе'
+        post.save()
+        self.assertIn(post, self.found('кошка'))
+        post.delete()
+        self.assertNotIn(post, self.found('кошка'))
+
+    def test_rebuild_command(self):
+        search.get_backend().clear()
+        self.assertEqual(self.found('собака'), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.found('собака'), [self.other])
+
+    def test_search_view_paginates(self):
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f'Котлета номер {num}')
+            for num in range(POSTS_COUNT + 2)
+        )
+        call_command('rebuild_search_index', stdout=StringIO())
+        response = self.client.get(reverse('posts:search'), {'q': 'котлета'})
+        self.assertEqual(response.context['paginator'].count, POSTS_COUNT + 2)
+        self.assertEqual(len(response.context['page_obj']), POSTS_COUNT)
+        self.assertContains(response, 'q=%D0%BA%D0%BE%D1%82%D0%BB%D0%B5')
+
+
+@override_settings(SEARCH_BACKEND='python')
+class PythonSearchTests(SearchTests):
+    def test_python_backend_used(self):
+        self.assertIsInstance(search.get_backend(), search.PythonBackend)
+        self.assertTrue(SearchTerm.objects.filter(term='кошка').exists())
@@ -0,0 +1,88 @@
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from posts.models import MediaBlob, Post, User
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x01\x00\x01\x00\x00\x00\x00\x21\xf9\x04'
+    b'\x01\x0a\x00\x01\x00\x2c\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02'
+    b'\x02\x4c\x01\x00\x3b'
+)
+OTHER_GIF = SMALL_GIF.replace(b'\x4c\x01', b'\x44\x01')
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+class MediaRootMixin:
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self, content=SMALL_GIF, name='small.gif'):
+        return Post.objects.create(
+            text='Пост с картинкой',
+            author=self.user,
+            image=SimpleUploadedFile(name, content, 'image/gif')
+        )
+
+    def refcount(self, name):
+        blob = MediaBlob.objects.filter(name=name).first()
+        return blob.refcount if blob else 0
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ContentAddressedStorageTests(MediaRootMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='uploader')
+
+    def test_identical_images_share_one_file(self):
+        first = self.create_post()
+        second = self.create_post(name='copy.gif')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertTrue(first.image.name.startswith('posts/'))
+        self.assertTrue(first.image.name.endswith('.gif'))
+        self.assertEqual(self.refcount(first.image.name), 2)
+
+    def test_replaced_image_is_released(self):
+        post = self.create_post()
+        old_name = post.image.name
+        post.image = SimpleUploadedFile('other.gif', OTHER_GIF, 'image/gif')
+        post.save()
+        self.assertNotEqual(post.image.name, old_name)
+        self.assertEqual(self.refcount(old_name), 0)
+        self.assertEqual(self.refcount(post.image.name), 1)
+
+    def test_gc_media_removes_orphans_and_fixes_counts(self):
+        post = self.create_post()
+        storage = post.image.storage
+        orphan = storage.save('posts/orphan.gif', ContentFile(OTHER_GIF))
+        MediaBlob.objects.filter(name=post.image.name).update(refcount=7)
+        call_command('gc_media', stdout=StringIO())
+        self.assertFalse(storage.exists(orphan))
+        self.assertTrue(storage.exists(post.image.name))
+        self.assertEqual(self.refcount(post.image.name), 1)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class MediaGarbageCollectionTests(MediaRootMixin, TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='uploader')
+
+    def test_file_deleted_with_last_reference(self):
+        first = self.create_post()
+        second = self.create_post()
+        storage = first.image.storage
+        name = first.image.name
+        first.delete()
+        self.assertTrue(storage.exists(name))
+        second.delete()
+        self.assertFalse(storage.exists(name))
+        self.assertFalse(MediaBlob.objects.filter(name=name).exists())
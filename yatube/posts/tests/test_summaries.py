@@ -0,0 +1,149 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models.signals import post_delete
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import caching, summaries
+from posts.models import Comment, CommentSummary, Post, User
+
+
+@override_settings(COMMENT_PREVIEW_SIZE=2)
+class CommentSummaryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='summary_author')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+
+    def summary(self):
+        return CommentSummary.objects.get(post=self.post)
+
+    def comment(self, text):
+        return Comment.objects.create(
+            post=self.post, author=self.author, text=text
+        )
+
+    def test_summary_follows_comments(self):
+        self.assertEqual(self.summary().comments_count, 0)
+        for text in ('Первый', 'Второй', 'Третий'):
+            last = self.comment(text)
+        summary = self.summary()
+        self.assertEqual(summary.comments_count, 3)
+        self.assertEqual(
+            [comment['text'] for comment in summary.preview],
+            ['Второй', 'Третий']
+        )
+        self.assertEqual(summary.preview[-1]['pub_date'], last.pub_date)
+        last.delete()
+        summary = self.summary()
+        self.assertEqual(summary.comments_count, 2)
+        self.assertEqual(
+            [comment['text'] for comment in summary.preview],
+            ['Первый', 'Второй']
+        )
+
+    def test_post_delete_with_comments(self):
+        self.comment('Комментарий')
+        Post.objects.get(pk=self.post.pk).delete()
+        self.assertFalse(CommentSummary.objects.exists())
+
+    def test_post_delete_skips_summary_updates(self):
+        for number in range(5):
+            self.comment(f'Комментарий {number}')
+        post = Post.objects.get(pk=self.post.pk)
+        with CaptureQueriesContext(connection) as context:
+            post.delete()
+        self.assertNotIn('UPDATE "posts_commentsummary"', ' '.join(
+            query['sql'] for query in context.captured_queries
+        ))
+
+    def test_bulk_comment_delete_updates_summary_once(self):
+        other = Post.objects.create(author=self.author, text='Другой')
+        for number in range(4):
+            self.comment(f'Комментарий {number}')
+            Comment.objects.create(
+                post=other, author=self.author, text=f'Чужой {number}'
+            )
+        with CaptureQueriesContext(connection) as context:
+            Comment.objects.filter(author=self.author).exclude(
+                text='Комментарий 3'
+            ).delete()
+        updates = [
+            query['sql'] for query in context.captured_queries
+            if query['sql'].startswith('UPDATE "posts_commentsummary"')
+        ]
+        self.assertEqual(len(updates), 2)
+        self.assertEqual(self.summary().comments_count, 1)
+        self.assertEqual(
+            [comment['text'] for comment in self.summary().preview],
+            ['Комментарий 3']
+        )
+        self.assertEqual(
+            CommentSummary.objects.get(post=other).comments_count, 0
+        )
+
+    def test_failed_delete_does_not_leak_into_next_one(self):
+        def fail(sender, **kwargs):
+            raise RuntimeError('сбой кэша')
+
+        first = self.comment('Первый')
+        self.comment('Второй')
+        post_delete.connect(fail, sender=Post)
+        try:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                Post.objects.get(pk=self.post.pk).delete()
+        finally:
+            post_delete.disconnect(fail, sender=Post)
+        first.delete()
+        self.assertEqual(self.summary().comments_count, 1)
+        self.assertEqual(
+            [comment['text'] for comment in self.summary().preview],
+            ['Второй']
+        )
+
+    def test_missing_summaries_created_in_bulk(self):
+        Post.objects.bulk_create(
+            Post(author=self.author, text=f'Пост {number}')
+            for number in range(5)
+        )
+        posts = list(Post.objects.all())
+        Comment.objects.bulk_create([
+            Comment(post=posts[0], author=self.author, text='Без сигналов')
+        ])
+        with self.assertNumQueries(4):
+            summaries.attach(posts)
+        self.assertEqual(posts[0].summary.comments_count, 1)
+        self.assertEqual(
+            CommentSummary.objects.count(), Post.objects.count()
+        )
+
+    def test_reconcile_fixes_bulk_inserted_comments(self):
+        Comment.objects.bulk_create([
+            Comment(post=self.post, author=self.author, text='Импорт')
+        ])
+        name = caching.post_version_name(self.post.pk)
+        version = caching.get_versions([name])[name]
+        call_command('reconcile_counters', stdout=StringIO())
+        self.assertEqual(self.summary().comments_count, 1)
+        self.assertNotEqual(caching.get_versions([name])[name], version)
+
+    def test_feed_card_shows_preview_without_comment_queries(self):
+        for text in ('Первый', 'Второй', 'Третий'):
+            self.comment(text)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Комментарии (3)')
+        self.assertContains(response, 'Третий')
+        self.assertNotContains(response, 'Первый')
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(reverse('posts:index'))
+        self.assertNotIn('"posts_comment"', ' '.join(
+            query['sql'] for query in context.captured_queries
+        ))
@@ -1,10 +1,22 @@
+import shutil
+import tempfile
 from http import HTTPStatus
+from io import StringIO
+from unittest import mock
+
 from django import forms
+from django.conf import settings
 from django.core.cache import cache
+from django.core.management import call_command
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase
+from django.core.paginator import Page
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
+from posts import caching, thumbnails
+from posts.caching import card_key, card_versions, get_versions
 from posts.models import Group, Post, User, Comment, Follow
 from posts.views import POSTS_COUNT
 
@@ -279,17 +291,46 @@ class Sprint_final_tests(TestCase):
             {'text': 'Пост для проверки кэша'}
         )
         response_index = self.client.get(reverse('posts:index'))
-        index_content_1 = response_index.content
         post = response_index.context['page_obj'][0]
         self.assertEqual(post.text, 'Пост для проверки кэша')
+        names = card_versions(post)
+        versions = get_versions(names)
+        key = card_key(post.pk, *(versions[name] for name in names))
+        self.assertIn('Пост для проверки кэша', cache.get(key))
         post.delete()
         response_index_2 = self.client.get(reverse('posts:index'))
-        index_content_2 = response_index_2.content
-        self.assertEqual(index_content_1, index_content_2, 'не работает')
-        cache.clear()
-        response_index_3 = self.client.get(reverse('posts:index'))
-        index_content_3 = response_index_3.content
-        self.assertNotEqual(index_content_1, index_content_3, 'не работает')
+        self.assertNotContains(response_index_2, 'Пост для проверки кэша')
+
+    def test_card_invalidated_by_comment(self):
+        post = Post.objects.create(text='Пост', author=self.blogger)
+        self.client.get(reverse('posts:index'))
+        Comment.objects.create(
+            post=post, author=self.user, text='Свежий комментарий'
+        )
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Свежий комментарий')
+
+    def test_card_invalidated_by_author_and_group_rename(self):
+        group = Group.objects.create(
+            title='Старое название', slug='renamed', description='Описание'
+        )
+        Post.objects.create(text='Пост', author=self.blogger, group=group)
+        self.client.get(reverse('posts:index'))
+        group.title = 'Новое название'
+        group.save()
+        self.blogger.first_name = 'Переименованный'
+        self.blogger.save()
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Новое название')
+        self.assertContains(response, 'Переименованный')
+
+    def test_card_is_shared_between_users(self):
+        Post.objects.create(text='Общий пост', author=self.blogger)
+        self.client.get(reverse('posts:index'))
+        response = self.client_blogger.get(reverse('posts:index'))
+        self.assertContains(response, 'Общий пост')
+        self.assertContains(response, 'Редактировать запись')
+        self.assertContains(response, 'Пользователь: blogger')
 
     def test_image(self):
         self.client.force_login(self.user)
@@ -351,6 +392,9 @@ class PaginatorViewsTest(TestCase):
             for num in range(1, 25)]
         )
 
+    def setUp(self):
+        cache.clear()
+
     def test_first_page_contains_ten_records(self):
         response = self.client.get(reverse('posts:index') + '?page=1')
         self.assertEqual(len(response.context['page_obj']), POSTS_COUNT)
@@ -360,3 +404,212 @@ class PaginatorViewsTest(TestCase):
         response = self.client.get(reverse('posts:index') + '?page=2')
         self.assertEqual(
             len(response.context['page_obj']), POSTS_COUNT % len(posts))
+
+
+@override_settings(PAGINATION_MODE='cursor')
+class CursorPaginatorViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth_user_3')
+        Post.objects.bulk_create([
+            Post(author=cls.user, text=f'Тестовый текст {num}')
+            for num in range(1, 25)]
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cursor_pages_cover_all_posts(self):
+        expected = list(Post.objects.order_by('-pub_date', '-id'))
+        seen = []
+        url = reverse('posts:profile', args=[self.user.username])
+        response = self.client.get(url)
+        while True:
+            page_obj = response.context['page_obj']
+            self.assertTrue(page_obj.is_cursor)
+            seen.extend(page_obj)
+            if not page_obj.has_next():
+                break
+            response = self.client.get(
+                url, {'cursor': page_obj.next_cursor}
+            )
+        self.assertEqual(seen, expected)
+
+    def test_previous_cursor_returns_previous_page(self):
+        url = reverse('posts:profile', args=[self.user.username])
+        first = self.client.get(url).context['page_obj']
+        second = self.client.get(
+            url, {'cursor': first.next_cursor}
+        ).context['page_obj']
+        back = self.client.get(
+            url, {'cursor': second.previous_cursor}
+        ).context['page_obj']
+        self.assertEqual(list(back), list(first))
+        self.assertFalse(back.has_previous())
+
+    def test_invalid_cursor_returns_first_page(self):
+        url = reverse('posts:profile', args=[self.user.username])
+        response = self.client.get(url, {'cursor': 'broken'})
+        self.assertEqual(
+            list(response.context['page_obj']),
+            list(Post.objects.order_by('-pub_date', '-id')[:POSTS_COUNT])
+        )
+
+    def test_page_number_falls_back_to_offset(self):
+        response = self.client.get(reverse('posts:index'), {'page': 2})
+        self.assertIsInstance(response.context['page_obj'], Page)
+
+
+class FeedQueryCountTests(TestCase):
+    """Число запросов списков не зависит от числа постов на странице."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='writer')
+        cls.group = Group.objects.create(
+            title='Группа',
+            slug='query_count',
+            description='Описание'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.client.force_login(self.reader)
+
+    def add_posts(self, count):
+        for num in range(count):
+            commenter = User.objects.create_user(
+                username=f'commenter_{Post.objects.count()}'
+            )
+            post = Post.objects.create(
+                author=self.author,
+                group=self.group,
+                text=f'Пост {num}'
+            )
+            Comment.objects.create(post=post, author=commenter, text='Да')
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(url)
+        return len(context)
+
+    def test_list_views_run_constant_queries(self):
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.author.username]),
+            reverse('posts:follow_index'),
+        )
+        self.add_posts(2)
+        small_page = [self.count_queries(url) for url in urls]
+        self.add_posts(POSTS_COUNT)
+        full_page = [self.count_queries(url) for url in urls]
+        for url, small, full in zip(urls, small_page, full_page):
+            with self.subTest(url=url):
+                self.assertEqual(small, full)
+
+
+@override_settings(
+    MEDIA_ROOT=tempfile.mkdtemp(dir=settings.BASE_DIR),
+    THUMBNAIL_ASYNC=True
+)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='photographer')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+
+    def create_post(self):
+        small_gif = (
+            b'\x47\x49\x46\x38\x39\x61\x01\x00\x01\x00\x00\x00\x00\x21\xf9\x04'
+            b'\x01\x0a\x00\x01\x00\x2c\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02'
+            b'\x02\x4c\x01\x00\x3b'
+        )
+        return Post.objects.create(
+            text='Пост с картинкой',
+            author=self.user,
+            image=SimpleUploadedFile('small.gif', small_gif, 'image/gif')
+        )
+
+    def test_placeholder_until_thumbnail_is_ready(self):
+        post = self.create_post()
+        url = reverse('posts:post_detail', args=[post.pk])
+        response = self.client.get(url)
+        self.assertContains(response, 'data:image/svg+xml')
+        call_command('warm_thumbnails', stdout=StringIO())
+        response = self.client.get(url)
+        self.assertNotContains(response, 'data:image/svg+xml')
+        self.assertContains(response, settings.MEDIA_URL + 'cache/')
+
+    def test_warmed_card_replaces_placeholder(self):
+        post = self.create_post()
+        self.assertContains(
+            self.client.get(reverse('posts:index')), 'data:image/svg+xml'
+        )
+        call_command('warm_thumbnails', stdout=StringIO())
+        self.assertNotContains(
+            self.client.get(reverse('posts:index') + f'?p={post.pk}'),
+            'data:image/svg+xml'
+        )
+
+    @override_settings(THUMBNAIL_ASYNC=False)
+    def test_thumbnails_created_on_save_when_sync(self):
+        self.create_post()
+        response = self.client.get(
+            reverse('posts:profile', args=[self.user.username])
+        )
+        self.assertNotContains(response, 'data:image/svg+xml')
+        self.assertContains(response, settings.MEDIA_URL + 'cache/')
+
+    @override_settings(THUMBNAIL_ASYNC=False)
+    def test_missing_thumbnail_is_queued_not_rendered(self):
+        post = self.create_post()
+        cache.clear()
+        with mock.patch('posts.thumbnails.generate') as generate, \
+                mock.patch('posts.thumbnails.queue') as queue:
+            response = self.client.get(
+                reverse('posts:post_detail', args=[post.pk])
+            )
+        self.assertContains(response, 'data:image/svg+xml')
+        generate.assert_not_called()
+        queue.assert_called_with(
+            post.image.name, thumbnails.post_scopes(post)
+        )
+
+    def test_thumbnail_bumps_only_its_scopes(self):
+        post = self.create_post()
+        other = Group.objects.create(title='Другая', slug='other_scope')
+        names = [
+            caching.post_version_name(post.pk),
+            caching.author_version_name(self.user.pk),
+            caching.group_version_name(other.pk),
+        ]
+        before = get_versions(names)
+        thumbnails.generate(post.image.name, thumbnails.post_scopes(post))
+        after = get_versions(names)
+        self.assertNotEqual(before[names[0]], after[names[0]])
+        self.assertNotEqual(before[names[1]], after[names[1]])
+        self.assertEqual(before[names[2]], after[names[2]])
+
+    def test_pending_image_merges_scopes(self):
+        with mock.patch.object(thumbnails, '_get_executor') as executor:
+            thumbnails._submit('same.gif', ['post:1'])
+            thumbnails._submit('same.gif', ['post:2'])
+        try:
+            executor.return_value.submit.assert_called_once()
+            self.assertEqual(
+                thumbnails._pending['same.gif'], {'post:1', 'post:2'}
+            )
+        finally:
+            thumbnails._pending.pop('same.gif', None)
@@ -0,0 +1,112 @@
+from http import HTTPStatus
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts import writebehind
+from posts.models import Comment, CommentSummary, Follow, Post, User
+
+
+@override_settings(WRITE_BEHIND_ENABLED=True, WRITE_BEHIND_INTERVAL=None)
+class WriteBehindTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='wb_author')
+        cls.reader = User.objects.create_user(username='wb_reader')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.reader)
+        self.addCleanup(writebehind.flush)
+
+    def detail(self):
+        return self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk])
+        )
+
+    def test_comment_is_queued_and_visible_to_author(self):
+        self.client.post(
+            reverse('posts:add_comment', args=[self.post.pk]),
+            {'text': 'Из очереди'}
+        )
+        self.assertFalse(Comment.objects.exists())
+        self.assertContains(self.detail(), 'Из очереди')
+        self.client.force_login(self.author)
+        self.assertNotContains(self.detail(), 'Из очереди')
+
+    def test_flush_writes_comments_and_runs_signals(self):
+        self.client.post(
+            reverse('posts:add_comment', args=[self.post.pk]),
+            {'text': 'Записан'}
+        )
+        self.assertEqual(writebehind.flush(), 1)
+        self.assertEqual(
+            Comment.objects.get().text, 'Записан'
+        )
+        self.assertEqual(
+            CommentSummary.objects.get(post=self.post).comments_count, 1
+        )
+        self.assertContains(self.detail(), 'Записан', count=1)
+
+    def test_comment_to_missing_post_is_dropped(self):
+        self.client.post(
+            reverse('posts:add_comment', args=[0]), {'text': 'Потерян'}
+        )
+        self.assertEqual(writebehind.flush(), 0)
+        self.assertFalse(Comment.objects.exists())
+
+    def test_follow_is_queued(self):
+        url = reverse('posts:profile_follow', args=[self.author.username])
+        self.client.get(url)
+        self.client.get(url)
+        self.assertFalse(Follow.objects.exists())
+        response = self.client.get(
+            reverse('posts:profile', args=[self.author.username])
+        )
+        self.assertTrue(response.context['following'])
+        self.assertEqual(writebehind.flush(), 1)
+        self.assertTrue(Follow.objects.filter(
+            user=self.reader, author=self.author
+        ).exists())
+        self.assertEqual(self.author.stats.followers_count, 1)
+
+    def test_queued_follow_changes_profile_etag(self):
+        profile_url = reverse('posts:profile', args=[self.author.username])
+        etag = self.client.get(profile_url)['ETag']
+        self.client.get(
+            reverse('posts:profile_follow', args=[self.author.username])
+        )
+        response = self.client.get(profile_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertTrue(response.context['following'])
+        self.client.get(
+            reverse('posts:profile_unfollow', args=[self.author.username])
+        )
+        response = self.client.get(
+            profile_url, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertFalse(response.context['following'])
+
+    def test_existing_follow_is_not_duplicated(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.client.get(
+            reverse('posts:profile_follow', args=[self.author.username])
+        )
+        self.assertEqual(writebehind.flush(), 0)
+        self.assertEqual(Follow.objects.count(), 1)
+
+    def test_unfollow_cancels_queued_follow(self):
+        self.client.get(
+            reverse('posts:profile_follow', args=[self.author.username])
+        )
+        self.client.get(
+            reverse('posts:profile_unfollow', args=[self.author.username])
+        )
+        self.assertEqual(writebehind.flush(), 0)
+        response = self.client.get(
+            reverse('posts:profile', args=[self.author.username])
+        )
+        self.assertFalse(response.context['following'])
@@ -0,0 +1,150 @@
+"""Фоновая подготовка миниатюр картинок постов.
+
+Миниатюры всех размеров, которые используют шаблоны, создаются после
+сохранения поста с картинкой в пуле фоновых потоков, когда транзакция
+зафиксирована. С выключенным ``THUMBNAIL_ASYNC`` (тесты) они создаются
+прямо при сохранении. Пока миниатюры нет, шаблоны
+показывают заглушку (тег ``post_thumbnail``) и ставят её создание в
+пул, а не генерируют её посреди запроса. Готовая миниатюра меняет
+версии только своих постов: карточки, автора, группы и общей ленты.
+Существующие посты прогревает команда ``manage.py warm_thumbnails``.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import connection, transaction
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+
+from . import caching
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+LIST_GEOMETRY = '960x339'
+DETAIL_GEOMETRY = '820x339'
+THUMBNAIL_OPTIONS = {'crop': 'center', 'upscale': True}
+GEOMETRIES = (LIST_GEOMETRY, DETAIL_GEOMETRY)
+
+_executor = None
+# Картинка в очереди → версии, которые сменить, когда она будет готова.
+_pending = {}
+_lock = threading.Lock()
+
+
+def ready_thumbnail(file_, geometry, **options):
+    """Готовая миниатюра из хранилища sorl или None, ничего не создавая.
+
+    Повторяет подготовку параметров из ThumbnailBackend.get_thumbnail,
+    чтобы имя миниатюры совпало с тем, что создаст фоновый поток.
+    """
+    backend = default.backend
+    source = ImageFile(file_)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    name = backend._get_thumbnail_filename(source, geometry, options)
+    return default.kvstore.get(ImageFile(name, default.storage))
+
+
+def post_scopes(post):
+    """Версии страниц, на которых видна картинка поста."""
+    names = [
+        caching.post_version_name(post.pk),
+        caching.author_version_name(post.author_id),
+        caching.FEEDS_VERSION_NAME,
+    ]
+    if post.group_id is not None:
+        names.append(caching.group_version_name(post.group_id))
+    return names
+
+
+def generate(name, scopes=()):
+    """Создаёт все миниатюры картинки и меняет версии ``scopes``."""
+    storage = Post._meta.get_field('image').storage
+    try:
+        if not storage.exists(name):
+            return
+    except SuspiciousFileOperation:
+        # Путь вне MEDIA_ROOT: миниатюру для такого файла не создать.
+        return
+    try:
+        source = ImageFile(name, storage)
+        for geometry in GEOMETRIES:
+            get_thumbnail(source, geometry, **THUMBNAIL_OPTIONS)
+        for scope in set(scopes):
+            caching.bump_version(scope)
+    except Exception:
+        logger.exception('Не удалось создать миниатюры для %s', name)
+
+
+def placeholder(geometry):
+    """Серая заглушка с пропорциями миниатюры в виде data URI."""
+    width, height = geometry.split('x')
+    svg = (
+        "<svg xmlns='http://www.w3.org/2000/svg' "
+        f"width='{width}' height='{height}'>"
+        "<rect width='100%' height='100%' fill='#e9ecef'/></svg>"
+    )
+    return 'data:image/svg+xml;charset=utf-8,' + quote(svg)
+
+
+def _run(name):
+    try:
+        with _lock:
+            scopes = _pending[name]
+        generate(name, scopes)
+    finally:
+        with _lock:
+            _pending.pop(name, None)
+        connection.close()
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails'
+            )
+        return _executor
+
+
+def _submit(name, scopes):
+    with _lock:
+        if name in _pending:
+            # Картинку уже создают: добавим версии других постов.
+            _pending[name].update(scopes)
+            return
+        _pending[name] = set(scopes)
+    _get_executor().submit(_run, name)
+
+
+def queue(name, scopes=()):
+    """Ставит создание миниатюр в пул после фиксации транзакции."""
+    if not name:
+        return
+    scopes = tuple(scopes)
+    transaction.on_commit(lambda: _submit(name, scopes))
+
+
+def schedule_post(post):
+    """Миниатюры новой картинки: в пуле или без ``THUMBNAIL_ASYNC`` сразу."""
+    if not post.image:
+        return
+    if settings.THUMBNAIL_ASYNC:
+        queue(post.image.name, post_scopes(post))
+    else:
+        generate(post.image.name, post_scopes(post))
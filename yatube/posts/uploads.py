@@ -0,0 +1,86 @@
+"""Потоковый приём загружаемых картинок.
+
+Файл пишется на диск кусками и не собирается в памяти. По первым
+кускам Pillow разбирает заголовок картинки, так что слишком большой
+файл или картинка с огромными размерами отбрасываются сразу, а не
+после того, как весь файл загружен. Причина отказа остаётся в
+атрибуте ``upload_error`` файла, её показывает ``PostForm``.
+
+Приёмник ставится только представлениям с картинками постов
+(декоратор ``image_uploads``), остальные загрузки сайта он не трогает.
+"""
+from functools import wraps
+
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from PIL import ImageFile
+
+TOO_LARGE = 'too_large'
+TOO_MANY_PIXELS = 'too_many_pixels'
+NOT_AN_IMAGE = 'not_an_image'
+
+# Сколько байт читать в поисках заголовка картинки.
+HEADER_LIMIT = 256 * 1024
+
+
+class ImageUploadHandler(TemporaryFileUploadHandler):
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+        self.error = None
+        self.parser = ImageFile.Parser()
+        self.checked = False
+
+    def _check_header(self, raw_data):
+        try:
+            self.parser.feed(raw_data)
+        except Exception:
+            self.checked = True
+            self.error = NOT_AN_IMAGE
+            return
+        image = self.parser.image
+        if image is not None:
+            self.checked = True
+            width, height = image.size
+            if width * height > settings.POST_IMAGE_MAX_PIXELS:
+                self.error = TOO_MANY_PIXELS
+        elif self.received >= HEADER_LIMIT:
+            self.checked = True
+            self.error = NOT_AN_IMAGE
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.error:
+            return None
+        self.received += len(raw_data)
+        if self.received > settings.POST_IMAGE_MAX_UPLOAD_SIZE:
+            self.error = TOO_LARGE
+            return None
+        if not self.checked:
+            self._check_header(raw_data)
+            if self.error:
+                return None
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file_ = super().file_complete(0 if self.error else file_size)
+        if self.error:
+            file_.truncate(0)
+        file_.upload_error = self.error
+        return file_
+
+
+def image_uploads(view):
+    """Принимает файлы запроса через ``ImageUploadHandler``.
+
+    Приёмник нужно поставить до чтения тела запроса, а CSRF-middleware
+    читает его раньше представления, поэтому CSRF проверяется здесь.
+    """
+    protected = csrf_protect(view)
+
+    @csrf_exempt
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.upload_handlers.insert(0, ImageUploadHandler(request))
+        return protected(request, *args, **kwargs)
+    return wrapper
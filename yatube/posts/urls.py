@@ -1,6 +1,6 @@
 from django.urls import path
 
-from . import views
+from . import api, views
 
 app_name = 'posts'
 
@@ -13,7 +13,18 @@ urlpatterns = [
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
     path('posts/<int:post_id>/comment/',
          views.add_comment, name='add_comment'),
+    path('posts/<int:post_id>/comments/',
+         views.post_comments, name='post_comments'),
     path('follow/', views.follow_index, name='follow_index'),
+    path('search/', views.search, name='search'),
+    path('export/', views.export_posts, name='export'),
+    path('api/posts/', api.index, name='api_index'),
+    path('api/group/<slug:slug>/', api.group_posts, name='api_group_list'),
+    path('api/profile/<str:username>/', api.profile, name='api_profile'),
+    path('api/posts/<int:post_id>/', api.post_detail, name='api_post_detail'),
+    path('api/posts/<int:post_id>/comments/',
+         api.post_comments, name='api_post_comments'),
+    path('api/follow/', api.follow_index, name='api_follow_index'),
     path('profile/<str:username>/follow/',
          views.profile_follow, name='profile_follow'),
     path(
@@ -1,18 +1,28 @@
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
+from django.http import StreamingHttpResponse
+from django.http import Http404
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
 
-from .models import Follow, Group, Post, User
+from core.decorators import cache_response
+from yatube.utils import comments_page, paginate
+
+from . import export, feed, graph, recommendations, writebehind
+from .caching import attach_cards
+from .conditional import (conditional_page, group_state, index_state,
+                          profile_state)
+from .counters import user_stats
+from .models import Comment, Follow, Group, Post, User
+from .search import search_posts
+from .uploads import image_uploads
 from .forms import CommentForm, PostForm
 
 POSTS_COUNT = 10
 
 
 def get_page_context(request, queryset):
-    paginator = Paginator(queryset, POSTS_COUNT)
+    paginator, page_obj = paginate(request, queryset, POSTS_COUNT)
     page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
     return {
         'paginator': paginator,
         'page_number': page_number,
@@ -20,49 +30,105 @@ def get_page_context(request, queryset):
     }
 
 
-@cache_page(20 * 15)
+@cache_response(timeout=20, stale_timeout=20 * 15)
+@conditional_page(index_state)
 def index(request):
-    context = get_page_context(request, Post.objects.all())
+    context = get_page_context(
+        request, Post.objects.for_feed()
+    )
+    attach_cards(context['page_obj'])
     return render(request, 'posts/index.html', context)
 
 
+@conditional_page(group_state)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
     context = {
         'group': group,
     }
-    context.update(get_page_context(request, group.posts.all()))
+    context.update(get_page_context(request, group.posts.for_feed()))
     return render(request, 'posts/group_list.html', context)
 
 
+@conditional_page(profile_state)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    following = (
-        request.user.is_authenticated
-        and author.following.filter(user=request.user).exists()
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    following = request.user.is_authenticated and (
+        graph.is_following(request.user.pk, author.pk)
+        or writebehind.follow_pending(request.user, author.pk)
     )
+    stats = user_stats(author)
     context = {
         'author': author,
         'following': following,
+        'mutual': following and graph.is_following(
+            author.pk, request.user.pk
+        ),
+        'stats': stats,
+        'post_counter': stats.posts_count,
+        'recommendations': (
+            recommendations.for_user(request.user)
+            if author == request.user else []
+        ),
     }
-    context.update(get_page_context(request, author.posts.all()))
+    context.update(get_page_context(request, author.posts.for_feed()))
     return render(request, 'posts/profile.html', context)
 
 
 def post_detail(request, post_id):
     form = CommentForm(request.POST or None)
-    post = get_object_or_404(Post, id=post_id)
-    author_posts_count = post.author.posts.count()
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), id=post_id
+    )
+    author_posts_count = user_stats(post.author).posts_count
     context = {
         'post': post,
         'form': form,
         'author_posts_count': author_posts_count,
+        'comments': get_comments_page(request, post.pk),
     }
     return render(request, 'posts/post_detail.html', context)
 
 
-@cache_page(20 * 15)
+def get_comments_page(request, post_id):
+    comments = comments_page(
+        Comment.objects.filter(post_id=post_id).select_related('author'),
+        request.GET.get('cursor')
+    )
+    if not comments.has_next():
+        # Свои комментарии из очереди отложенной записи — в конец.
+        comments.object_list.extend(
+            writebehind.pending_comments(post_id, request.user)
+        )
+    return comments
+
+
+def post_comments(request, post_id):
+    """Следующая страница комментариев фрагментом HTML."""
+    comments = get_comments_page(request, post_id)
+    if not comments and not Post.objects.filter(pk=post_id).exists():
+        raise Http404
+    return render(request, 'posts/includes/comments.html', {
+        'post_id': post_id,
+        'comments': comments,
+    })
+
+
+def search(request):
+    query = request.GET.get('q', '').strip()
+    paginator = Paginator(search_posts(query), POSTS_COUNT)
+    context = {
+        'query': query,
+        'paginator': paginator,
+        'page_obj': paginator.get_page(request.GET.get('page')),
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
+@image_uploads
 def post_create(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
     if not form.is_valid():
@@ -74,6 +140,7 @@ def post_create(request):
 
 
 @login_required
+@image_uploads
 def post_edit(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     if post.author != request.user:
@@ -97,8 +164,16 @@ def post_edit(request, post_id):
 
 @login_required
 def add_comment(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
     form = CommentForm(request.POST or None)
+    if writebehind.enabled():
+        # Пост проверяется при записи очереди: без него комментарий
+        # отбрасывается.
+        if form.is_valid():
+            writebehind.add_comment(
+                post_id, request.user, form.cleaned_data['text']
+            )
+        return redirect('posts:post_detail', post_id=post_id)
+    post = get_object_or_404(Post, pk=post_id)
     if form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
@@ -110,16 +185,19 @@ def add_comment(request, post_id):
 @login_required
 def follow_index(request):
     context = get_page_context(
-        request,
-        Post.objects.filter(author__following__user=request.user).all()
+        request, feed.follow_feed(request.user).for_feed()
     )
+    attach_cards(context['page_obj'])
+    context['recommendations'] = recommendations.for_user(request.user)
     return render(request, 'posts/index.html', context)
 
 
 @login_required
 def profile_follow(request, username):
     following = get_object_or_404(User, username=username)
-    if following != request.user:
+    if following != request.user and writebehind.enabled():
+        writebehind.add_follow(request.user, following)
+    elif following != request.user:
         Follow.objects.get_or_create(user=request.user, author=following)
     return redirect('posts:profile', username)
 
@@ -127,6 +205,33 @@ def profile_follow(request, username):
 @login_required
 def profile_unfollow(request, username):
     following = get_object_or_404(User, username=username)
-    follower = get_object_or_404(Follow, author=following, user=request.user)
+    cancelled = writebehind.enabled() and writebehind.cancel_follow(
+        request.user.pk, following.pk
+    )
+    follower = Follow.objects.filter(
+        author=following, user=request.user
+    ).first()
+    if follower is None and cancelled:
+        return redirect('posts:profile', username)
+    if follower is None:
+        raise Http404
     follower.delete()
     return redirect('posts:profile', username)
+
+
+@login_required
+def export_posts(request):
+    export_format = request.GET.get('format')
+    if export_format not in export.FORMATS:
+        export_format = 'ndjson'
+    response = StreamingHttpResponse(
+        export.export_stream(request.user, export_format),
+        content_type=(
+            'application/zip' if export_format == 'zip'
+            else 'application/x-ndjson'
+        )
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="{request.user.username}.{export_format}"'
+    )
+    return response
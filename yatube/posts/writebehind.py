@@ -0,0 +1,250 @@
+"""Отложенная запись комментариев и подписок (write-behind).
+
+С ``WRITE_BEHIND_ENABLED`` представления ``add_comment`` и
+``profile_follow`` не пишут в базу сами, а ставят запись в очередь
+процесса. Фоновый поток раз в ``WRITE_BEHIND_INTERVAL`` секунд (или
+когда набралось ``WRITE_BEHIND_BATCH_SIZE`` записей) вставляет очередь
+одним ``bulk_create`` в одной транзакции, поэтому частые мелкие записи
+не выстраиваются в очередь за блокировкой SQLite. После вставки
+вручную отправляется ``post_save``: счётчики, сводки и версии кэша
+обновляются как при обычном сохранении. ``pub_date`` комментария —
+время вставки, а не постановки в очередь.
+
+Пока запись в очереди, автор видит её через наложение в кэше (свои
+комментарии под постом, кнопку «Отписаться»). Другим процессам
+наложение видно, только если кэш общий (Redis); с кэшем в памяти
+процесса запись видна лишь до ответа другого процесса. Постановка и
+отмена подписки меняют версии профилей обоих пользователей, так что
+ETag профиля учитывает наложение. Отписка отменяет подписку из очереди
+своего процесса; подписка, ждущая в очереди другого процесса, всё же
+запишется. При завершении процесса очередь сбрасывается в базу
+(``atexit``). Записи теряются только при аварийной остановке процесса.
+"""
+import atexit
+import logging
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.db.models.signals import post_save
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import caching
+from .models import Comment, Follow, Post
+
+logger = logging.getLogger(__name__)
+
+_comments = []
+_follows = []
+_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_wake = threading.Event()
+_stopping = threading.Event()
+_worker = None
+
+
+def enabled():
+    return settings.WRITE_BEHIND_ENABLED
+
+
+def _comments_key(post_id, user_id):
+    return f'writebehind:comments:{post_id}:{user_id}'
+
+
+def _follows_key(user_id):
+    return f'writebehind:follows:{user_id}'
+
+
+def _overlay_add(key, item):
+    items = cache.get(key, [])
+    items.append(item)
+    cache.set(key, items, settings.WRITE_BEHIND_OVERLAY_TIMEOUT)
+
+
+def _overlay_remove(key, tokens):
+    items = cache.get(key)
+    if items is None:
+        return
+    items = [item for item in items if item['token'] not in tokens]
+    if items:
+        cache.set(key, items, settings.WRITE_BEHIND_OVERLAY_TIMEOUT)
+    else:
+        cache.delete(key)
+
+
+def _follow_changed(user_id, author_id):
+    # Как invalidate_follow_feed: кнопка подписки и счётчики в профилях.
+    caching.bump_version(caching.author_version_name(user_id))
+    caching.bump_version(caching.author_version_name(author_id))
+
+
+def _enqueue(queue, entry):
+    with _lock:
+        queue.append(entry)
+        full = len(_comments) + len(_follows) >= (
+            settings.WRITE_BEHIND_BATCH_SIZE
+        )
+    _start_worker()
+    if full:
+        _wake.set()
+
+
+def add_comment(post_id, author, text):
+    """Ставит комментарий в очередь и показывает его автору."""
+    comment = Comment(
+        post_id=post_id, author=author, text=text, pub_date=timezone.now()
+    )
+    token = uuid.uuid4().hex
+    _overlay_add(_comments_key(post_id, author.pk), {
+        'token': token,
+        'text': text,
+        'pub_date': comment.pub_date.isoformat(),
+    })
+    _enqueue(_comments, (token, comment))
+    return comment
+
+
+def add_follow(user, author):
+    """Ставит подписку в очередь и показывает её подписчику."""
+    token = uuid.uuid4().hex
+    _overlay_add(_follows_key(user.pk), {
+        'token': token, 'author_id': author.pk
+    })
+    _enqueue(_follows, (token, Follow(user=user, author=author)))
+    _follow_changed(user.pk, author.pk)
+
+
+def cancel_follow(user_id, author_id):
+    """Убирает из очереди процесса ещё не записанную подписку."""
+    with _lock:
+        cancelled = [
+            token for token, follow in _follows
+            if (follow.user_id, follow.author_id) == (user_id, author_id)
+        ]
+        _follows[:] = [
+            entry for entry in _follows if entry[0] not in cancelled
+        ]
+    _overlay_remove(_follows_key(user_id), {
+        item['token'] for item in cache.get(_follows_key(user_id), [])
+        if item['author_id'] == author_id
+    })
+    _follow_changed(user_id, author_id)
+    return bool(cancelled)
+
+
+def pending_comments(post_id, user):
+    """Комментарии пользователя к посту, ещё не записанные в базу."""
+    if not enabled() or not user.is_authenticated:
+        return []
+    return [
+        Comment(
+            post_id=post_id, author=user, text=item['text'],
+            pub_date=parse_datetime(item['pub_date'])
+        )
+        for item in cache.get(_comments_key(post_id, user.pk), [])
+    ]
+
+
+def follow_pending(user, author_id):
+    if not enabled() or not user.is_authenticated:
+        return False
+    return any(
+        item['author_id'] == author_id
+        for item in cache.get(_follows_key(user.pk), [])
+    )
+
+
+def _write_follows(follows):
+    """Вставляет новые подписки, возвращает действительно созданные."""
+    unique = {}
+    for follow in follows:
+        if follow.user_id != follow.author_id:
+            unique.setdefault((follow.user_id, follow.author_id), follow)
+    existing = set(Follow.objects.filter(
+        user_id__in={user_id for user_id, _ in unique},
+        author_id__in={author_id for _, author_id in unique},
+    ).values_list('user_id', 'author_id'))
+    created = [
+        follow for pair, follow in unique.items() if pair not in existing
+    ]
+    Follow.objects.bulk_create(created, ignore_conflicts=True)
+    return created
+
+
+def flush():
+    """Записывает очередь процесса в базу, возвращает число записей."""
+    with _flush_lock:
+        with _lock:
+            comments, follows = _comments[:], _follows[:]
+            _comments.clear()
+            _follows.clear()
+        if not comments and not follows:
+            return 0
+        try:
+            with transaction.atomic():
+                posts = set(Post.objects.filter(pk__in={
+                    comment.post_id for _, comment in comments
+                }).values_list('pk', flat=True))
+                # Пост могли удалить, пока комментарий ждал в очереди.
+                saved = [
+                    comment for _, comment in comments
+                    if comment.post_id in posts
+                ]
+                Comment.objects.bulk_create(
+                    saved, batch_size=settings.WRITE_BEHIND_BATCH_SIZE
+                )
+                created = _write_follows(follow for _, follow in follows)
+        except Exception:
+            with _lock:
+                _comments[:0] = comments
+                _follows[:0] = follows
+            raise
+        for instance in (*saved, *created):
+            post_save.send(
+                sender=type(instance), instance=instance, created=True,
+                update_fields=None, raw=False, using='default'
+            )
+        for token, comment in comments:
+            _overlay_remove(
+                _comments_key(comment.post_id, comment.author_id), {token}
+            )
+        for token, follow in follows:
+            _overlay_remove(_follows_key(follow.user_id), {token})
+        return len(saved) + len(created)
+
+
+def _run():
+    while not _stopping.is_set():
+        _wake.wait(settings.WRITE_BEHIND_INTERVAL)
+        _wake.clear()
+        close_old_connections()
+        try:
+            flush()
+        except Exception:
+            logger.exception('Не удалось записать отложенную очередь')
+
+
+def _start_worker():
+    global _worker
+    if settings.WRITE_BEHIND_INTERVAL is None:
+        # Без фонового потока очередь сбрасывается вызовом flush().
+        return
+    with _lock:
+        if _worker is None:
+            _worker = threading.Thread(
+                target=_run, name='writebehind', daemon=True
+            )
+            _worker.start()
+
+
+@atexit.register
+def shutdown():
+    """Останавливает поток и дописывает остаток очереди."""
+    _stopping.set()
+    _wake.set()
+    if _worker is not None:
+        _worker.join()
+    flush()
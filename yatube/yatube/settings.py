@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import sys
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -50,6 +51,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.RequestMetricsMiddleware',
+    'core.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -88,10 +91,46 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'NAME': os.getenv(
+            'YATUBE_DB_PATH', os.path.join(BASE_DIR, 'db.sqlite3')
+        ),
     }
 }
 
+# Реплики для чтения: пути к файлам SQLite через запятую (core.routers).
+# Тестовые базы реплик отражают основную; сами тесты гоняются без реплик.
+DATABASE_REPLICAS = []
+for number, path in enumerate(
+        filter(None, os.getenv('YATUBE_DB_REPLICAS', '').split(',')), 1):
+    DATABASES[f'replica_{number}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': path,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica_{number}')
+
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+REPLICA_ROUTED_APPS = ('posts', 'auth')
+REPLICA_STICKY_COOKIE = 'primary_db'
+REPLICA_STICKY_SECONDS = 10
+
+# Профиль подключений к базе (core.db): YATUBE_DB_PROFILE=production
+# держит подключения открытыми и включает журнал WAL в SQLite.
+DATABASE_PROFILE = os.getenv('YATUBE_DB_PROFILE', 'default')
+SQLITE_PRODUCTION_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    # Отрицательное значение — размер в КиБ, а не в страницах.
+    'cache_size': -64 * 1024,
+}
+SQLITE_PRAGMAS = {}
+if DATABASE_PROFILE == 'production':
+    SQLITE_PRAGMAS = SQLITE_PRODUCTION_PRAGMAS
+    for database in DATABASES.values():
+        database['CONN_MAX_AGE'] = 600
+        database['OPTIONS'] = {'timeout': 20}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -145,8 +184,112 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Кэш выбирается переменной окружения YATUBE_CACHE_BACKEND:
+# 'file' или 'db' (python manage.py createcachetable) — общий кэш
+# процессов одного сервера, 'redis' (по умолчанию) — общий кэш
+# нескольких серверов, 'fakeredis' — тот же бэкенд с хранилищем в памяти
+# одного процесса: по умолчанию в тестах, вне их только явно и только
+# с одним процессом.
+CACHE_BACKENDS = {
+    'fakeredis': {
+        'BACKEND': 'core.cache.RedisCache',
+        'LOCATION': 'fake://yatube',
+        'OPTIONS': {'CLIENT_CLASS': 'core.cache.FakeRedis'},
+    },
+    'redis': {
+        'BACKEND': 'core.cache.RedisCache',
+        'LOCATION': os.getenv('YATUBE_REDIS_URL', 'redis://127.0.0.1:6379/0'),
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv(
+            'YATUBE_CACHE_DIR', os.path.join(BASE_DIR, 'cache')
+        ),
+    },
+    'db': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'yatube_cache',
+    },
+}
+
+# Идентификатор релиза входит в ключи кэша: после деплоя новой версии
+# записи прошлой не читаются.
+CACHE_RELEASE = os.getenv('YATUBE_RELEASE', 'dev')
+
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+CACHE_BACKEND = os.getenv(
+    'YATUBE_CACHE_BACKEND', 'fakeredis' if TESTING else 'redis'
+)
+
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        **CACHE_BACKENDS[CACHE_BACKEND],
+        'KEY_PREFIX': 'yatube',
+        'KEY_FUNCTION': 'core.cache.make_key',
     }
 }
+
+# Лента подписок с раздачей постов при записи (posts.feed). На живой
+# базе заполните ящики командой ``manage.py build_feed_inbox`` до и
+# сразу после включения, иначе ленты подписок опустеют.
+FEED_FANOUT_ENABLED = False
+FEED_FANOUT_MAX_FOLLOWERS = 1000
+FEED_BATCH_SIZE = 500
+# Сколько последних постов автора раскладывать подписчикам, когда он
+# опускается ниже порога популярности.
+FEED_BACKFILL_POSTS = 50
+
+# Пагинация лент: 'offset' (номера страниц) или 'cursor' (по ключу)
+PAGINATOR_LIST = 10
+PAGINATION_MODE = 'offset'
+# Комментарии к посту подгружаются страницами по курсору
+COMMENTS_PER_PAGE = 20
+# Сколько последних комментариев показывать в карточке (posts.summaries)
+COMMENT_PREVIEW_SIZE = 3
+
+# Время жизни кэшированных карточек постов (posts.caching)
+POST_CARD_TIMEOUT = 60 * 60 * 24
+
+# Поиск по постам: 'auto' — FTS5 в SQLite, если доступен, иначе 'python'
+SEARCH_BACKEND = 'auto'
+
+# Миниатюры картинок постов создаются после сохранения поста в пуле
+# фоновых потоков (posts.thumbnails), недостающие при показе — тоже.
+# YATUBE_THUMBNAIL_ASYNC=0 создаёт их при сохранении прямо в запросе:
+# это нужно тестам, которым миниатюры нужны сразу.
+THUMBNAIL_ASYNC = os.getenv('YATUBE_THUMBNAIL_ASYNC', '1') == '1'
+THUMBNAIL_WORKERS = int(os.getenv('YATUBE_THUMBNAIL_WORKERS', 2))
+THUMBNAIL_KVSTORE = 'core.kvstore.KVStore'
+
+# Загрузка картинок постов: потоковый приём и перекодирование (posts.images)
+POST_IMAGE_MAX_UPLOAD_SIZE = 20 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 50_000_000
+POST_IMAGE_MAX_SIDE = 1920
+POST_IMAGE_FORMAT = 'WEBP'
+POST_IMAGE_QUALITY = 85
+
+# Граф подписок в памяти процесса (posts.graph): сколько пользователей
+# держать, сколько секунд доверять массиву без перечитывания и до
+# скольких авторов строить ленту подписок через IN.
+FOLLOW_GRAPH_MAX_USERS = 10000
+FOLLOW_GRAPH_TTL = 30
+FOLLOW_GRAPH_MAX_IN = 500
+
+# Рекомендации «кого почитать» (posts.recommendations): сколько хранить
+# на пользователя и с какой длины список подписок автора или
+# комментаторов поста считается слишком общим и пропускается.
+RECOMMENDATIONS_PER_USER = 10
+RECOMMENDATION_MAX_DEGREE = 1000
+
+# Отложенная запись комментариев и подписок (posts.writebehind):
+# пачками в фоновом потоке раз в WRITE_BEHIND_INTERVAL секунд.
+WRITE_BEHIND_ENABLED = os.getenv('YATUBE_WRITE_BEHIND', '') == '1'
+WRITE_BEHIND_INTERVAL = 0.5
+WRITE_BEHIND_BATCH_SIZE = 500
+# Сколько секунд автор видит свою запись из очереди
+WRITE_BEHIND_OVERLAY_TIMEOUT = 60
+
+# Замер запросов к базе и времени ответа (core.middleware)
+SERVER_TIMING_HEADER = True
+REQUEST_METRICS_WINDOW = 500
+REQUEST_QUERY_BUDGET = 30
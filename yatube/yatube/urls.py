@@ -18,12 +18,15 @@ from django.urls import include, path
 from django.conf import settings
 from django.conf.urls.static import static
 
+from core.views import request_metrics
+
 urlpatterns = [
     path('', include('posts.urls', namespace='posts')),
     path('admin/', admin.site.urls),
     path('auth/', include('users.urls', namespace='users')),
     path('about/', include('about.urls', namespace='about')),
     path('auth/', include('django.contrib.auth.urls')),
+    path('metrics/requests/', request_metrics, name='request_metrics'),
 ]
 
 if settings.DEBUG:
@@ -1,10 +1,169 @@
+import base64
+import json
+
+from django.conf import settings
 from django.core.paginator import Paginator
+from django.db.models import Q
 
 from yatube.settings import PAGINATOR_LIST
 
+CURSOR_ORDERING = ('-pub_date', '-id')
+COMMENT_ORDERING = ('pub_date', 'id')
+
+
+class CursorPage:
+    """Страница курсорной пагинации с интерфейсом, похожим на Page."""
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, next_cursor=None,
+                 previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f'<Cursor page of {len(self)} objects>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Пагинация по ключу (keyset) без COUNT(*) и OFFSET.
+
+    Записи упорядочиваются по ``ordering`` (по умолчанию ``pub_date``
+    и ``id`` по убыванию), а страница выбирается условием «строго после»
+    или «строго до» ключа крайней записи. Ключ передаётся клиенту
+    непрозрачным токеном.
+    """
+
+    def __init__(self, queryset, per_page, ordering=CURSOR_ORDERING):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = ordering
+        self.fields = [name.lstrip('-') for name in ordering]
+
+    def encode_cursor(self, obj, direction):
+        values = [self._value(obj, name) for name in self.fields]
+        raw = json.dumps([direction, values], default=self._isoformat)
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        """Возвращает (направление, значения ключа) или None."""
+        try:
+            raw = base64.urlsafe_b64decode(cursor.encode())
+            direction, values = json.loads(raw.decode())
+            if direction not in ('next', 'prev'):
+                return None
+            model = self.queryset.model
+            values = [
+                model._meta.get_field(name).to_python(value)
+                for name, value in zip(self.fields, values)
+            ]
+        except (TypeError, ValueError, LookupError, AttributeError):
+            return None
+        if len(values) != len(self.fields):
+            return None
+        return direction, values
+
+    @staticmethod
+    def _isoformat(value):
+        # DjangoJSONEncoder отбрасывает микросекунды, а ключ должен
+        # совпадать с сохранённым значением точно.
+        return value.isoformat()
+
+    @staticmethod
+    def _value(obj, name):
+        if isinstance(obj, dict):
+            return obj[name]
+        return getattr(obj, name)
+
+    def _after(self, values, reverse=False):
+        """Условие «ключ записи идёт после values» в порядке ordering."""
+        condition = Q()
+        for index, name in enumerate(self.ordering):
+            descending = name.startswith('-')
+            field = name.lstrip('-')
+            lookup = 'lt' if descending != reverse else 'gt'
+            step = Q(**{f'{field}__{lookup}': values[index]})
+            for prev_field, prev_value in zip(self.fields[:index], values):
+                step &= Q(**{prev_field: prev_value})
+            condition |= step
+        return condition
+
+    def _reversed_ordering(self):
+        return [
+            name[1:] if name.startswith('-') else f'-{name}'
+            for name in self.ordering
+        ]
+
+    def get_page(self, cursor=None):
+        decoded = self.decode_cursor(cursor) if cursor else None
+        direction, values = decoded or ('next', None)
+        if direction == 'next':
+            queryset = self.queryset.order_by(*self.ordering)
+            if values is not None:
+                queryset = queryset.filter(self._after(values))
+        else:
+            queryset = self.queryset.order_by(*self._reversed_ordering())
+            queryset = queryset.filter(self._after(values, reverse=True))
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if direction == 'prev':
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, values is not None
+        next_cursor = previous_cursor = None
+        if rows and has_next:
+            next_cursor = self.encode_cursor(rows[-1], 'next')
+        if rows and has_previous:
+            previous_cursor = self.encode_cursor(rows[0], 'prev')
+        return CursorPage(rows, self, next_cursor, previous_cursor)
+
+
+def cursor_mode(request):
+    """Курсорный режим включён и клиент не запросил номер страницы."""
+    return (
+        settings.PAGINATION_MODE == 'cursor'
+        and 'page' not in request.GET
+    )
+
+
+def paginate(request, queryset, per_page=PAGINATOR_LIST):
+    """Возвращает (paginator, page_obj) в текущем режиме пагинации."""
+    if cursor_mode(request):
+        paginator = CursorPaginator(queryset, per_page)
+        return paginator, paginator.get_page(request.GET.get('cursor'))
+    paginator = Paginator(queryset, per_page)
+    return paginator, paginator.get_page(request.GET.get('page'))
+
+
+def comments_page(queryset, cursor=None):
+    """Страница комментариев от старых к новым по курсору."""
+    paginator = CursorPaginator(
+        queryset, settings.COMMENTS_PER_PAGE, COMMENT_ORDERING
+    )
+    return paginator.get_page(cursor)
+
 
 def paginator_func(request, post_list):
-    paginator = Paginator(post_list, PAGINATOR_LIST)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    _, page_obj = paginate(request, post_list)
     return page_obj